@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, date
 import qrcode
 from io import BytesIO
 from base64 import b64encode
 import json
-import math
+import asyncio
+from sqlalchemy import select, func
 
-from app.db.database import get_db
-from app.core.security import get_current_user, verify_role
-from app.db.models import User, AttendanceSession, AttendanceRecord
+from app.db.database import get_async_db
+from app.core.security import CurrentUser, get_current_db_user, verify_role
+from app.core.idempotency import idempotency_store
+from app.db.models import User, AttendanceSession, AttendanceRecord, Enrollment
 from app.schemas.attendance import (
     AttendanceSessionCreate,
     AttendanceSessionResponse,
@@ -21,32 +25,97 @@ from app.schemas.attendance import (
     CloseSessionResponse,
     BiometricAttendanceRequest,
     BiometricAttendanceResponse,
+    EnrollmentCreate,
+    EnrollmentResponse,
 )
 from app.services.face_service import encode_face, verify_face
+from app.services.session_service import (
+    as_local,
+    close_session as finalize_session,
+    insert_check_in,
+    local_now,
+    publish_session_closed,
+)
+from app.services.live_feed import live_feed
+from app.services.geo import parse_location, haversine_distance, records_outside_radius, find_far_checkins
+from app.services.export_service import iter_attendance_rows, stream_csv, stream_ndjson
+from app.services.rollup_service import (
+    record_status_changes,
+    student_summary,
+    session_name_summary,
+    date_range_summary,
+)
 
 router = APIRouter(prefix="/attendance", tags=["Attendance Management"])
 
+# Seconds between keep-alive comments on idle live feeds
+LIVE_FEED_KEEPALIVE_SECONDS = 15
+
+
+def _publish_check_in(attendance: AttendanceRecord, user) -> None:
+    """Push a new check-in and its count delta to the session's live feed"""
+    live_feed.publish(attendance.session_id, {
+        "type": "check_in",
+        "session_id": attendance.session_id,
+        "record": {
+            "id": attendance.id,
+            "student_id": user.id,
+            "student_name": user.name,
+            "student_email": user.email,
+            "status": attendance.status,
+            "check_in_time": attendance.check_in_time,
+            "check_out_time": attendance.check_out_time,
+        },
+        "counts_delta": {attendance.status: 1},
+    })
+
+
+async def _check_in_rejected(db: AsyncSession, session_id: int) -> HTTPException:
+    """Why insert_check_in inserted nothing: the session closed meanwhile, or the student already has a record"""
+    if await db.scalar(select(AttendanceSession.is_closed).where(AttendanceSession.id == session_id)):
+        return HTTPException(status_code=400, detail="This attendance session has been closed")
+    return HTTPException(status_code=400, detail="Attendance already marked for this session")
+
+
+def _as_local_time(value: datetime) -> datetime:
+    return value.astimezone() if value.tzinfo else value
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 
 @router.post("/sessions", response_model=AttendanceSessionResponse)
 async def create_attendance_session(
     session_data: AttendanceSessionCreate,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
     
-    # Get the late deadline datetime
+    # Get the late deadline datetime, as aware local time for timestamptz columns
     late_until = session_data.get_late_until_datetime()
+    if late_until is not None:
+        late_until = as_local(late_until)
+    
+    # Store numeric coordinates once so check-ins never re-parse the location
+    if session_data.latitude is not None and session_data.longitude is not None:
+        coords = (session_data.latitude, session_data.longitude)
+    else:
+        coords = parse_location(session_data.location)
     
     session = AttendanceSession(
         session_name=session_data.session_name,
-        created_by=current_user.get("uid"),
+        course_name=session_data.course_name or session_data.session_name,
+        created_by=current_user.uid,
         location=session_data.location,
+        latitude=coords[0] if coords else None,
+        longitude=coords[1] if coords else None,
         radius_meters=session_data.radius_meters,
         late_until=late_until,
     )
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
     
     # Include late timing in QR data for better frontend handling
     qr_data = {
@@ -69,33 +138,22 @@ async def create_attendance_session(
 @router.post("/mark")
 async def mark_attendance(
     request: MarkAttendanceRequest,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
    
     session_id = request.session_id
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        user = User(
-            firebase_uid=current_user["uid"],
-            email=current_user.get("email", ""),
-            name=current_user.get("name", "Student"),
-            role="STUDENT"
-        )
-        db.add(user)
-        db.flush()
-        db.refresh(user)
 
     # Check if session exists
-    session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+    session = await db.get(AttendanceSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Attendance session not found")
 
     # Check if already marked
-    existing = db.query(AttendanceRecord).filter(
+    existing = await db.scalar(select(AttendanceRecord.id).where(
         AttendanceRecord.session_id == session_id,
-        AttendanceRecord.student_id == user.id
-    ).first()
+        AttendanceRecord.student_id == current_user.id
+    ))
     
     if existing:
         raise HTTPException(status_code=400, detail="Attendance already marked for this session")
@@ -103,54 +161,52 @@ async def mark_attendance(
     if session.is_closed:
         raise HTTPException(status_code=400, detail="This attendance session has been closed")
 
-    now = datetime.now()
-    check_in_time = now.strftime("%H:%M:%S")
+    now = local_now()
     today_date = now.date()  # Explicitly set today's date
     
     late_threshold = 9  # 9 AM
     is_late = now.hour >= late_threshold and now.minute > 0
     status = "LATE" if is_late else "PRESENT"
 
-    attendance = AttendanceRecord(
-        session_id=session_id,
-        student_id=user.id,
-        date=today_date,  
+    # Re-checks that the session is open and unmarked as part of the write
+    attendance_id = await db.run_sync(
+        insert_check_in,
+        session_id,
+        current_user.id,
+        date=today_date,
         status=status,
-        check_in_time=check_in_time,
+        checked_in_at=now.astimezone(),
     )
-    
-    db.add(attendance)
-    db.commit()
-    db.refresh(attendance)
+    if attendance_id is None:
+        raise await _check_in_rejected(db, session_id)
+
+    await db.run_sync(record_status_changes, [(current_user.id, today_date, session.session_name, None, status)])
+    await db.commit()
+    attendance = await db.get(AttendanceRecord, attendance_id)
+    _publish_check_in(attendance, current_user)
     
     return {
         "success": True,
         "message": f"Attendance marked as {status}",
         "attendance_id": attendance.id,
         "status": status,
-        "check_in_time": check_in_time
+        "check_in_time": attendance.check_in_time
     }
 
 
 @router.get("/my")
 async def get_my_attendance(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        return []
-
-    records = db.query(AttendanceRecord).filter(
-        AttendanceRecord.student_id == user.id
-    ).order_by(AttendanceRecord.date.desc()).all()
+    records = (await db.scalars(select(AttendanceRecord).where(
+        AttendanceRecord.student_id == current_user.id
+    ).order_by(AttendanceRecord.date.desc()))).all()
     
     result = []
     for record in records:
-        session = db.query(AttendanceSession).filter(
-            AttendanceSession.id == record.session_id
-        ).first()
+        session = await db.get(AttendanceSession, record.session_id)
         
         result.append({
             "id": record.id,
@@ -169,21 +225,21 @@ async def get_my_attendance(
 @router.get("/session/{session_id}")
 async def get_session_attendance(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
    
-    session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+    session = await db.get(AttendanceSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    records = db.query(AttendanceRecord).filter(
+    records = (await db.scalars(select(AttendanceRecord).where(
         AttendanceRecord.session_id == session_id
-    ).all()
+    ))).all()
     
     result = []
     for record in records:
-        student = db.query(User).filter(User.id == record.student_id).first()
+        student = await db.get(User, record.student_id)
         result.append({
             "id": record.id,
             "student_id": record.student_id,
@@ -194,57 +250,220 @@ async def get_session_attendance(
             "check_out_time": record.check_out_time,
         })
     
+    # Closed sessions carry a final count snapshot taken when they were closed
+    if session.is_closed and session.total_present is not None:
+        total_present = session.total_present
+        total_absent = session.total_absent
+        total_late = session.total_late
+    else:
+        total_present = len([r for r in result if r["status"] == "PRESENT"])
+        total_absent = len([r for r in result if r["status"] == "ABSENT"])
+        total_late = len([r for r in result if r["status"] == "LATE"])
+
     return {
         "session": {
             "id": session.id,
             "session_name": session.session_name,
+            "course_name": session.course_name,
             "location": session.location,
             "created_at": session.created_at.isoformat(),
             "is_closed": session.is_closed,
         },
         "records": result,
-        "total_present": len([r for r in result if r["status"] == "PRESENT"]),
-        "total_absent": len([r for r in result if r["status"] == "ABSENT"]),
-        "total_late": len([r for r in result if r["status"] == "LATE"]),
+        "total_present": total_present,
+        "total_absent": total_absent,
+        "total_late": total_late,
     }
 
 
+@router.get("/session/{session_id}/live")
+async def stream_session_attendance(
+    session_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+    """
+    Server-sent events for a session: a ``snapshot`` of the counts, then a
+    ``check_in`` per new record, ending with ``session_closed``.
+
+    The feed is per process (see SessionFeedBroker): behind several workers,
+    a stream only carries the events handled by the worker serving it. In
+    that setup, poll GET /attendance/check-ins instead.
+    """
+
+    session = await db.get(AttendanceSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Subscribe before taking the snapshot so no check-in falls in between
+    queue = live_feed.subscribe(session_id)
+    counts = dict((await db.execute(
+        select(AttendanceRecord.status, func.count(AttendanceRecord.id))
+        .where(AttendanceRecord.session_id == session_id)
+        .group_by(AttendanceRecord.status)
+    )).all())
+    snapshot = {
+        "session_id": session.id,
+        "session_name": session.session_name,
+        "is_closed": bool(session.is_closed),
+        "counts": counts,
+    }
+
+    async def event_stream():
+        try:
+            yield _sse("snapshot", snapshot)
+            if snapshot["is_closed"]:
+                return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event["type"], event)
+                if event["type"] == "session_closed":
+                    return
+        finally:
+            live_feed.unsubscribe(session_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/check-ins")
+async def get_check_ins(
+    since: datetime = Query(..., description="Only check-ins at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only check-ins before this time"),
+    session_id: Optional[int] = Query(None, description="Filter by session"),
+    status_filter: Optional[str] = Query(None, description="Filter by status: PRESENT, LATE"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum rows to return"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    # Naive times are local wall-clock times, the same as stored check-ins
+    query = select(AttendanceRecord, User.name, User.email).join(
+        User, User.id == AttendanceRecord.student_id
+    ).where(AttendanceRecord.checked_in_at >= _as_local_time(since))
+
+    if until:
+        query = query.where(AttendanceRecord.checked_in_at < _as_local_time(until))
+    if session_id:
+        query = query.where(AttendanceRecord.session_id == session_id)
+    if status_filter:
+        query = query.where(AttendanceRecord.status == status_filter.upper())
+
+    rows = (await db.execute(query.order_by(AttendanceRecord.checked_in_at).limit(limit))).all()
+    return [
+        {
+            "id": record.id,
+            "session_id": record.session_id,
+            "student_id": record.student_id,
+            "student_name": name,
+            "student_email": email,
+            "status": record.status,
+            "checked_in_at": record.checked_in_at.isoformat() if record.checked_in_at else None,
+            "check_in_time": record.check_in_time,
+        }
+        for record, name, email in rows
+    ]
+
+
 @router.post("/sessions/{session_id}/close")
 async def close_session(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
 
-    session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+    session = await db.get(AttendanceSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session.is_closed = True
-    db.commit()
+    # Flips is_closed, inserts ABSENT rows for the roster and snapshots the counts
+    if not await db.run_sync(finalize_session, session_id):
+        return {"success": True, "message": "Session was already closed"}
+    await db.commit()
+    await db.run_sync(publish_session_closed, [session_id])
     
     return {"success": True, "message": "Session closed successfully"}
 
 
+@router.post("/enrollments", response_model=EnrollmentResponse)
+async def enroll_students(
+    enrollment: EnrollmentCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    student_ids = set(enrollment.student_ids)
+    known_ids = set((await db.scalars(select(User.id).where(User.id.in_(student_ids)))).all())
+    unknown_ids = student_ids - known_ids
+    if unknown_ids:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Students not found: {', '.join(str(i) for i in sorted(unknown_ids))}"
+        )
+
+    enrolled_ids = set((await db.scalars(select(Enrollment.student_id).where(
+        Enrollment.course_name == enrollment.course_name,
+        Enrollment.student_id.in_(student_ids)
+    ))).all())
+    new_ids = sorted(student_ids - enrolled_ids)
+    db.add_all([
+        Enrollment(course_name=enrollment.course_name, student_id=student_id)
+        for student_id in new_ids
+    ])
+    await db.commit()
+
+    return {
+        "course_name": enrollment.course_name,
+        "student_ids": sorted(student_ids),
+        "added_count": len(new_ids),
+    }
+
+
+@router.get("/enrollments/{course_name}")
+async def get_course_roster(
+    course_name: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    rows = (await db.execute(select(User.id, User.name, User.email).join(
+        Enrollment, Enrollment.student_id == User.id
+    ).where(Enrollment.course_name == course_name).order_by(User.name))).all()
+
+    return [
+        {"student_id": row.id, "name": row.name, "email": row.email}
+        for row in rows
+    ]
+
+
 @router.get("/sessions")
 async def get_all_sessions(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
     
-    sessions = db.query(AttendanceSession).order_by(
+    sessions = (await db.scalars(select(AttendanceSession).order_by(
         AttendanceSession.created_at.desc()
-    ).all()
+    ))).all()
     
     result = []
     for session in sessions:
-        total_records = db.query(AttendanceRecord).filter(
+        total_records = await db.scalar(select(func.count(AttendanceRecord.id)).where(
             AttendanceRecord.session_id == session.id
-        ).count()
+        ))
         
         result.append({
             "id": session.id,
             "session_name": session.session_name,
+            "course_name": session.course_name,
             "location": session.location,
             "created_at": session.created_at.isoformat(),
             "is_closed": session.is_closed,
@@ -258,11 +477,11 @@ async def get_all_sessions(
 @router.get("/sessions/{session_id}/qr")
 async def get_session_qr_code(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
    
-    session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+    session = await db.get(AttendanceSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -297,17 +516,17 @@ async def get_session_qr_code(
 @router.get("/sessions/{session_id}")
 async def get_session_details(
     session_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
   
-    session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+    session = await db.get(AttendanceSession, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    total_records = db.query(AttendanceRecord).filter(
+    total_records = await db.scalar(select(func.count(AttendanceRecord.id)).where(
         AttendanceRecord.session_id == session_id
-    ).count()
+    ))
     
     return {
         "id": session.id,
@@ -321,37 +540,146 @@ async def get_session_details(
     }
 
 
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """
-    Calculate the great circle distance between two points on earth.
-    
-    Args:
-        lat1, lon1: Latitude and longitude of point 1
-        lat2, lon2: Latitude and longitude of point 2
-    
-    Returns:
-        Distance in meters
-    """
-    R = 6371000  # Earth's radius in meters
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(delta_lat / 2) ** 2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * 
-         math.sin(delta_lon / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
+@router.get("/sessions/{session_id}/geofence")
+async def recheck_session_geofence(
+    session_id: int,
+    radius_meters: Optional[float] = Query(None, gt=0, description="Radius to check against (defaults to the session radius)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    session = await db.get(AttendanceSession, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if session.latitude is None or session.longitude is None:
+        raise HTTPException(status_code=400, detail="Session has no location coordinates")
+
+    radius = radius_meters or session.radius_meters
+    if not radius:
+        raise HTTPException(status_code=400, detail="No radius given and the session has none")
+
+    outside = await db.run_sync(records_outside_radius, session, radius)
+    return {
+        "session_id": session.id,
+        "radius_meters": radius,
+        "outside_count": len(outside),
+        "outside": outside,
+    }
+
+
+@router.get("/audit/far-checkins")
+async def audit_far_checkins(
+    min_distance_meters: float = Query(500, gt=0, description="Flag check-ins farther than this from their session"),
+    start_date: Optional[date] = Query(None, description="Filter from date"),
+    end_date: Optional[date] = Query(None, description="Filter until date"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["ADMIN"])),
+):
+
+    far = await db.run_sync(find_far_checkins, min_distance_meters, start_date, end_date)
+    return {
+        "min_distance_meters": min_distance_meters,
+        "count": len(far),
+        "checkins": far,
+    }
+
+
+@router.get("/analytics/me")
+async def get_my_attendance_analytics(
+    start_date: Optional[date] = Query(None, description="Filter from date"),
+    end_date: Optional[date] = Query(None, description="Filter until date"),
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+
+    return await db.run_sync(student_summary, current_user.id, start_date, end_date)
+
+
+@router.get("/analytics/students/{student_id}")
+async def get_student_attendance_analytics(
+    student_id: int,
+    start_date: Optional[date] = Query(None, description="Filter from date"),
+    end_date: Optional[date] = Query(None, description="Filter until date"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    return await db.run_sync(student_summary, student_id, start_date, end_date)
+
+
+@router.get("/analytics/session-names/{session_name}")
+async def get_session_name_attendance_analytics(
+    session_name: str,
+    start_date: Optional[date] = Query(None, description="Filter from date"),
+    end_date: Optional[date] = Query(None, description="Filter until date"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    return await db.run_sync(session_name_summary, session_name, start_date, end_date)
+
+
+@router.get("/analytics/range")
+async def get_date_range_attendance_analytics(
+    start_date: date = Query(..., description="Range start date"),
+    end_date: date = Query(..., description="Range end date"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="End date must be after start date")
+
+    return await db.run_sync(date_range_summary, start_date, end_date)
+
+
+@router.get("/export")
+async def export_attendance(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Export format: csv or ndjson"),
+    start_date: Optional[date] = Query(None, description="Filter from date"),
+    end_date: Optional[date] = Query(None, description="Filter until date"),
+    session_id: Optional[int] = Query(None, description="Filter by session"),
+    student_id: Optional[int] = Query(None, description="Filter by student"),
+    current_user: CurrentUser = Depends(verify_role(["ADMIN"])),
+):
+
+    rows = iter_attendance_rows(start_date, end_date, session_id, student_id)
+    if format == "ndjson":
+        body, media_type = stream_ndjson(rows), "application/x-ndjson"
+    else:
+        body, media_type = stream_csv(rows), "text/csv"
+
+    filename = f"attendance_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.post("/verify-biometric", response_model=BiometricAttendanceResponse)
 async def verify_biometric_attendance(
     request: BiometricAttendanceRequest,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if not idempotency_key:
+        return await _verify_biometric_attendance(request, current_user, db)
+
+    # Retries of the same check-in replay the first outcome without rerunning the face pipeline
+    return await idempotency_store.run(
+        key=f"{current_user.uid}:verify-biometric:{idempotency_key}",
+        fingerprint=idempotency_store.fingerprint(request.model_dump_json()),
+        handler=lambda: _verify_biometric_attendance(request, current_user, db),
+    )
+
+
+async def _verify_biometric_attendance(
+    request: BiometricAttendanceRequest,
+    current_user: CurrentUser,
+    db: AsyncSession,
 ):
     try:
         # Step 1: Validate QR token and find session
@@ -364,7 +692,7 @@ async def verify_biometric_attendance(
         if not session_id:
             raise HTTPException(status_code=400, detail="Session ID not found in QR token")
         
-        session = db.query(AttendanceSession).filter(AttendanceSession.id == session_id).first()
+        session = await db.get(AttendanceSession, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Attendance session not found")
         
@@ -373,47 +701,37 @@ async def verify_biometric_attendance(
             raise HTTPException(status_code=400, detail="This attendance session has been closed")
         
         # Step 3: Check current time against late_until
-        now = datetime.now()
-        if session.late_until and now > session.late_until:
+        now = local_now()
+        if session.late_until and now > as_local(session.late_until):
             raise HTTPException(status_code=400, detail="Attendance marking deadline has passed")
         
         # Step 4: Get user
-        user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        user = await db.get(User, current_user.id)
         
         # Step 5: Check if already marked
-        existing = db.query(AttendanceRecord).filter(
+        existing = await db.scalar(select(AttendanceRecord.id).where(
             AttendanceRecord.session_id == session_id,
             AttendanceRecord.student_id == user.id
-        ).first()
+        ))
         
         if existing:
             raise HTTPException(status_code=400, detail="Attendance already marked for this session")
         
         # Step 6: Validate location radius if session has location and radius
-        if session.location and session.radius_meters:
-            try:
-                # Parse session location (expected format: "latitude,longitude")
-                session_lat, session_lon = map(float, session.location.split(','))
-                distance = haversine_distance(
-                    session_lat, session_lon, 
-                    request.latitude, request.longitude
+        if session.latitude is not None and session.longitude is not None and session.radius_meters:
+            distance = haversine_distance(
+                session.latitude, session.longitude,
+                request.latitude, request.longitude
+            )
+            
+            if distance > session.radius_meters:
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Location validation failed. You are {distance:.0f}m away from the session location"
                 )
-                
-                if distance > session.radius_meters:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Location validation failed. You are {distance:.0f}m away from the session location"
-                    )
-            except Exception as e:
-                if "Location validation failed" in str(e):
-                    raise e
-                print(f"Location validation error: {e}")
-                # Continue if location parsing fails
         
-        # Step 7: Generate face embedding from uploaded image
-        face_embedding = encode_face(request.image_base64)
+        # Step 7: Generate face embedding from uploaded image (CPU bound, off the event loop)
+        face_embedding = await run_in_threadpool(encode_face, request.image_base64)
         if face_embedding is None:
             raise HTTPException(status_code=400, detail="No face detected or multiple faces detected in image")
         
@@ -421,44 +739,48 @@ async def verify_biometric_attendance(
         if not user.face_embedding:
             raise HTTPException(status_code=400, detail="No face registered for this user. Please register your face first.")
         
-        if not verify_face(user.face_embedding, face_embedding):
+        if not await run_in_threadpool(verify_face, user.face_embedding, face_embedding):
             raise HTTPException(status_code=400, detail="Face verification failed. Face does not match registered face.")
         
         # Step 9: Mark attendance
-        check_in_time = now.strftime("%H:%M:%S")
         today_date = now.date()
         
         # Determine status based on time
         is_late = False
         if session.late_until:
-            is_late = now > session.late_until
+            is_late = now > as_local(session.late_until)
         else:
             # Default logic: late after 9 AM
             is_late = now.hour >= 9 and now.minute > 0
         
         status = "LATE" if is_late else "PRESENT"
         
-        attendance = AttendanceRecord(
-            session_id=session_id,
-            student_id=user.id,
+        # The session may have closed during the face pipeline; the insert re-checks it
+        attendance_id = await db.run_sync(
+            insert_check_in,
+            session_id,
+            user.id,
             date=today_date,
             status=status,
-            check_in_time=check_in_time,
-            latitude=str(request.latitude),
-            longitude=str(request.longitude),
+            checked_in_at=now.astimezone(),
+            latitude=request.latitude,
+            longitude=request.longitude,
             face_verified=True,
         )
-        
-        db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
+        if attendance_id is None:
+            raise await _check_in_rejected(db, session_id)
+
+        await db.run_sync(record_status_changes, [(user.id, today_date, session.session_name, None, status)])
+        await db.commit()
+        attendance = await db.get(AttendanceRecord, attendance_id)
+        _publish_check_in(attendance, user)
         
         return {
             "success": True,
             "message": f"Biometric attendance marked as {status}",
             "attendance_id": attendance.id,
             "status": status,
-            "check_in_time": check_in_time
+            "check_in_time": attendance.check_in_time
         }
         
     except HTTPException:
@@ -1,7 +1,13 @@
 from fastapi import APIRouter
 
+from app.core.metrics import metrics
+
 router = APIRouter(prefix="/health", tags=["Health"])
 
 @router.get("/")
 def health_check():
     return {"status": "OK"}
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
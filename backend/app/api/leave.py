@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, update, delete
 from typing import List, Optional
-from datetime import date, datetime
+from datetime import date
 
-from app.db.database import get_db
-from app.core.security import get_current_user, verify_role
+from app.db.database import get_async_db
+from app.core.config import settings
+from app.core.security import CurrentUser, get_current_db_user, verify_role
 from app.schemas.leave import (
     LeaveRequestCreate,
     LeaveRequestResponse,
@@ -16,21 +17,78 @@ from app.schemas.leave import (
     BatchActionRequest,
     BatchActionResponse,
 )
+from app.services.leave_service import (
+    Student,
+    leave_query,
+    leave_total_cache,
+    newest_first,
+    next_cursor,
+    record_leave_status_changes,
+    summarize_status_counts,
+    to_leave_responses,
+)
+from app.services.notification_dispatcher import notification_dispatcher
 from app.services.notification_service import notification_service
-from app.db.models import User, LeaveRequest
+from app.db.models import LeaveRequest, LeaveStatusCounter
 
 router = APIRouter(prefix="/leave", tags=["Leave Management"])
 
+# Page size for /leave/all when a cursor is given without page_size
+DEFAULT_PAGE_SIZE = 100
+
+# Deepest row the deprecated ``page`` parameter of /leave/history may skip to
+MAX_PAGE_OFFSET = 1000
+
+
+async def _keyset_page(
+    db: AsyncSession,
+    query,
+    response: Response,
+    cursor: Optional[str],
+    page_size: int,
+    include_total: bool,
+    total_key: tuple,
+    offset: int = 0,
+) -> List[LeaveRequestResponse]:
+    """
+    Fetch one newest-first page of ``query`` and set the pagination headers.
+
+    X-Next-Cursor is omitted on the last page. X-Total-Count is only computed
+    when asked for, and is cached briefly per filter set.
+    """
+    try:
+        page_query = newest_first(query, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if offset:
+        page_query = page_query.offset(offset)
+    rows = (await db.execute(page_query.limit(page_size + 1))).all()
+
+    cursor_value = next_cursor(rows, page_size)
+    if cursor_value:
+        response.headers["X-Next-Cursor"] = cursor_value
+    response.headers["X-Page-Size"] = str(page_size)
+
+    if include_total:
+        total = leave_total_cache.get(total_key)
+        if total is None:
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+            leave_total_cache.put(total_key, total)
+        response.headers["X-Total-Count"] = str(total)
+
+    return to_leave_responses(rows[:page_size])
+
 
 @router.post("/apply", response_model=LeaveRequestResponse, status_code=status.HTTP_201_CREATED)
 async def apply_leave(
     leave_data: LeaveRequestCreate,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
    
     # Verify user is a student
-    if current_user.get("role") not in ["STUDENT", None]:
+    if current_user.role != "STUDENT":
         raise HTTPException(
             status_code=403,
             detail="Only students can apply for leave"
@@ -43,22 +101,9 @@ async def apply_leave(
             detail="End date must be after start date"
         )
 
-    # Get or create user in database
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        user = User(
-            firebase_uid=current_user["uid"],
-            email=current_user.get("email", ""),
-            name=current_user.get("name", "Student"),
-            role="STUDENT"
-        )
-        db.add(user)
-        db.flush()
-        db.refresh(user)
-
     # Create leave request
     leave_request = LeaveRequest(
-        student_id=user.id,
+        student_id=current_user.id,
         from_date=leave_data.from_date,
         to_date=leave_data.to_date,
         reason=leave_data.reason,
@@ -66,399 +111,311 @@ async def apply_leave(
     )
 
     db.add(leave_request)
-    db.commit()
-    db.refresh(leave_request)
+    await db.run_sync(record_leave_status_changes, [(None, "PENDING")])
+    await db.commit()
+    await db.refresh(leave_request)
 
     return leave_request
 
 
 @router.get("/pending", response_model=List[LeaveRequestResponse])
 async def get_pending_leaves(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
     
-    pending_leaves = db.query(LeaveRequest).filter(
+    rows = await db.execute(leave_query().where(
         LeaveRequest.status == "PENDING"
-    ).order_by(LeaveRequest.created_at.desc()).all()
-
-    # Add student name to each leave request
-    result = []
-    for leave in pending_leaves:
-        student = db.query(User).filter(User.id == leave.student_id).first()
-        leave_data = {
-            "id": leave.id,
-            "student_id": leave.student_id,
-            "student_name": student.name if student else "Unknown",
-            "from_date": leave.from_date,
-            "to_date": leave.to_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "reviewed_by": leave.reviewed_by,
-            "reviewer_name": None,
-            "reviewed_at": leave.reviewed_at,
-            "created_at": leave.created_at
-        }
-        result.append(LeaveRequestResponse(**leave_data))
-
-    return result
+    ).order_by(LeaveRequest.created_at.desc()))
+
+    return to_leave_responses(rows)
 
 
 @router.get("/my", response_model=List[LeaveRequestResponse])
 async def my_leaves(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        return []
-
-    leaves = db.query(LeaveRequest).filter(
-        LeaveRequest.student_id == user.id
-    ).order_by(LeaveRequest.created_at.desc()).all()
-
-    result = []
-    for leave in leaves:
-        reviewer = db.query(User).filter(User.id == leave.reviewed_by).first()
-        leave_data = {
-            "id": leave.id,
-            "student_id": leave.student_id,
-            "student_name": user.name,
-            "from_date": leave.from_date,
-            "to_date": leave.to_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "reviewed_by": leave.reviewed_by,
-            "reviewer_name": reviewer.name if reviewer else None,
-            "reviewed_at": leave.reviewed_at,
-            "created_at": leave.created_at
-        }
-        result.append(LeaveRequestResponse(**leave_data))
-
-    return result
+    rows = await db.execute(leave_query().where(
+        LeaveRequest.student_id == current_user.id
+    ).order_by(LeaveRequest.created_at.desc()))
+
+    return to_leave_responses(rows)
 
 
 @router.get("/all", response_model=List[LeaveRequestResponse])
 async def get_all_leaves(
+    response: Response,
     status_filter: str = None,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["ADMIN"])),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    page_size: Optional[int] = Query(None, ge=1, le=500, description="Items per page; omit for the full list"),
+    include_total: bool = Query(False, description="Return X-Total-Count (cached briefly)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["ADMIN"])),
 ):
    
-    query = db.query(LeaveRequest)
+    query = leave_query()
     
     if status_filter:
-        query = query.filter(LeaveRequest.status == status_filter.upper())
+        query = query.where(LeaveRequest.status == status_filter.upper())
+    
+    if cursor is None and page_size is None:
+        # Unpaginated, as existing clients expect
+        rows = await db.execute(newest_first(query))
+        return to_leave_responses(rows)
+
+    return await _keyset_page(
+        db, query, response,
+        cursor=cursor,
+        page_size=page_size or DEFAULT_PAGE_SIZE,
+        include_total=include_total,
+        total_key=("all", status_filter and status_filter.upper()),
+    )
+
+
+# Registered before /{leave_id}/action, which would otherwise capture "batch"
+@router.post("/batch/action", response_model=BatchActionResponse)
+async def batch_leave_action(
+    action: BatchActionRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+):
+    if not action.leave_ids:
+        raise HTTPException(status_code=400, detail="No leave IDs provided")
+    
+    leave_ids = list(dict.fromkeys(action.leave_ids))
+    if len(leave_ids) > settings.LEAVE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.LEAVE_BATCH_MAX_SIZE} leaves per batch"
+        )
+    
+    # One statement decides every still-pending leave; anything else is left untouched
+    decided = (await db.execute(
+        update(LeaveRequest)
+        .where(
+            LeaveRequest.id.in_(leave_ids),
+            LeaveRequest.status == "PENDING"
+        )
+        .values(
+            status=action.action,
+            reviewed_by=current_user.id,
+            reviewed_at=func.now()
+        )
+        .returning(
+            LeaveRequest.id,
+            LeaveRequest.student_id,
+            LeaveRequest.from_date,
+            LeaveRequest.to_date
+        )
+        .execution_options(synchronize_session=False)
+    )).all()
+    
+    await db.run_sync(record_leave_status_changes, [("PENDING", action.action)] * len(decided))
+    db.add_all(notification_service.build_leave_status_notifications(
+        action.action,
+        [(row.student_id, row.id, f"{row.from_date} to {row.to_date}") for row in decided]
+    ))
+    await db.commit()
+    notification_dispatcher.wake()
     
-    leaves = query.order_by(LeaveRequest.created_at.desc()).all()
-
-    result = []
-    for leave in leaves:
-        student = db.query(User).filter(User.id == leave.student_id).first()
-        reviewer = db.query(User).filter(User.id == leave.reviewed_by).first()
-        leave_data = {
-            "id": leave.id,
-            "student_id": leave.student_id,
-            "student_name": student.name if student else "Unknown",
-            "from_date": leave.from_date,
-            "to_date": leave.to_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "reviewed_by": leave.reviewed_by,
-            "reviewer_name": reviewer.name if reviewer else None,
-            "reviewed_at": leave.reviewed_at,
-            "created_at": leave.created_at
-        }
-        result.append(LeaveRequestResponse(**leave_data))
-
-    return result
+    processed_ids = [row.id for row in decided]
+    processed = set(processed_ids)
+    failed_ids = [
+        {"id": leave_id, "error": "Leave request not found or not pending"}
+        for leave_id in leave_ids if leave_id not in processed
+    ]
+    
+    return BatchActionResponse(
+        success=True,
+        message=f"Processed {len(processed_ids)} leave requests",
+        action=action.action,
+        processed_ids=processed_ids,
+        failed_ids=failed_ids,
+        total_count=len(leave_ids),
+        success_count=len(processed_ids)
+    )
 
 
 @router.post("/{leave_id}/action", response_model=LeaveActionResponse)
 async def leave_action(
     leave_id: int,
     action: LeaveActionRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
 ):
   
-    # Get the leave request
-    leave = db.query(LeaveRequest).filter(LeaveRequest.id == leave_id).first()
-    if not leave:
-        raise HTTPException(status_code=404, detail="Leave request not found")
+    # Decided only if still pending, so concurrent reviewers cannot both win
+    leave = (await db.execute(
+        update(LeaveRequest)
+        .where(
+            LeaveRequest.id == leave_id,
+            LeaveRequest.status == "PENDING"
+        )
+        .values(
+            status=action.action,
+            reviewed_by=current_user.id,
+            reviewed_at=func.now()
+        )
+        .returning(
+            LeaveRequest.id,
+            LeaveRequest.student_id,
+            LeaveRequest.from_date,
+            LeaveRequest.to_date
+        )
+        .execution_options(synchronize_session=False)
+    )).first()
 
-    if leave.status != "PENDING":
+    if leave is None:
+        current_status = await db.scalar(select(LeaveRequest.status).where(LeaveRequest.id == leave_id))
+        if current_status is None:
+            raise HTTPException(status_code=404, detail="Leave request not found")
         raise HTTPException(
             status_code=400,
-            detail=f"Leave request has already been {leave.status.lower()}"
+            detail=f"Leave request has already been {current_status.lower()}"
         )
 
-    reviewer = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not reviewer:
-        reviewer = User(
-            firebase_uid=current_user["uid"],
-            email=current_user.get("email", ""),
-            name=current_user.get("name", "Teacher"),
-            role=current_user.get("role", "TEACHER")
-        )
-        db.add(reviewer)
-        db.flush()
-        db.refresh(reviewer)
-
-    leave.status = action.action
-    leave.reviewed_by = reviewer.id
-
-    student = db.query(User).filter(User.id == leave.student_id).first()
-    date_range = f"{leave.from_date} to {leave.to_date}"
-
-    notification_sent = notification_service.send_leave_status_notification(
-        db=db,
-        student_id=leave.student_id,
-        status=action.action,
-        leave_id=leave.id,
-        date_range=date_range
-    )
+    await db.run_sync(record_leave_status_changes, [("PENDING", action.action)])
+
+    # Queued in the same transaction, delivered by the dispatcher after commit
+    db.add_all(notification_service.build_leave_status_notifications(
+        action.action,
+        [(leave.student_id, leave.id, f"{leave.from_date} to {leave.to_date}")]
+    ))
+
+    await db.commit()
+    notification_dispatcher.wake()
 
-    db.commit()
-    db.refresh(leave)
+    row = (await db.execute(leave_query().where(LeaveRequest.id == leave_id))).one()
 
     return LeaveActionResponse(
         success=True,
-        message=f"Leave request {action.action.lower()}ed successfully"
-                + (" (Notification sent)" if notification_sent else ""),
-        leave_request=LeaveRequestResponse(
-            id=leave.id,
-            student_id=leave.student_id,
-            student_name=student.name if student else "Unknown",
-            from_date=leave.from_date,
-            to_date=leave.to_date,
-            reason=leave.reason,
-            status=leave.status,
-            reviewed_by=leave.reviewed_by,
-            reviewer_name=reviewer.name,
-            reviewed_at=leave.reviewed_at,
-            created_at=leave.created_at
-        )
+        message=f"Leave request {action.action.lower()}ed successfully",
+        leave_request=LeaveRequestResponse(**row._mapping)
     )
 
 
 
 @router.get("/stats", response_model=LeaveStats)
 async def get_leave_stats(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    
-    if user and current_user.get("role") == "STUDENT":
-        base_query = db.query(LeaveRequest).filter(LeaveRequest.student_id == user.id)
+    if current_user.role == "STUDENT":
+        rows = await db.execute(
+            select(LeaveRequest.status, func.count(LeaveRequest.id))
+            .where(LeaveRequest.student_id == current_user.id)
+            .group_by(LeaveRequest.status)
+        )
     else:
-        base_query = db.query(LeaveRequest)
-    
-    total = base_query.count()
-    pending = base_query.filter(LeaveRequest.status == "PENDING").count()
-    approved = base_query.filter(
-        (LeaveRequest.status == "APPROVED") | (LeaveRequest.status == "APPROVE")
-    ).count()
-    rejected = base_query.filter(
-        (LeaveRequest.status == "REJECTED") | (LeaveRequest.status == "REJECT")
-    ).count()
+        # Kept current on apply/action/cancel, so this never scans leave_requests
+        rows = await db.execute(select(LeaveStatusCounter.status, LeaveStatusCounter.count))
     
-    return LeaveStats(
-        total=total,
-        pending=pending,
-        approved=approved,
-        rejected=rejected
-    )
+    return LeaveStats(**summarize_status_counts(rows))
 
 
 @router.get("/history", response_model=List[LeaveRequestResponse])
 async def get_leave_history(
+    response: Response,
     status_filter: Optional[str] = Query(None, description="Filter by status: PENDING, APPROVED, REJECTED"),
     start_date: Optional[date] = Query(None, description="Filter from start date"),
     end_date: Optional[date] = Query(None, description="Filter until end date"),
-    page: int = Query(1, ge=1, description="Page number"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    page: int = Query(1, ge=1, description="Deprecated: follow X-Next-Cursor instead. Ignored when cursor is given"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    include_total: bool = Query(False, description="Return X-Total-Count (cached briefly)"),
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
    
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    
-    if user and current_user.get("role") == "STUDENT":
-        base_query = db.query(LeaveRequest).filter(LeaveRequest.student_id == user.id)
-    else:
-        base_query = db.query(LeaveRequest)
+    base_query = leave_query()
+    student_id = None
+    if current_user.role == "STUDENT":
+        student_id = current_user.id
+        base_query = base_query.where(LeaveRequest.student_id == student_id)
     
     if status_filter:
-        base_query = base_query.filter(LeaveRequest.status == status_filter.upper())
+        base_query = base_query.where(LeaveRequest.status == status_filter.upper())
     
     if start_date:
-        base_query = base_query.filter(LeaveRequest.from_date >= start_date)
+        base_query = base_query.where(LeaveRequest.from_date >= start_date)
     
     if end_date:
-        base_query = base_query.filter(LeaveRequest.to_date <= end_date)
+        base_query = base_query.where(LeaveRequest.to_date <= end_date)
+
+    # The first page is the keyset path; skipping to a later page number is
+    # kept for old clients only, and only as deep as an OFFSET stays cheap
+    offset = 0
+    if cursor is None and page > 1:
+        offset = (page - 1) * page_size
+        if offset >= MAX_PAGE_OFFSET:
+            raise HTTPException(
+                status_code=400,
+                detail=f"page only reaches the first {MAX_PAGE_OFFSET} rows; follow X-Next-Cursor instead"
+            )
+        response.headers["Deprecation"] = "true"
+        response.headers["Warning"] = '299 - "page is deprecated; follow X-Next-Cursor instead"'
     
-    total_count = base_query.count()
-    
-    leaves = base_query.order_by(LeaveRequest.created_at.desc()).offset(
-        (page - 1) * page_size
-    ).limit(page_size).all()
-    
-    result = []
-    for leave in leaves:
-        student = db.query(User).filter(User.id == leave.student_id).first()
-        reviewer = None
-        if leave.reviewed_by:
-            reviewer = db.query(User).filter(User.id == leave.reviewed_by).first()
-        
-        leave_data = {
-            "id": leave.id,
-            "student_id": leave.student_id,
-            "student_name": student.name if student else "Unknown",
-            "from_date": leave.from_date,
-            "to_date": leave.to_date,
-            "reason": leave.reason,
-            "status": leave.status,
-            "reviewed_by": leave.reviewed_by,
-            "reviewer_name": reviewer.name if reviewer else None,
-            "reviewed_at": leave.reviewed_at,
-            "created_at": leave.created_at
-        }
-        result.append(LeaveRequestResponse(**leave_data))
-    
-    from fastapi import Response
-    response = Response(content=result.__repr__())
-    response.headers["X-Total-Count"] = str(total_count)
-    response.headers["X-Page"] = str(page)
-    response.headers["X-Page-Size"] = str(page_size)
-    
-    return result
+    return await _keyset_page(
+        db, base_query, response,
+        cursor=cursor,
+        page_size=page_size,
+        include_total=include_total,
+        total_key=("history", student_id, status_filter and status_filter.upper(), start_date, end_date),
+        offset=offset,
+    )
 
 
 @router.get("/{leave_id}", response_model=dict)
 async def get_leave_detail(
     leave_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    leave = db.query(LeaveRequest).filter(LeaveRequest.id == leave_id).first()
-    if not leave:
+    row = (await db.execute(
+        leave_query(Student.email.label("student_email")).where(LeaveRequest.id == leave_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Leave request not found")
 
-    student = db.query(User).filter(User.id == leave.student_id).first()
-    reviewer = None
-    if leave.reviewed_by:
-        reviewer = db.query(User).filter(User.id == leave.reviewed_by).first()
-
-    return {
-        "id": leave.id,
-        "student_id": leave.student_id,
-        "student_name": student.name if student else "Unknown",
-        "student_email": student.email if student else None,
-        "from_date": leave.from_date,
-        "to_date": leave.to_date,
-        "reason": leave.reason,
-        "status": leave.status,
-        "reviewed_by": leave.reviewed_by,
-        "reviewer_name": reviewer.name if reviewer else None,
-        "reviewed_at": leave.reviewed_at,
-        "created_at": leave.created_at
-    }
-
+    return dict(row._mapping)
 
 
-@router.post("/batch/action", response_model=BatchActionResponse)
-async def batch_leave_action(
-    action: BatchActionRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(verify_role(["TEACHER", "ADMIN"])),
-):
-    if not action.leave_ids:
-        raise HTTPException(status_code=400, detail="No leave IDs provided")
-    
-    if len(action.leave_ids) > 50:
-        raise HTTPException(status_code=400, detail="Maximum 50 leaves per batch")
-    
-    # Get all pending leaves with given IDs
-    leaves = db.query(LeaveRequest).filter(
-        LeaveRequest.id.in_(action.leave_ids),
-        LeaveRequest.status == "PENDING"
-    ).all()
-    
-    processed_ids = []
-    failed_ids = []
-    success_count = 0
-    
-    for leave in leaves:
-        try:
-            leave.status = action.action
-            leave.reviewed_at = datetime.utcnow()
-            
-            # Get reviewer
-            reviewer = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-            if reviewer:
-                leave.reviewer_id = reviewer.id
-            
-            success_count += 1
-            processed_ids.append(leave.id)
-            
-            # Send notification
-            student = db.query(User).filter(User.id == leave.student_id).first()
-            if student:
-                notification_service.send_leave_status_notification(
-                    db=db,
-                    student_id=leave.student_id,
-                    status=action.action,
-                    leave_id=leave.id,
-                    date_range=f"{leave.from_date} to {leave.to_date}"
-                )
-        except Exception as e:
-            failed_ids.append({"id": leave.id, "error": str(e)})
-    
-    db.commit()
-    
-    return BatchActionResponse(
-        success=True,
-        message=f"Processed {success_count} leave requests",
-        action=action.action,
-        processed_ids=processed_ids,
-        failed_ids=failed_ids,
-        total_count=len(action.leave_ids),
-        success_count=success_count
-    )
-
 
 @router.delete("/{leave_id}", response_model=APIResponse)
 async def cancel_leave(
     leave_id: int,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    leave = db.query(LeaveRequest).filter(
+    own_leave = (
         LeaveRequest.id == leave_id,
-        LeaveRequest.student_id == user.id
-    ).first()
+        LeaveRequest.student_id == current_user.id
+    )
     
-    if not leave:
-        raise HTTPException(status_code=404, detail="Leave request not found or unauthorized")
+    # Deleted only if still pending, so a cancel cannot race a decision
+    cancelled = (await db.execute(
+        delete(LeaveRequest)
+        .where(*own_leave, LeaveRequest.status == "PENDING")
+        .returning(LeaveRequest.id)
+        .execution_options(synchronize_session=False)
+    )).first()
     
-    if leave.status != "PENDING":
+    if cancelled is None:
+        current_status = await db.scalar(select(LeaveRequest.status).where(*own_leave))
+        if current_status is None:
+            raise HTTPException(status_code=404, detail="Leave request not found or unauthorized")
         raise HTTPException(
             status_code=400,
-            detail=f"Cannot cancel leave with status: {leave.status}"
+            detail=f"Cannot cancel leave with status: {current_status}"
         )
     
-    db.delete(leave)
-    db.commit()
+    await db.run_sync(record_leave_status_changes, [("PENDING", None)])
+    await db.commit()
     
     return APIResponse(
         success=True,
@@ -1,10 +1,19 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from app.db.database import get_db
-from app.core.security import get_current_user
-from app.schemas.leave import FCMTokenCreate, FCMTokenResponse, APIResponse
-from app.db.models import FCMToken, User
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import get_async_db, upsert_insert
+from app.core.security import CurrentUser, get_current_db_user, verify_role
+from app.schemas.leave import (
+    FCMTokenCreate,
+    FCMTokenResponse,
+    APIResponse,
+    BroadcastCreate,
+    BroadcastResponse,
+)
+from app.db.models import AttendanceSession, FCMToken, NotificationBroadcast
+from app.services.broadcast_service import broadcast_service
 
 router = APIRouter(prefix="/notifications", tags=["Push Notifications"])
 
@@ -12,43 +21,25 @@ router = APIRouter(prefix="/notifications", tags=["Push Notifications"])
 @router.post("/fcm-token", response_model=APIResponse)
 async def save_fcm_token(
     token_data: FCMTokenCreate,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
- 
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        user = User(
-            firebase_uid=current_user["uid"],
-            email=current_user.get("email", ""),
-            name=current_user.get("name", "User"),
-            role="STUDENT"
-        )
-        db.add(user)
-        db.flush()
-        db.refresh(user)
-
-    existing_token = db.query(FCMToken).filter(
-        FCMToken.user_id == user.id,
-        FCMToken.token == token_data.token
-    ).first()
-
-    if existing_token:
-        existing_token.device_type = token_data.device_type
-        db.commit()
-        return APIResponse(
-            success=True,
-            message="FCM token updated successfully"
-        )
-
-    fcm_token = FCMToken(
-        user_id=user.id,
+    # One row per device: re-registering a token moves it to the current user
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(FCMToken).values(
+        user_id=current_user.id,
         token=token_data.token,
         device_type=token_data.device_type
     )
-
-    db.add(fcm_token)
-    db.commit()
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["token"],
+        set_={
+            "user_id": stmt.excluded.user_id,
+            "device_type": stmt.excluded.device_type,
+            "updated_at": func.now(),
+        },
+    ))
+    await db.commit()
 
     return APIResponse(
         success=True,
@@ -59,24 +50,20 @@ async def save_fcm_token(
 @router.delete("/fcm-token", response_model=APIResponse)
 async def delete_fcm_token(
     token: str,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
    
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    token_entry = db.query(FCMToken).filter(
-        FCMToken.user_id == user.id,
+    token_entry = await db.scalar(select(FCMToken).where(
+        FCMToken.user_id == current_user.id,
         FCMToken.token == token
-    ).first()
+    ))
 
     if not token_entry:
         raise HTTPException(status_code=404, detail="Token not found")
 
-    db.delete(token_entry)
-    db.commit()
+    await db.delete(token_entry)
+    await db.commit()
 
     return APIResponse(
         success=True,
@@ -86,15 +73,11 @@ async def delete_fcm_token(
 
 @router.get("/tokens", response_model=list)
 async def get_my_tokens(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     
-    user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-    if not user:
-        return []
-
-    tokens = db.query(FCMToken).filter(FCMToken.user_id == user.id).all()
+    tokens = (await db.scalars(select(FCMToken).where(FCMToken.user_id == current_user.id))).all()
     return [
         {
             "id": t.id,
@@ -105,3 +88,50 @@ async def get_my_tokens(
         for t in tokens
     ]
 
+
+@router.post("/broadcasts", response_model=BroadcastResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_broadcast(
+    broadcast_data: BroadcastCreate,
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Accepted once recorded; the fan-out runs in the background, poll GET /broadcasts/{id}
+    course_name = broadcast_data.course_name
+    if broadcast_data.session_id is not None:
+        session = await db.get(AttendanceSession, broadcast_data.session_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        course_name = session.course_name or session.session_name
+    if not course_name:
+        raise HTTPException(status_code=422, detail="Either session_id or course_name is required")
+
+    data = {"type": "BROADCAST", **(broadcast_data.data or {})}
+    if broadcast_data.session_id is not None:
+        data["session_id"] = str(broadcast_data.session_id)
+
+    broadcast = NotificationBroadcast(
+        course_name=course_name,
+        session_id=broadcast_data.session_id,
+        created_by=current_user.id,
+        title=broadcast_data.title,
+        body=broadcast_data.body,
+        data=json.dumps(data),
+    )
+    db.add(broadcast)
+    await db.commit()
+    await db.refresh(broadcast)
+
+    broadcast_service.submit(broadcast.id)
+    return broadcast
+
+
+@router.get("/broadcasts/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast(
+    broadcast_id: int,
+    current_user: CurrentUser = Depends(verify_role(["TEACHER", "ADMIN"])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    broadcast = await db.get(NotificationBroadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return broadcast
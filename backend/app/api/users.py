@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import json
 
-from app.db.database import get_db
-from app.core.security import get_current_user
+from app.db.database import get_async_db
+from app.core.security import CurrentUser, get_current_db_user, require_admin, verify_role
+from app.core.idempotency import idempotency_store
+from app.core.token_cache import token_cache
+from app.core.user_cache import user_cache
 from app.db.models import User
 from app.services.face_service import encode_face, embedding_to_string
 
@@ -24,6 +29,10 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UpdateRoleRequest(BaseModel):
+    role: str = Field(..., pattern="^(STUDENT|TEACHER|ADMIN)$")
+
+
 class RegisterFaceRequest(BaseModel):
     image_base64: str
 
@@ -44,20 +53,12 @@ class UserProfileResponse(BaseModel):
 
 @router.get("/", response_model=List[UserResponse])
 async def get_all_users(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(verify_role(["ADMIN", "TEACHER"])),
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        # Verify user is admin or teacher
-        user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        if user.role not in ["ADMIN", "TEACHER"]:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
         # Get all users
-        users = db.query(User).all()
+        users = (await db.scalars(select(User))).all()
         return [
             UserResponse(
                 id=user.id,
@@ -84,6 +85,7 @@ async def users_root():
         "available_endpoints": {
             "GET /users/": "Get all users (admin/teacher only)",
             "GET /users/me": "Get current user profile",
+            "PUT /users/{user_id}/role": "Change a user's role (admin only)",
             "POST /users/register-face": "Register face for biometric attendance"
         }
     }
@@ -91,14 +93,11 @@ async def users_root():
 
 @router.get("/me", response_model=UserProfileResponse)
 async def get_current_user_profile(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        # Find user by Firebase UID
-        user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        user = await db.get(User, current_user.id)
         
         return {
             "id": user.id,
@@ -115,27 +114,69 @@ async def get_current_user_profile(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.put("/{user_id}/role", response_model=UserResponse)
+async def update_user_role(
+    user_id: int,
+    request: UpdateRoleRequest,
+    current_user: CurrentUser = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    user.role = request.role
+    await db.commit()
+
+    # Their cached role and any token carrying the old role claim stop working now
+    user_cache.invalidate(user.firebase_uid)
+    token_cache.revoke_uid(user.firebase_uid)
+
+    return UserResponse(
+        id=user.id,
+        firebase_uid=user.firebase_uid,
+        email=user.email,
+        name=user.name,
+        role=user.role,
+        face_registered=bool(user.face_embedding)
+    )
+
+
 @router.post("/register-face", response_model=RegisterFaceResponse)
 async def register_face(
     request: RegisterFaceRequest,
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_db_user),
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if not idempotency_key:
+        return await _register_face(request, current_user, db)
+
+    # Retries replay the first outcome instead of re-encoding and overwriting the embedding
+    return await idempotency_store.run(
+        key=f"{current_user.uid}:register-face:{idempotency_key}",
+        fingerprint=idempotency_store.fingerprint(request.model_dump_json()),
+        handler=lambda: _register_face(request, current_user, db),
+    )
+
+
+async def _register_face(
+    request: RegisterFaceRequest,
+    current_user: CurrentUser,
+    db: AsyncSession,
 ):
     try:
-        # Find user by Firebase UID
-        user = db.query(User).filter(User.firebase_uid == current_user["uid"]).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        user = await db.get(User, current_user.id)
         
         # Generate face embedding from uploaded image
-        face_embedding = encode_face(request.image_base64)
+        face_embedding = await run_in_threadpool(encode_face, request.image_base64)
         if face_embedding is None:
             raise HTTPException(status_code=400, detail="No face detected or multiple faces detected in image")
         
         # Store face embedding as JSON string
         user.face_embedding = embedding_to_string(face_embedding)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         return {
             "success": True,
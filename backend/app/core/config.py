@@ -4,7 +4,93 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Settings:
-    DATABASE_URL = os.getenv("DATABASE_URL")
+    DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./attendance.db"
     FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
 
+    # Connection pool per engine and process; size it for uvicorn workers x (pool + overflow)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10"))
+    # Postgres statement_timeout
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+    DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+    # PRAGMAs applied to every SQLite connection; an empty value leaves SQLite's default
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS = os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")
+    SQLITE_MMAP_SIZE = os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = os.getenv("SQLITE_CACHE_SIZE", "-65536")  # Negative means KiB, so 64 MiB
+
+    # Background auto-close of sessions whose late_until has passed
+    SESSION_SWEEP_ENABLED = os.getenv("SESSION_SWEEP_ENABLED", "true").lower() == "true"
+    SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "60"))
+    SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "100"))
+
+    # Idempotency-Key replay store for check-in and face registration
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+
+    # Verified ID token cache; TOKEN_CHECK_REVOKED bypasses it and asks Firebase every time
+    TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+    TOKEN_CHECK_REVOKED = os.getenv("TOKEN_CHECK_REVOKED", "false").lower() == "true"
+
+    # ID token verification backend: firebase | keyset (offline, local key copy) | local (test tokens)
+    TOKEN_VERIFIER = os.getenv("TOKEN_VERIFIER", "firebase")
+    TOKEN_KEYS_URL = os.getenv(
+        "TOKEN_KEYS_URL",
+        "https://www.googleapis.com/service_accounts/v1/jwk/securetoken@system.gserviceaccount.com",
+    )
+    TOKEN_KEYS_REFRESH_SECONDS = float(os.getenv("TOKEN_KEYS_REFRESH_SECONDS", "3600"))
+    TOKEN_LOCAL_PRIVATE_KEY_PATH = os.getenv("TOKEN_LOCAL_PRIVATE_KEY_PATH")
+
+    # uid -> (user id, role) cache used to resolve the current user
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+    # How long X-Total-Count values on paginated leave lists are reused
+    LEAVE_TOTAL_COUNT_TTL_SECONDS = float(os.getenv("LEAVE_TOTAL_COUNT_TTL_SECONDS", "30"))
+
+    # Events buffered per live attendance feed subscriber before a slow one starts losing them.
+    # The feed is in-process: an SSE connection only sees check-ins and closes handled by the
+    # same worker process, so run a single worker (or pin a session's traffic to one) while
+    # teachers rely on GET /attendance/session/{id}/live
+    LIVE_FEED_MAX_QUEUE_SIZE = int(os.getenv("LIVE_FEED_MAX_QUEUE_SIZE", "1000"))
+
+    # Upper bound on leave ids per POST /leave/batch/action
+    LEAVE_BATCH_MAX_SIZE = int(os.getenv("LEAVE_BATCH_MAX_SIZE", "5000"))
+
+    # Background delivery of the notification outbox
+    NOTIFICATION_DISPATCH_ENABLED = os.getenv("NOTIFICATION_DISPATCH_ENABLED", "true").lower() == "true"
+    NOTIFICATION_DISPATCH_INTERVAL_SECONDS = float(os.getenv("NOTIFICATION_DISPATCH_INTERVAL_SECONDS", "2"))
+    NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", "500"))
+    NOTIFICATION_DISPATCH_CHUNK_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_CHUNK_SIZE", "100"))
+    NOTIFICATION_DISPATCH_CONCURRENCY = int(os.getenv("NOTIFICATION_DISPATCH_CONCURRENCY", "4"))
+    NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+    NOTIFICATION_RETRY_BASE_SECONDS = float(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", "5"))
+    NOTIFICATION_RETRY_MAX_SECONDS = float(os.getenv("NOTIFICATION_RETRY_MAX_SECONDS", "600"))
+    NOTIFICATION_CLAIM_TTL_SECONDS = float(os.getenv("NOTIFICATION_CLAIM_TTL_SECONDS", "300"))
+    # New outbox entries wait this long so a recipient's messages merge into one digest; 0 disables
+    NOTIFICATION_COALESCE_WINDOW_SECONDS = float(os.getenv("NOTIFICATION_COALESCE_WINDOW_SECONDS", "5"))
+    # Threads sending 500-message requests concurrently
+    NOTIFICATION_SEND_THREADS = int(os.getenv("NOTIFICATION_SEND_THREADS", "8"))
+
+    # Push delivery backend: firebase | local (in-process FCM stand-in for load tests)
+    NOTIFICATION_TRANSPORT = os.getenv("NOTIFICATION_TRANSPORT", "firebase")
+    NOTIFICATION_LOCAL_LATENCY_MS = float(os.getenv("NOTIFICATION_LOCAL_LATENCY_MS", "50"))
+    NOTIFICATION_LOCAL_FAILURE_RATE = float(os.getenv("NOTIFICATION_LOCAL_FAILURE_RATE", "0"))
+    NOTIFICATION_LOCAL_UNREGISTERED_RATE = float(os.getenv("NOTIFICATION_LOCAL_UNREGISTERED_RATE", "0"))
+    NOTIFICATION_LOCAL_QUOTA_PER_SECOND = int(os.getenv("NOTIFICATION_LOCAL_QUOTA_PER_SECOND", "0"))
+    NOTIFICATION_LOCAL_SEED = int(os.environ["NOTIFICATION_LOCAL_SEED"]) if os.getenv("NOTIFICATION_LOCAL_SEED") else None
+
+    # Course-wide broadcasts: tokens per request and a token bucket on devices sent per second
+    NOTIFICATION_BROADCAST_CHUNK_SIZE = int(os.getenv("NOTIFICATION_BROADCAST_CHUNK_SIZE", "500"))
+    NOTIFICATION_BROADCAST_RATE_PER_SECOND = float(os.getenv("NOTIFICATION_BROADCAST_RATE_PER_SECOND", "1000"))
+    NOTIFICATION_BROADCAST_BURST = int(os.getenv("NOTIFICATION_BROADCAST_BURST", "1000"))
+    # A sender renews its lease after every chunk; broadcasts whose lease ran out are resumed on startup
+    NOTIFICATION_BROADCAST_LEASE_SECONDS = float(os.getenv("NOTIFICATION_BROADCAST_LEASE_SECONDS", "300"))
+
 settings = Settings()
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at: Optional[float] = None  # Set once the request completes
+
+
+class IdempotencyStore:
+    """
+    Bounded in-process store of Idempotency-Key -> response.
+
+    The first request for a key runs the handler; duplicates that arrive
+    while it is still running wait on the same future, and later duplicates
+    get the cached outcome until it expires. Client errors (4xx) are cached
+    like successes, server errors are not so the client can retry.
+
+    ``max_entries`` bounds completed entries only. In-flight entries are
+    never evicted, or a retry could miss them and run the handler twice.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._in_flight = 0
+
+    @staticmethod
+    def fingerprint(payload: str) -> str:
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _evict(self) -> None:
+        excess = len(self._entries) - self._in_flight - self.max_entries
+        if excess <= 0:
+            return
+        # Least recently used first; in-flight entries sit near the end, so this stops early
+        evicted = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is not None:
+                evicted.append(key)
+                if len(evicted) == excess:
+                    break
+        for key in evicted:
+            del self._entries[key]
+
+    async def run(self, key: str, fingerprint: str, handler: Callable[[], Awaitable]):
+        """Run ``handler`` once per key and replay its outcome for duplicates"""
+        entry = self._lookup(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            return await asyncio.shield(entry.future)
+
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[key] = entry
+        self._in_flight += 1
+
+        try:
+            result = await handler()
+        except HTTPException as e:
+            self._complete(key, entry, error=e, cache=e.status_code < 500)
+            raise
+        except BaseException as e:
+            self._complete(key, entry, error=e, cache=False)
+            raise
+
+        self._complete(key, entry, result=result)
+        return result
+
+    def _complete(self, key: str, entry: _Entry, result=None, error: BaseException = None, cache: bool = True) -> None:
+        self._in_flight -= 1
+        if isinstance(error, asyncio.CancelledError):
+            # Waiting duplicates get a response they can retry instead of the cancellation
+            error = HTTPException(
+                status_code=503,
+                detail="The original request with this Idempotency-Key was interrupted; retry it",
+                headers={"Retry-After": "1"},
+            )
+        if error is not None:
+            entry.future.set_exception(error)
+            # Waiters re-raise it; mark it retrieved so asyncio does not warn
+            entry.future.exception()
+        else:
+            entry.future.set_result(result)
+
+        if cache:
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+            self._evict()
+        elif self._entries.get(key) is entry:
+            del self._entries[key]
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+)
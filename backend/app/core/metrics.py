@@ -0,0 +1,37 @@
+import threading
+from typing import Dict
+
+
+class Metrics:
+    """Minimal in-process metrics registry (counters and timings)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one duration sample in seconds"""
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "last": 0.0, "max": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["last"] = seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {name: dict(timing) for name, timing in self._timings.items()},
+            }
+
+
+# Singleton instance
+metrics = Metrics()
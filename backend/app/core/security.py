@@ -1,14 +1,19 @@
 from functools import wraps
 from fastapi import Header, HTTPException, Depends, status
-from typing import List
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.token_cache import token_cache
+from app.core.token_verifier import token_verifier
+from app.core.user_cache import user_cache
+from app.db.database import get_async_db, upsert_insert
 from app.db.models import User
 
 
 def get_current_user(authorization: str = Header(None)):
    
-    from firebase_admin import auth
     try:
         if authorization is None:
             raise HTTPException(
@@ -23,7 +28,24 @@ def get_current_user(authorization: str = Header(None)):
         else:
             token = authorization
             
-        decoded_token = auth.verify_id_token(token)
+        if settings.TOKEN_CHECK_REVOKED:
+            decoded_token = token_verifier.verify(token, check_revoked=True)
+        else:
+            decoded_token = token_cache.get(token)
+            if decoded_token is not None:
+                metrics.increment("token_cache_hits")
+            else:
+                metrics.increment("token_cache_misses")
+                decoded_token = token_verifier.verify(token)
+                if not token_cache.is_revoked(decoded_token):
+                    token_cache.put(token, decoded_token)
+
+        # Tokens issued before an admin changed the user's role (PUT /users/{id}/role)
+        if token_cache.is_revoked(decoded_token):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has been revoked; sign in again"
+            )
         return decoded_token
     except Exception as e:
         raise HTTPException(
@@ -32,50 +54,100 @@ def get_current_user(authorization: str = Header(None)):
         )
 
 
-def _get_user_role_from_db(firebase_uid: str, db: Session) -> str:
-  
-    user = db.query(User).filter(User.firebase_uid == firebase_uid).first()
-    if user:
-        return user.role
-    return "STUDENT"
+class CurrentUser:
+    """
+    The authenticated caller: decoded token claims plus their users row id.
+
+    ``role`` is the token's role claim, falling back to the stored role, as
+    verify_role and the handlers have always read it. ``stored_role`` is the
+    users row's role alone, which require_admin/teacher/student trust.
+    """
+
+    __slots__ = ("id", "uid", "role", "stored_role", "email", "name", "claims")
+
+    def __init__(self, id: int, role: str, stored_role: str, claims: dict):
+        self.id = id
+        self.uid = claims["uid"]
+        self.role = role
+        self.stored_role = stored_role
+        self.email = claims.get("email", "")
+        self.name = claims.get("name", "User")
+        self.claims = claims
+
+
+async def _resolve_user(db: AsyncSession, claims: dict) -> Tuple[int, Optional[str]]:
+    """Look up (or create on first sight) the users row for a token. Returns (id, role)."""
+    uid = claims["uid"]
+    cached = user_cache.get(uid)
+    if cached is not None:
+        return cached
+
+    query = select(User.id, User.role).where(User.firebase_uid == uid)
+    row = (await db.execute(query)).first()
+    if row is None:
+        insert = upsert_insert(db.get_bind())
+        await db.execute(
+            insert(User)
+            .values(
+                firebase_uid=uid,
+                email=claims.get("email", ""),
+                name=claims.get("name", "User"),
+                role=claims.get("role") or "STUDENT",
+            )
+            .on_conflict_do_nothing()
+        )
+        await db.commit()
+        row = (await db.execute(query)).first()
+        if row is None:
+            # The conflict was on another column (email), not a concurrent insert of this uid
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A different account is already registered with this email"
+            )
+
+    user_cache.put(uid, row.id, row.role)
+    return row.id, row.role
+
+
+async def get_current_db_user(
+    claims: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
+    """
+    Resolve the caller once per request.
+
+    FastAPI caches dependencies per request, so role checks and handlers that
+    both depend on this share one lookup (and one database session).
+    """
+    user_id, db_role = await _resolve_user(db, claims)
+    stored_role = db_role or "STUDENT"
+    # A role custom claim on the token wins over the stored role, except in require_*
+    role = claims.get("role") or stored_role
+    return CurrentUser(id=user_id, role=role, stored_role=stored_role, claims=claims)
 
 
 def verify_role(allowed_roles: List[str]):
    
-    def role_verifier(
-        current_user: dict = Depends(get_current_user),
-        db: Session = Depends(get_db)
-    ) -> dict:
+    async def role_verifier(
+        current_user: CurrentUser = Depends(get_current_db_user)
+    ) -> CurrentUser:
         
-        user_role = current_user.get("role")
-        
-        if user_role is None or user_role == "":
-            user_role = _get_user_role_from_db(current_user.get("uid", ""), db)
-        
-        if user_role is None or user_role == "":
-            user_role = "STUDENT"
-        
-        if "ADMIN" in allowed_roles and user_role == "ADMIN":
-            return current_user
-        
-        if user_role in allowed_roles:
+        if current_user.role in allowed_roles:
             return current_user
         
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"Access denied. Required roles: {', '.join(allowed_roles)}. Your role: {user_role}"
+            detail=f"Access denied. Required roles: {', '.join(allowed_roles)}. Your role: {current_user.role}"
         )
     
     return role_verifier
 
 
-def require_admin(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-) -> dict:
+async def require_admin(
+    current_user: CurrentUser = Depends(get_current_db_user)
+) -> CurrentUser:
     
-    user_role = _get_user_role_from_db(current_user.get("uid", ""), db)
-    if user_role != "ADMIN":
+    if current_user.stored_role != "ADMIN":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
@@ -83,13 +155,11 @@ def require_admin(
     return current_user
 
 
-def require_teacher(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-) -> dict:
+async def require_teacher(
+    current_user: CurrentUser = Depends(get_current_db_user)
+) -> CurrentUser:
    
-    user_role = _get_user_role_from_db(current_user.get("uid", ""), db)
-    if user_role not in ["TEACHER", "ADMIN"]:
+    if current_user.stored_role not in ["TEACHER", "ADMIN"]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Teacher or Admin access required"
@@ -97,16 +167,13 @@ def require_teacher(
     return current_user
 
 
-def require_student(
-    current_user: dict = Depends(get_current_user),
-    db: Session = Depends(get_db)
-) -> dict:
+async def require_student(
+    current_user: CurrentUser = Depends(get_current_db_user)
+) -> CurrentUser:
     
-    user_role = _get_user_role_from_db(current_user.get("uid", ""), db)
-    if user_role != "STUDENT":
+    if current_user.stored_role != "STUDENT":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Student access required"
         )
     return current_user
-
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Firebase ID tokens are valid for at most an hour, so older revocations can be forgotten
+MAX_TOKEN_LIFETIME_SECONDS = 3600
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified ID token -> decoded claims.
+
+    Entries are keyed by a hash of the token (the raw token is never kept)
+    and live until the token's own ``exp`` claim. Thread-safe, since
+    ``get_current_user`` runs in the threadpool.
+
+    ``revoke_uid`` also refuses a user's tokens issued up to the moment of
+    revocation, cached or not, so their next request needs a fresh token.
+    Like the cache itself, revocations are per process.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}  # uid -> time.time() of revocation
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        expires_at = claims.get("exp")
+        if not expires_at or self.max_entries <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke_uid(self, uid: str) -> int:
+        """
+        Drop every cached token for a user and refuse the ones issued so far.
+
+        Returns:
+            int: Number of cached entries removed
+        """
+        now = time.time()
+        with self._lock:
+            keys = [key for key, (claims, _) in self._entries.items() if claims.get("uid") == uid]
+            for key in keys:
+                del self._entries[key]
+            self._revoked[uid] = now
+            for revoked_uid, revoked_at in list(self._revoked.items()):
+                if revoked_at < now - MAX_TOKEN_LIFETIME_SECONDS:
+                    del self._revoked[revoked_uid]
+        return len(keys)
+
+    def is_revoked(self, claims: dict) -> bool:
+        """Whether ``claims`` belong to a token issued before its user was revoked"""
+        revoked_at = self._revoked.get(claims.get("uid"))
+        if revoked_at is None:
+            return False
+        issued_at = claims.get("iat") or claims.get("auth_time") or 0
+        # iat has whole-second precision, so the revocation second itself is refused too
+        return issued_at <= int(revoked_at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._revoked.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Singleton instance
+token_cache = TokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES)
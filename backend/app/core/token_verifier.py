@@ -0,0 +1,232 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _firebase_claims(claims: dict) -> dict:
+    # Firebase exposes the subject as "uid"; the rest of the app relies on it
+    claims.setdefault("uid", claims["sub"])
+    return claims
+
+
+class TokenVerifier(ABC):
+    """Verifies an ID token and returns its decoded claims in Firebase's layout"""
+
+    @abstractmethod
+    def verify(self, token: str, check_revoked: bool = False) -> dict:
+        ...
+
+    def start(self) -> None:
+        """Start any background work. Called on app startup."""
+
+    async def stop(self) -> None:
+        """Stop background work. Called on app shutdown."""
+
+
+class FirebaseTokenVerifier(TokenVerifier):
+    """Verification through firebase_admin (Google-managed certs, revocation checks)"""
+
+    def verify(self, token: str, check_revoked: bool = False) -> dict:
+        from firebase_admin import auth
+        return auth.verify_id_token(token, check_revoked=check_revoked)
+
+
+class KeySetTokenVerifier(TokenVerifier):
+    """
+    Verifies RS256 ID tokens offline against a local copy of the signing keys.
+
+    ``source`` is a URL or file path holding either a JWKS document or a
+    ``{kid: PEM}`` map (certificates or public keys, as served by Google's
+    x509 endpoint). Keys are refreshed in the background so the request
+    path never waits on a fetch, except once when an unknown kid shows up.
+    Revocation cannot be checked offline, ``check_revoked`` is ignored.
+    """
+
+    # Minimum gap between on-demand refreshes triggered by unknown kids
+    MIN_REFRESH_INTERVAL_SECONDS = 60
+
+    def __init__(self, source: str, audience: str, issuer: str, refresh_seconds: float):
+        self.source = source
+        self.audience = audience
+        self.issuer = issuer
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._keys: Dict[str, object] = {}
+        self._loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _fetch(self) -> dict:
+        if self.source.startswith(("http://", "https://")):
+            with urllib.request.urlopen(self.source, timeout=10) as response:
+                return json.load(response)
+        with open(self.source) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _parse_keys(document: dict) -> Dict[str, object]:
+        if "keys" in document:
+            return {jwk["kid"]: jwt.PyJWK(jwk).key for jwk in document["keys"]}
+
+        keys = {}
+        for kid, pem in document.items():
+            data = pem.encode()
+            if b"BEGIN CERTIFICATE" in data:
+                keys[kid] = x509.load_pem_x509_certificate(data).public_key()
+            else:
+                keys[kid] = serialization.load_pem_public_key(data)
+        return keys
+
+    def refresh(self) -> None:
+        keys = self._parse_keys(self._fetch())
+        with self._lock:
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+        logger.info(f"Loaded {len(keys)} token signing keys from {self.source}")
+
+    def _key_for(self, kid: Optional[str]):
+        with self._lock:
+            key = self._keys.get(kid)
+            loaded_at = self._loaded_at
+        if key is None and (
+            loaded_at is None
+            or time.monotonic() - loaded_at > self.MIN_REFRESH_INTERVAL_SECONDS
+        ):
+            self.refresh()
+            with self._lock:
+                key = self._keys.get(kid)
+        if key is None:
+            raise ValueError(f"Unknown token signing key: {kid}")
+        return key
+
+    def verify(self, token: str, check_revoked: bool = False) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        claims = jwt.decode(
+            token,
+            self._key_for(kid),
+            algorithms=["RS256"],
+            audience=self.audience,
+            issuer=self.issuer,
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        return _firebase_claims(claims)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # Keep serving with the keys we already have
+                logger.error(f"Token key refresh failed: {e}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class LocalTestTokenVerifier(TokenVerifier):
+    """
+    Issues and verifies RS256 tokens signed with a local key, so load tests
+    and the test suite run offline with real signature costs. Never enable
+    this in production: anyone holding the key can mint tokens.
+
+    Pass ``private_key_path`` to share one key between the API workers and
+    the process issuing tokens; otherwise a throwaway key is generated.
+    """
+
+    def __init__(self, audience: str, issuer: str, private_key_path: Optional[str] = None):
+        self.audience = audience
+        self.issuer = issuer
+        if private_key_path:
+            with open(private_key_path, "rb") as f:
+                self._private_key = serialization.load_pem_private_key(f.read(), password=None)
+        else:
+            self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._public_key = self._private_key.public_key()
+
+    def issue(
+        self,
+        uid: str,
+        role: Optional[str] = None,
+        email: Optional[str] = None,
+        name: Optional[str] = None,
+        ttl_seconds: int = 3600,
+    ) -> str:
+        """Sign an ID token for ``uid`` with the same claim layout as Firebase"""
+        now = int(time.time())
+        claims = {
+            "iss": self.issuer,
+            "aud": self.audience,
+            "sub": uid,
+            "iat": now,
+            "auth_time": now,
+            "exp": now + ttl_seconds,
+        }
+        if role:
+            claims["role"] = role
+        if email:
+            claims["email"] = email
+        if name:
+            claims["name"] = name
+        return jwt.encode(claims, self._private_key, algorithm="RS256", headers={"kid": "local-test"})
+
+    def verify(self, token: str, check_revoked: bool = False) -> dict:
+        claims = jwt.decode(
+            token,
+            self._public_key,
+            algorithms=["RS256"],
+            audience=self.audience,
+            issuer=self.issuer,
+            options={"require": ["exp", "iat", "sub"]},
+        )
+        return _firebase_claims(claims)
+
+
+def build_token_verifier(backend: str) -> TokenVerifier:
+    project_id = settings.FIREBASE_PROJECT_ID or "attendance-local"
+    issuer = f"https://securetoken.google.com/{project_id}"
+
+    if backend == "firebase":
+        return FirebaseTokenVerifier()
+    if backend == "keyset":
+        return KeySetTokenVerifier(
+            source=settings.TOKEN_KEYS_URL,
+            audience=project_id,
+            issuer=issuer,
+            refresh_seconds=settings.TOKEN_KEYS_REFRESH_SECONDS,
+        )
+    if backend == "local":
+        logger.warning("Using locally signed test tokens; do not enable this in production")
+        return LocalTestTokenVerifier(
+            audience=project_id,
+            issuer=issuer,
+            private_key_path=settings.TOKEN_LOCAL_PRIVATE_KEY_PATH,
+        )
+    raise ValueError(f"Unknown TOKEN_VERIFIER backend: {backend}")
+
+
+# Singleton instance
+token_verifier = build_token_verifier(settings.TOKEN_VERIFIER)
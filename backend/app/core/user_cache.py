@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+
+class UserCache:
+    """
+    Short-lived, bounded map of Firebase uid -> (users.id, users.role).
+
+    Lets authenticated requests skip the user lookup entirely. The TTL keeps
+    role changes made directly in the database from lingering; call
+    ``invalidate`` when changing a user's role in-process.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[int, Optional[str], float]]" = OrderedDict()
+
+    def get(self, uid: str) -> Optional[Tuple[int, Optional[str]]]:
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+            user_id, role, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[uid]
+                return None
+            self._entries.move_to_end(uid)
+            return user_id, role
+
+    def put(self, uid: str, user_id: int, role: Optional[str]) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[uid] = (user_id, role, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid: str) -> None:
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton instance
+user_cache = UserCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
@@ -1,13 +1,96 @@
-from sqlalchemy import create_engine
+from typing import Dict
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
 from app.db.base import Base
 
+
+def engine_options(url: str) -> dict:
+    """
+    Keyword arguments for create_engine/create_async_engine on ``url``.
+
+    Pool settings apply to every dialect except in-memory SQLite, which
+    lives in a single connection. Timeouts are passed the way each driver
+    expects them; SQLite's lock wait is the busy_timeout PRAGMA instead.
+    """
+    parsed = make_url(url)
+    backend, driver = parsed.get_backend_name(), parsed.get_driver_name()
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            return options
+    elif backend == "postgresql":
+        if driver == "asyncpg":
+            options["connect_args"] = {
+                "timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+                "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+            }
+        else:
+            options["connect_args"] = {
+                "connect_timeout": settings.DB_CONNECT_TIMEOUT_SECONDS,
+                "options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}",
+            }
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    return options
+
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """Configured PRAGMAs for SQLite connections, in the order they are applied"""
+    pragmas = {
+        # WAL lets readers run alongside the single writer; NORMAL skips the
+        # per-commit fsync, which WAL keeps safe against corruption
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+    return {name: value for name, value in pragmas.items() if value}
+
+
+def apply_sqlite_pragmas(engine, pragmas: Dict[str, str]) -> None:
+    """Run ``pragmas`` on every new DBAPI connection of a SQLite engine"""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+# Drivers from requirements.txt, used when DATABASE_URL does not name one
+SYNC_DRIVERS = {
+    "postgresql": "psycopg2",
+}
+
+
+def to_sync_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = SYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{parsed.drivername}+{driver}").render_as_string(hide_password=False)
+
+
 # Create database engine
-DATABASE_URL = "sqlite:///./attendance.db"
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+DATABASE_URL = to_sync_url(settings.DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+apply_sqlite_pragmas(engine, sqlite_pragmas())
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -16,6 +99,35 @@ SessionLocal = sessionmaker(
 )
 
 
+# Async drivers used for the same database by the async engine
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap a sync database URL's driver for its async counterpart"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+# Async engine for request handlers, so queries do not block the event loop
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+apply_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -25,7 +137,24 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and bring existing ones up to date"""
+    from app.db.migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
 
+def upsert_insert(bind):
+    """Return the dialect's insert() construct, which supports ON CONFLICT upserts"""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
@@ -0,0 +1,271 @@
+"""
+Idempotent schema migrations applied on startup.
+
+``Base.metadata.create_all`` only creates tables that are missing, so columns
+added to existing tables are brought in here. Every step inspects the live
+schema first and is safe to run on every boot.
+"""
+from datetime import date, datetime, time
+from typing import Optional
+from sqlalchemy import bindparam, inspect, select, text, update, Float
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.models import (
+    AttendanceDailyRollup,
+    AttendanceSession,
+    AttendanceRecord,
+    FCMToken,
+    LeaveRequest,
+    NotificationBroadcast,
+)
+from app.services.geo import parse_location
+from app.services.session_service import snapshot_counts
+
+
+def _column_names(conn: Connection, table_name: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table_name)}
+
+
+def _add_columns(conn: Connection, table, column_names: list) -> None:
+    """Add model columns that are missing from an existing table."""
+    existing = _column_names(conn, table.name)
+    for name in column_names:
+        if name in existing:
+            continue
+        column_type = table.c[name].type.compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+
+
+def _create_indexes(conn: Connection, table) -> None:
+    """Create the model's declared indexes that are missing from an existing table."""
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_session_close_columns(conn: Connection) -> None:
+    _add_columns(
+        conn,
+        AttendanceSession.__table__,
+        ["course_name", "closed_at", "total_present", "total_late", "total_absent"],
+    )
+    conn.execute(text(
+        "UPDATE attendance_sessions SET course_name = session_name WHERE course_name IS NULL"
+    ))
+
+
+def _convert_column_to_float(conn: Connection, table_name: str, column_name: str) -> None:
+    """
+    Rebuild a text column as a float column, keeping its data.
+
+    Uses add/copy/drop/rename so it works on both PostgreSQL and SQLite
+    (3.35+), which cannot change a column's type in place.
+    """
+    columns = {c["name"]: c["type"] for c in inspect(conn).get_columns(table_name)}
+    if column_name not in columns or isinstance(columns[column_name], Float):
+        return
+
+    float_type = Float().compile(dialect=conn.dialect)
+    staging = f"{column_name}_numeric"
+    if staging not in columns:
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {staging} {float_type}"))
+    conn.execute(text(
+        f"UPDATE {table_name} SET {staging} = "
+        f"CAST(NULLIF(TRIM({column_name}), '') AS {float_type})"
+    ))
+    conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME COLUMN {staging} TO {column_name}"))
+
+
+def add_numeric_geo_columns(conn: Connection) -> None:
+    _add_columns(conn, AttendanceSession.__table__, ["latitude", "longitude"])
+
+    # Backfill session coordinates from the free-text "lat,lon" location
+    sessions = conn.execute(text(
+        "SELECT id, location FROM attendance_sessions "
+        "WHERE latitude IS NULL AND location IS NOT NULL"
+    )).all()
+    for session_id, location in sessions:
+        coords = parse_location(location)
+        if coords:
+            conn.execute(
+                text("UPDATE attendance_sessions SET latitude = :lat, longitude = :lon WHERE id = :id"),
+                {"lat": coords[0], "lon": coords[1], "id": session_id},
+            )
+
+    for column_name in ("latitude", "longitude"):
+        _convert_column_to_float(conn, AttendanceRecord.__tablename__, column_name)
+
+
+def backfill_daily_rollup(conn: Connection) -> None:
+    """Build the attendance rollup from existing records the first time it exists"""
+    if conn.execute(text("SELECT 1 FROM attendance_daily_rollup LIMIT 1")).first():
+        return
+
+    conn.execute(text("""
+        INSERT INTO attendance_daily_rollup (
+            student_id, day, session_name,
+            present_count, late_count, absent_count, excused_count, total_count
+        )
+        SELECT
+            r.student_id, r.date, s.session_name,
+            SUM(CASE WHEN r.status = 'PRESENT' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN r.status = 'LATE' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN r.status = 'ABSENT' THEN 1 ELSE 0 END),
+            SUM(CASE WHEN r.status = 'EXCUSED' THEN 1 ELSE 0 END),
+            COUNT(*)
+        FROM attendance_records r
+        JOIN attendance_sessions s ON s.id = r.session_id
+        WHERE r.date IS NOT NULL
+        GROUP BY r.student_id, r.date, s.session_name
+    """))
+
+
+def dedupe_attendance_records(conn: Connection) -> None:
+    """
+    Keep one record per (session_id, student_id), then make the pair unique.
+
+    A real check-in wins over an ABSENT row written by a racing close, the
+    oldest row otherwise. If anything was removed, the daily rollup is
+    rebuilt and the counts of the affected closed sessions re-snapshotted.
+    """
+    index_name = "uq_attendance_records_session_student"
+    if index_name in {index["name"] for index in inspect(conn).get_indexes("attendance_records")}:
+        return
+
+    removed_from = set(conn.execute(text("""
+        DELETE FROM attendance_records
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY session_id, student_id
+                    ORDER BY CASE WHEN status = 'ABSENT' THEN 1 ELSE 0 END, id
+                ) AS position
+                FROM attendance_records
+            ) ranked
+            WHERE position > 1
+        )
+        RETURNING session_id
+    """)).scalars())
+    if removed_from:
+        conn.execute(text("DELETE FROM attendance_daily_rollup"))
+        backfill_daily_rollup(conn)
+        closed_ids = list(conn.execute(
+            select(AttendanceSession.id).where(
+                AttendanceSession.id.in_(removed_from), AttendanceSession.is_closed.is_(True)
+            )
+        ).scalars())
+        snapshot_counts(conn, closed_ids)
+
+    # Replaces the plain lookup index on the same columns
+    conn.execute(text("DROP INDEX IF EXISTS ix_attendance_records_session_student"))
+    for index in AttendanceRecord.__table__.indexes:
+        if index.name == index_name:
+            index.create(conn, checkfirst=True)
+
+
+def _local_timestamp(day, clock: str) -> Optional[datetime]:
+    """A legacy date + "HH:MM:SS" pair, written in the app server's local time, as an aware datetime"""
+    try:
+        return datetime.combine(date.fromisoformat(str(day)[:10]), time.fromisoformat(clock.strip())).astimezone()
+    except ValueError:
+        return None
+
+
+def add_check_in_timestamps(conn: Connection) -> None:
+    """Replace the "HH:MM:SS" string columns with indexed timestamp columns"""
+    table = AttendanceRecord.__table__
+    _add_columns(conn, table, ["checked_in_at", "checked_out_at"])
+
+    legacy = _column_names(conn, table.name) & {"check_in_time", "check_out_time"}
+    for source, target in (("check_in_time", "checked_in_at"), ("check_out_time", "checked_out_at")):
+        if source not in legacy:
+            continue
+        # Converted here rather than cast in SQL: the strings are the app server's
+        # local time, which the database session's time zone need not match
+        rows = conn.execute(text(
+            f"SELECT id, date, {source} FROM {table.name} "
+            f"WHERE {target} IS NULL AND {source} IS NOT NULL AND {source} <> '' AND date IS NOT NULL"
+        )).all()
+        values = [
+            {"row_id": row_id, "value": timestamp}
+            for row_id, day, clock in rows
+            if (timestamp := _local_timestamp(day, clock)) is not None
+        ]
+        if values:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("row_id")).values({target: bindparam("value")}),
+                values,
+            )
+        conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {source}"))
+
+    _create_indexes(conn, table)
+
+
+def add_leave_keyset_index(conn: Connection) -> None:
+    _create_indexes(conn, LeaveRequest.__table__)
+
+
+def backfill_leave_status_counters(conn: Connection) -> None:
+    """Seed the leave counters from existing requests the first time they exist"""
+    if conn.execute(text("SELECT 1 FROM leave_status_counters LIMIT 1")).first():
+        return
+
+    conn.execute(text("""
+        INSERT INTO leave_status_counters (status, count)
+        SELECT normalized, COUNT(*)
+        FROM (
+            SELECT CASE COALESCE(status, 'PENDING')
+                WHEN 'APPROVE' THEN 'APPROVED'
+                WHEN 'REJECT' THEN 'REJECTED'
+                ELSE COALESCE(status, 'PENDING')
+            END AS normalized
+            FROM leave_requests
+        ) statuses
+        GROUP BY normalized
+    """))
+
+
+def dedupe_fcm_tokens(conn: Connection) -> None:
+    """Keep only the newest row per device token, then make tokens unique"""
+    if "uq_fcm_tokens_token" in {index["name"] for index in inspect(conn).get_indexes("fcm_tokens")}:
+        return
+    conn.execute(text("""
+        DELETE FROM fcm_tokens
+        WHERE id NOT IN (SELECT MAX(id) FROM fcm_tokens GROUP BY token)
+    """))
+    _create_indexes(conn, FCMToken.__table__)
+
+
+def add_hot_path_indexes(conn: Connection) -> None:
+    for table in (AttendanceRecord.__table__, LeaveRequest.__table__, FCMToken.__table__):
+        _create_indexes(conn, table)
+
+
+def add_rollup_day_index(conn: Connection) -> None:
+    _create_indexes(conn, AttendanceDailyRollup.__table__)
+
+
+def add_broadcast_lease_column(conn: Connection) -> None:
+    _add_columns(conn, NotificationBroadcast.__table__, ["locked_until"])
+
+
+MIGRATIONS = [
+    add_session_close_columns,
+    add_numeric_geo_columns,
+    backfill_daily_rollup,
+    dedupe_attendance_records,
+    add_check_in_timestamps,
+    add_leave_keyset_index,
+    backfill_leave_status_counters,
+    dedupe_fcm_tokens,
+    add_hot_path_indexes,
+    add_rollup_day_index,
+    add_broadcast_lease_column,
+]
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply every migration in order inside a single transaction"""
+    with engine.begin() as conn:
+        for migration in MIGRATIONS:
+            migration(conn)
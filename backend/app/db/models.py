@@ -1,9 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, ForeignKey, Boolean, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
 
 
+def format_clock_time(value):
+    """Format a timestamp as local "HH:MM:SS", the shape the API has always returned"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone()
+    return value.strftime("%H:%M:%S")
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -20,10 +29,18 @@ class User(Base):
     leave_requests = relationship("LeaveRequest", back_populates="student", foreign_keys="[LeaveRequest.student_id]")
     fcm_tokens = relationship("FCMToken", back_populates="user")
     attendance_records = relationship("AttendanceRecord", back_populates="student")
+    enrollments = relationship("Enrollment", back_populates="student")
 
 
 class LeaveRequest(Base):
     __tablename__ = "leave_requests"
+    __table_args__ = (
+        # Keyset pagination order for /leave/history and /leave/all
+        Index("ix_leave_requests_created_at_id", "created_at", "id"),
+        # Same order within a status (pending queue, status filter) or a student's own requests
+        Index("ix_leave_requests_status_created_at", "status", "created_at", "id"),
+        Index("ix_leave_requests_student_created_at", "student_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -43,6 +60,11 @@ class LeaveRequest(Base):
 
 class FCMToken(Base):
     __tablename__ = "fcm_tokens"
+    __table_args__ = (
+        # A device token belongs to whoever registered it last
+        Index("uq_fcm_tokens_token", "token", unique=True),
+        Index("ix_fcm_tokens_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -60,11 +82,19 @@ class AttendanceSession(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     session_name = Column(String(255), nullable=False)
+    course_name = Column(String(255), nullable=True)  # Roster the session is taken against
     created_by = Column(String(128), nullable=False)  # Firebase UID
     location = Column(String(255), nullable=True)
+    latitude = Column(Float, nullable=True)  # Session location, parsed once at creation
+    longitude = Column(Float, nullable=True)
     radius_meters = Column(Integer, nullable=True)  # GPS validation radius in meters
     late_until = Column(DateTime(timezone=True), nullable=True)  # Deadline for marking attendance
     is_closed = Column(Boolean, default=False)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    # Final counts snapshotted when the session is closed
+    total_present = Column(Integer, nullable=True)
+    total_late = Column(Integer, nullable=True)
+    total_absent = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -73,16 +103,24 @@ class AttendanceSession(Base):
 
 class AttendanceRecord(Base):
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        Index("ix_attendance_records_session_checked_in", "session_id", "checked_in_at"),
+        Index("ix_attendance_records_status_checked_in", "status", "checked_in_at"),
+        # One record per student and session; check-ins and absence backfill rely on it
+        Index("uq_attendance_records_session_student", "session_id", "student_id", unique=True),
+        # A student's own history and analytics by day
+        Index("ix_attendance_records_student_date", "student_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("attendance_sessions.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     date = Column(Date, default=lambda: func.current_date())
     status = Column(String(50), default="PRESENT")  # PRESENT, ABSENT, LATE, EXCUSED
-    check_in_time = Column(String(20), nullable=True)
-    check_out_time = Column(String(20), nullable=True)
-    latitude = Column(String(50), nullable=True)  # GPS latitude when marking attendance
-    longitude = Column(String(50), nullable=True)  # GPS longitude when marking attendance
+    checked_in_at = Column(DateTime(timezone=True), nullable=True)
+    checked_out_at = Column(DateTime(timezone=True), nullable=True)
+    latitude = Column(Float, nullable=True)  # GPS latitude when marking attendance
+    longitude = Column(Float, nullable=True)  # GPS longitude when marking attendance
     face_verified = Column(Boolean, default=False)  # Whether face verification was completed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -90,3 +128,112 @@ class AttendanceRecord(Base):
     session = relationship("AttendanceSession", back_populates="records")
     student = relationship("User", back_populates="attendance_records")
 
+    @property
+    def check_in_time(self):
+        """Check-in clock time ("HH:MM:SS"), derived from checked_in_at"""
+        return format_clock_time(self.checked_in_at)
+
+    @property
+    def check_out_time(self):
+        """Check-out clock time ("HH:MM:SS"), derived from checked_out_at"""
+        return format_clock_time(self.checked_out_at)
+
+
+
+class Enrollment(Base):
+    __tablename__ = "enrollments"
+    __table_args__ = (UniqueConstraint("course_name", "student_id", name="uq_enrollments_course_student"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_name = Column(String(255), nullable=False, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    student = relationship("User", back_populates="enrollments")
+
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)  # Worker currently holding the lease
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class AttendanceDailyRollup(Base):
+    __tablename__ = "attendance_daily_rollup"
+    __table_args__ = (
+        UniqueConstraint("student_id", "day", "session_name", name="uq_attendance_daily_rollup_key"),
+        Index("ix_attendance_daily_rollup_session_day", "session_name", "day"),
+        # Date-range analytics filter on day alone
+        Index("ix_attendance_daily_rollup_day_student", "day", "student_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    session_name = Column(String(255), nullable=False)
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    excused_count = Column(Integer, nullable=False, default=0)
+    total_count = Column(Integer, nullable=False, default=0)
+
+
+class LeaveStatusCounter(Base):
+    """Running count of leave requests per normalized status (PENDING, APPROVED, REJECTED)"""
+    __tablename__ = "leave_status_counters"
+
+    status = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class NotificationOutbox(Base):
+    """
+    Push notifications waiting to be delivered.
+
+    Rows are written in the same transaction as the change they announce and
+    drained by the background dispatcher, so requests never talk to FCM.
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Recipient, tokens resolved at send time
+    kind = Column(String(50), nullable=False)  # e.g. LEAVE_STATUS
+    title = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    data = Column(Text, nullable=True)  # JSON object of string values
+    status = Column(String(20), nullable=False, default="PENDING")  # PENDING, SENDING, SENT, FAILED
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Claim expiry while SENDING
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class NotificationBroadcast(Base):
+    """A push notification fanned out to every enrolled student of a course, with send progress"""
+    __tablename__ = "notification_broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_name = Column(String(255), nullable=False)  # Roster the broadcast goes to
+    session_id = Column(Integer, ForeignKey("attendance_sessions.id"), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    data = Column(Text, nullable=True)  # JSON object of string values
+    status = Column(String(20), nullable=False, default="PENDING")  # PENDING, RUNNING, DONE, FAILED
+    total_tokens = Column(Integer, nullable=True)  # Devices on the roster when sending started
+    sent_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    last_token_id = Column(Integer, nullable=True)  # Progress through the roster's fcm_tokens ids
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Sender's lease, renewed every chunk
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -24,6 +24,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Page-Size", "X-Total-Count", "Deprecation", "Warning"],
 )
 
 app.include_router(health_router)
@@ -42,6 +43,33 @@ def startup_event():
     init_db()
     print("Database tables created successfully!")
 
+@app.on_event("startup")
+async def start_background_workers():
+    from app.core.config import settings
+    from app.core.token_verifier import token_verifier
+    from app.services.broadcast_service import broadcast_service
+    from app.services.notification_dispatcher import notification_dispatcher
+    from app.services.session_scheduler import session_sweeper
+    token_verifier.start()
+    if settings.SESSION_SWEEP_ENABLED:
+        session_sweeper.start()
+    if settings.NOTIFICATION_DISPATCH_ENABLED:
+        notification_dispatcher.start()
+        broadcast_service.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    from app.core.token_verifier import token_verifier
+    from app.services.broadcast_service import broadcast_service
+    from app.services.notification_dispatcher import notification_dispatcher
+    from app.services.notification_service import notification_service
+    from app.services.session_scheduler import session_sweeper
+    await token_verifier.stop()
+    await session_sweeper.stop()
+    await notification_dispatcher.stop()
+    await broadcast_service.stop()
+    notification_service.shutdown()
+
 try:
     cred = credentials.Certificate("firebase_key.json")
     firebase_admin.initialize_app(cred)
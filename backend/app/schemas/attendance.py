@@ -1,11 +1,14 @@
 from pydantic import BaseModel, Field
 from datetime import datetime, time, date
-from typing import Optional, Union
+from typing import Optional, Union, List
 
 
 class AttendanceSessionCreate(BaseModel):
     session_name: str = Field(..., min_length=1, max_length=255, description="Name of the attendance session")
+    course_name: Optional[str] = Field(None, max_length=255, description="Course roster to take attendance against (defaults to session name)")
     location: Optional[str] = Field(None, max_length=255, description="Location of the session")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Session latitude (parsed from location if omitted)")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Session longitude (parsed from location if omitted)")
     radius_meters: Optional[int] = Field(None, ge=1, le=10000, description="GPS validation radius in meters")
     late_until_time: Optional[time] = Field(None, description="Late deadline time (e.g., 09:00:00)")
     late_until_datetime: Optional[datetime] = Field(None, description="Complete late deadline datetime")
@@ -112,6 +115,17 @@ class CloseSessionResponse(BaseModel):
     message: str
 
 
+class EnrollmentCreate(BaseModel):
+    course_name: str = Field(..., min_length=1, max_length=255, description="Course the students are enrolled in")
+    student_ids: List[int] = Field(..., min_length=1, description="IDs of the students to enroll")
+
+
+class EnrollmentResponse(BaseModel):
+    course_name: str
+    student_ids: List[int]
+    added_count: int
+
+
 class BiometricAttendanceRequest(BaseModel):
     qr_token: str = Field(..., description="QR code token containing session information")
     image_base64: str = Field(..., description="Base64 encoded face image")
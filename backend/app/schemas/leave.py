@@ -1,6 +1,10 @@
-from pydantic import BaseModel, Field
+import json
+from pydantic import BaseModel, Field, model_validator
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
+
+# FCM rejects messages whose notification and data payload exceed 4 KB
+FCM_MAX_PAYLOAD_BYTES = 4096
 
 
 
@@ -111,6 +115,42 @@ class FCMTokenResponse(BaseModel):
 
 
 
+class BroadcastCreate(BaseModel):
+    session_id: Optional[int] = Field(None, description="Session whose roster receives the broadcast")
+    course_name: Optional[str] = Field(None, max_length=255, description="Course roster, when no session is given")
+    title: str = Field(..., min_length=1, max_length=255)
+    body: str = Field(..., min_length=1, max_length=2048)
+    data: Optional[Dict[str, str]] = Field(None, description="Extra data payload")
+
+    @model_validator(mode="after")
+    def check_payload_size(self):
+        # Checked up front: FCM would reject every chunk of an oversized broadcast with INVALID_ARGUMENT
+        payload = json.dumps(
+            {"title": self.title, "body": self.body, "data": self.data or {}},
+            ensure_ascii=False,
+        )
+        if len(payload.encode()) > FCM_MAX_PAYLOAD_BYTES:
+            raise ValueError(f"Title, body and data must fit in {FCM_MAX_PAYLOAD_BYTES} bytes")
+        return self
+
+
+class BroadcastResponse(BaseModel):
+    id: int
+    course_name: str
+    session_id: Optional[int] = None
+    status: str
+    total_tokens: Optional[int] = None
+    sent_count: int
+    failed_count: int
+    last_error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class APIResponse(BaseModel):
     success: bool
     message: str
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import and_, func, or_, select, update
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.db.models import Enrollment, FCMToken, NotificationBroadcast
+from app.services.notification_service import notification_service
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket: ``rate`` tokens per second, holding at most ``capacity``.
+
+    ``acquire`` sleeps on the event loop until enough tokens are available,
+    so waiting never ties up a thread.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: int) -> None:
+        # Requests larger than the bucket wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+
+def roster_tokens(course_name: str, after_id: int = 0, limit: Optional[int] = None):
+    """
+    Device tokens of every student enrolled in ``course_name``, in fcm_tokens id order.
+
+    One join from the roster to fcm_tokens; ``after_id``/``limit`` page through
+    it by token id so a large roster is read in chunks.
+    """
+    query = (
+        select(FCMToken.id, FCMToken.token)
+        .join(Enrollment, Enrollment.student_id == FCMToken.user_id)
+        .where(Enrollment.course_name == course_name, FCMToken.id > after_id)
+        .order_by(FCMToken.id)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+class BroadcastService:
+    """
+    Sends course-wide broadcasts in the background.
+
+    A broadcast row is created by the request, which returns immediately.
+    The roster's tokens are then read in chunks of ``chunk_size``, each
+    chunk waits on the shared token bucket and goes out as one request
+    from a worker thread, and progress is written back after every chunk.
+
+    The sender holds a lease on the row (locked_until), renewed with every
+    chunk. A broadcast whose lease ran out lost its sender, to a crash or a
+    shutdown, and is resumed from last_token_id by the next worker to start.
+    """
+
+    def __init__(self, chunk_size: int, rate_per_second: float, burst: int, lease_seconds: float):
+        self.chunk_size = chunk_size
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.lease_seconds = lease_seconds
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _lease(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+
+    def _start(self, broadcast_id: int) -> Optional[NotificationBroadcast]:
+        db = SessionLocal()
+        try:
+            broadcast = db.get(NotificationBroadcast, broadcast_id)
+            if broadcast is None:
+                return None
+            broadcast.total_tokens = db.scalar(
+                select(func.count()).select_from(roster_tokens(broadcast.course_name).subquery())
+            )
+            broadcast.status = "RUNNING"
+            broadcast.started_at = broadcast.started_at or datetime.now(timezone.utc)
+            broadcast.locked_until = self._lease()
+            db.commit()
+            db.refresh(broadcast)
+            db.expunge(broadcast)
+            return broadcast
+        finally:
+            db.close()
+
+    def _next_chunk(self, course_name: str, after_id: int) -> List[Tuple[int, str]]:
+        db = SessionLocal()
+        try:
+            return db.execute(roster_tokens(course_name, after_id, self.chunk_size)).all()
+        finally:
+            db.close()
+
+    def _send_chunk(self, broadcast: NotificationBroadcast, chunk: List[Tuple[int, str]]) -> int:
+        data = json.loads(broadcast.data) if broadcast.data else None
+        results = notification_service.send_to_tokens(
+            [token for _, token in chunk], broadcast.title, broadcast.body, data
+        )
+        sent = sum(result.success for result in results)
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(NotificationBroadcast)
+                .where(NotificationBroadcast.id == broadcast.id)
+                .values(
+                    sent_count=NotificationBroadcast.sent_count + sent,
+                    failed_count=NotificationBroadcast.failed_count + len(results) - sent,
+                    last_token_id=chunk[-1][0],
+                    locked_until=self._lease(),
+                )
+            )
+            db.commit()
+            notification_service.prune_dead_tokens(db, results)
+        finally:
+            db.close()
+        return sent
+
+    def _finish(self, broadcast_id: int, status: str, error: Optional[str] = None) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(NotificationBroadcast)
+                .where(NotificationBroadcast.id == broadcast_id)
+                .values(
+                    status=status,
+                    last_error=error,
+                    finished_at=datetime.now(timezone.utc),
+                    locked_until=None,
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, broadcast_id: int) -> None:
+        """Give up the lease of an unfinished broadcast so the next worker resumes it"""
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(NotificationBroadcast)
+                .where(NotificationBroadcast.id == broadcast_id)
+                .values(locked_until=datetime.now(timezone.utc))
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _claim_stale(self) -> List[int]:
+        """
+        Take over broadcasts whose sender is gone and return their ids.
+
+        RUNNING rows whose lease expired, and PENDING rows that were never
+        picked up within a lease of being created, are re-leased to this
+        worker in one UPDATE ... RETURNING, so two workers starting together
+        never resume the same broadcast.
+        """
+        now = datetime.now(timezone.utc)
+        expired = now - timedelta(seconds=self.lease_seconds)
+        db = SessionLocal()
+        try:
+            claimed = list(db.execute(
+                update(NotificationBroadcast)
+                .where(
+                    NotificationBroadcast.status.in_(["PENDING", "RUNNING"]),
+                    or_(
+                        NotificationBroadcast.locked_until < now,
+                        and_(
+                            NotificationBroadcast.locked_until.is_(None),
+                            func.coalesce(NotificationBroadcast.started_at, NotificationBroadcast.created_at) < expired,
+                        ),
+                    ),
+                )
+                .values(locked_until=self._lease())
+                .returning(NotificationBroadcast.id)
+                .execution_options(synchronize_session=False)
+            ).scalars())
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    async def resume_stale(self) -> List[int]:
+        """Resume every broadcast left behind by a dead worker. Returns their ids."""
+        broadcast_ids = await asyncio.to_thread(self._claim_stale)
+        for broadcast_id in broadcast_ids:
+            logger.warning(f"Resuming broadcast {broadcast_id} after its sender stopped")
+            self.submit(broadcast_id)
+        metrics.increment("notification_broadcast_resumed", len(broadcast_ids))
+        return broadcast_ids
+
+    async def run(self, broadcast_id: int) -> None:
+        """Send one broadcast to completion"""
+        started = time.perf_counter()
+        try:
+            broadcast = await asyncio.to_thread(self._start, broadcast_id)
+            if broadcast is None:
+                return
+            after_id = broadcast.last_token_id or 0
+            while True:
+                chunk = await asyncio.to_thread(self._next_chunk, broadcast.course_name, after_id)
+                if not chunk:
+                    break
+                await self.bucket.acquire(len(chunk))
+                sent = await asyncio.to_thread(self._send_chunk, broadcast, chunk)
+                metrics.increment("notification_broadcast_sent", sent)
+                metrics.increment("notification_broadcast_failed", len(chunk) - sent)
+                after_id = chunk[-1][0]
+            await asyncio.to_thread(self._finish, broadcast_id, "DONE")
+        except asyncio.CancelledError:
+            # Left unfinished; whichever worker starts next picks it up from last_token_id
+            await asyncio.to_thread(self._release, broadcast_id)
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} failed: {e}")
+            await asyncio.to_thread(self._finish, broadcast_id, "FAILED", str(e))
+        metrics.observe("notification_broadcast_duration_seconds", time.perf_counter() - started)
+
+    def submit(self, broadcast_id: int) -> None:
+        """Start sending a committed broadcast in the background"""
+        task = asyncio.get_running_loop().create_task(self.run(broadcast_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def start(self) -> None:
+        """Resume abandoned broadcasts in the background"""
+        task = asyncio.get_running_loop().create_task(self.resume_stale())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Singleton instance
+broadcast_service = BroadcastService(
+    chunk_size=settings.NOTIFICATION_BROADCAST_CHUNK_SIZE,
+    rate_per_second=settings.NOTIFICATION_BROADCAST_RATE_PER_SECOND,
+    burst=settings.NOTIFICATION_BROADCAST_BURST,
+    lease_seconds=settings.NOTIFICATION_BROADCAST_LEASE_SECONDS,
+)
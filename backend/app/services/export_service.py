@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import Iterator, Optional
+from sqlalchemy import select
+
+from app.db.database import SessionLocal
+from app.db.models import AttendanceRecord, AttendanceSession, User, format_clock_time
+
+EXPORT_COLUMNS = [
+    "record_id",
+    "session_id",
+    "session_name",
+    "student_id",
+    "student_name",
+    "student_email",
+    "date",
+    "status",
+    "check_in_time",
+    "check_out_time",
+    "checked_in_at",
+    "checked_out_at",
+    "latitude",
+    "longitude",
+    "face_verified",
+]
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+
+def _export_query(
+    start_date: Optional[date],
+    end_date: Optional[date],
+    session_id: Optional[int],
+    student_id: Optional[int],
+):
+    query = (
+        select(
+            AttendanceRecord.id.label("record_id"),
+            AttendanceRecord.session_id,
+            AttendanceSession.session_name,
+            AttendanceRecord.student_id,
+            User.name.label("student_name"),
+            User.email.label("student_email"),
+            AttendanceRecord.date,
+            AttendanceRecord.status,
+            AttendanceRecord.checked_in_at,
+            AttendanceRecord.checked_out_at,
+            AttendanceRecord.latitude,
+            AttendanceRecord.longitude,
+            AttendanceRecord.face_verified,
+        )
+        .join(AttendanceSession, AttendanceSession.id == AttendanceRecord.session_id)
+        .join(User, User.id == AttendanceRecord.student_id)
+    )
+    if start_date:
+        query = query.where(AttendanceRecord.date >= start_date)
+    if end_date:
+        query = query.where(AttendanceRecord.date <= end_date)
+    if session_id:
+        query = query.where(AttendanceRecord.session_id == session_id)
+    if student_id:
+        query = query.where(AttendanceRecord.student_id == student_id)
+    return query.order_by(AttendanceRecord.id)
+
+
+def iter_attendance_rows(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    session_id: Optional[int] = None,
+    student_id: Optional[int] = None,
+) -> Iterator[dict]:
+    """
+    Yield export rows from a server-side cursor.
+
+    Owns its own database session because it runs while the response is
+    being streamed, after the request's dependencies may have been torn down.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _export_query(start_date, end_date, session_id, student_id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for row in result:
+            record = dict(row._mapping)
+            record["date"] = record["date"].isoformat() if record["date"] else None
+            record["check_in_time"] = format_clock_time(record["checked_in_at"])
+            record["check_out_time"] = format_clock_time(record["checked_out_at"])
+            for key in ("checked_in_at", "checked_out_at"):
+                record[key] = record[key].isoformat() if record[key] else None
+            yield record
+    finally:
+        db.close()
+
+
+def stream_csv(rows: Iterator[dict]) -> Iterator[str]:
+    """Encode rows as CSV, flushing one chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    """Encode rows as newline-delimited JSON, flushing one chunk per batch of rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == EXPORT_BATCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
@@ -0,0 +1,158 @@
+import math
+import numpy as np
+from datetime import date
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+
+from app.db.models import AttendanceSession, AttendanceRecord
+
+EARTH_RADIUS_METERS = 6371000
+
+
+def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """Parse a "latitude,longitude" string, returning None if it is not one"""
+    if not location:
+        return None
+    try:
+        latitude, longitude = map(float, location.split(","))
+    except ValueError:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate the great circle distance between two points on earth.
+
+    Args:
+        lat1, lon1: Latitude and longitude of point 1
+        lat2, lon2: Latitude and longitude of point 2
+
+    Returns:
+        Distance in meters
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
+         math.sin(delta_lon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_METERS * c
+
+
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Vectorized haversine over NumPy arrays (or scalars, which broadcast).
+
+    Args:
+        lat1, lon1: Latitudes and longitudes of the first points
+        lat2, lon2: Latitudes and longitudes of the second points
+
+    Returns:
+        Array of distances in meters
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2)
+    )
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) *
+         np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def records_outside_radius(db: Session, session: AttendanceSession, radius_meters: float) -> list:
+    """
+    Recheck every geotagged record of a session against a radius in one pass.
+
+    Returns:
+        List of dicts (record id, student id, distance) for records outside the radius
+    """
+    rows = db.query(
+        AttendanceRecord.id,
+        AttendanceRecord.student_id,
+        AttendanceRecord.latitude,
+        AttendanceRecord.longitude,
+    ).filter(
+        AttendanceRecord.session_id == session.id,
+        AttendanceRecord.latitude.isnot(None),
+        AttendanceRecord.longitude.isnot(None),
+    ).all()
+    if not rows:
+        return []
+
+    coords = np.array([(row.latitude, row.longitude) for row in rows], dtype=np.float64)
+    distances = haversine_distances(session.latitude, session.longitude, coords[:, 0], coords[:, 1])
+    outside = np.flatnonzero(distances > radius_meters)
+
+    return [
+        {
+            "record_id": rows[i].id,
+            "student_id": rows[i].student_id,
+            "distance_meters": round(float(distances[i]), 1),
+        }
+        for i in outside
+    ]
+
+
+def find_far_checkins(
+    db: Session,
+    min_distance_meters: float,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> list:
+    """
+    Find check-ins made farther than ``min_distance_meters`` from their session.
+
+    Distances for every record in the range are computed in a single
+    vectorized pass instead of row by row.
+    """
+    query = db.query(
+        AttendanceRecord.id,
+        AttendanceRecord.session_id,
+        AttendanceRecord.student_id,
+        AttendanceRecord.date,
+        AttendanceRecord.latitude,
+        AttendanceRecord.longitude,
+        AttendanceSession.latitude.label("session_latitude"),
+        AttendanceSession.longitude.label("session_longitude"),
+    ).join(
+        AttendanceSession, AttendanceSession.id == AttendanceRecord.session_id
+    ).filter(
+        AttendanceRecord.latitude.isnot(None),
+        AttendanceRecord.longitude.isnot(None),
+        AttendanceSession.latitude.isnot(None),
+        AttendanceSession.longitude.isnot(None),
+    )
+    if start_date:
+        query = query.filter(AttendanceRecord.date >= start_date)
+    if end_date:
+        query = query.filter(AttendanceRecord.date <= end_date)
+
+    rows = query.all()
+    if not rows:
+        return []
+
+    coords = np.array(
+        [(r.session_latitude, r.session_longitude, r.latitude, r.longitude) for r in rows],
+        dtype=np.float64,
+    )
+    distances = haversine_distances(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+    far = np.flatnonzero(distances > min_distance_meters)
+    far = far[np.argsort(-distances[far])]
+
+    return [
+        {
+            "record_id": rows[i].id,
+            "session_id": rows[i].session_id,
+            "student_id": rows[i].student_id,
+            "date": rows[i].date.isoformat() if rows[i].date else None,
+            "distance_meters": round(float(distances[i]), 1),
+        }
+        for i in far
+    ]
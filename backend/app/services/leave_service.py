@@ -0,0 +1,190 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from sqlalchemy import DateTime, and_, bindparam, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.db.database import upsert_insert
+from app.db.models import LeaveRequest, LeaveStatusCounter, User
+from app.schemas.leave import LeaveRequestResponse
+
+Student = aliased(User, name="student")
+Reviewer = aliased(User, name="reviewer")
+_CursorLeave = aliased(LeaveRequest, name="cursor_leave")
+
+# Actions store APPROVE/REJECT while older rows say APPROVED/REJECTED
+STATUS_ALIASES = {
+    "APPROVE": "APPROVED",
+    "REJECT": "REJECTED",
+}
+
+# (old_status, new_status); old_status is None for new requests, new_status None for deletions
+LeaveStatusChange = Tuple[Optional[str], Optional[str]]
+
+
+def leave_query(*extra_columns):
+    """
+    Select leave requests together with their student and reviewer names.
+
+    ``users`` is joined twice under aliases, so any number of rows costs a
+    single statement. Callers add their own filters and ordering.
+    """
+    return (
+        select(
+            LeaveRequest.id,
+            LeaveRequest.student_id,
+            func.coalesce(Student.name, "Unknown").label("student_name"),
+            LeaveRequest.from_date,
+            LeaveRequest.to_date,
+            LeaveRequest.reason,
+            LeaveRequest.status,
+            LeaveRequest.reviewed_by,
+            Reviewer.name.label("reviewer_name"),
+            LeaveRequest.reviewed_at,
+            LeaveRequest.created_at,
+            *extra_columns,
+        )
+        .outerjoin(Student, Student.id == LeaveRequest.student_id)
+        .outerjoin(Reviewer, Reviewer.id == LeaveRequest.reviewed_by)
+    )
+
+
+def to_leave_responses(rows: Iterable) -> List[LeaveRequestResponse]:
+    return [LeaveRequestResponse(**row._mapping) for row in rows]
+
+
+def normalize_status(status: Optional[str]) -> str:
+    status = status or "PENDING"
+    return STATUS_ALIASES.get(status, status)
+
+
+def summarize_status_counts(rows: Iterable[Tuple[Optional[str], int]]) -> dict:
+    """Fold (status, count) rows into the LeaveStats fields"""
+    counts = Counter()
+    for status, count in rows:
+        counts[normalize_status(status)] += count or 0
+    return {
+        "total": sum(counts.values()),
+        "pending": counts["PENDING"],
+        "approved": counts["APPROVED"],
+        "rejected": counts["REJECTED"],
+    }
+
+
+def record_leave_status_changes(db: Session, changes: Iterable[LeaveStatusChange]) -> None:
+    """
+    Apply leave request inserts/status changes/deletions to the status counters.
+
+    Deltas are folded per status and written with one upsert, in the
+    caller's transaction.
+    """
+    deltas = Counter()
+    for old_status, new_status in changes:
+        if old_status is not None:
+            deltas[normalize_status(old_status)] -= 1
+        if new_status is not None:
+            deltas[normalize_status(new_status)] += 1
+
+    rows = [{"status": status, "count": delta} for status, delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(LeaveStatusCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["status"],
+        set_={"count": LeaveStatusCounter.count + stmt.excluded.count},
+    )
+    db.execute(stmt, rows)
+
+
+def encode_cursor(created_at: datetime, leave_id: int) -> str:
+    payload = json.dumps([created_at.isoformat(), leave_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for anything that is not a cursor we issued"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, leave_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(leave_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def newest_first(query, cursor: Optional[str] = None):
+    """
+    Order leave rows by (created_at, id) descending, starting after ``cursor``.
+
+    The cursor row's own created_at is read back from the table, so the
+    comparison is between stored values (SQLite keeps them as text, in more
+    than one format). The timestamp carried in the cursor is only used if
+    that row has since been deleted.
+    """
+    query = query.order_by(LeaveRequest.created_at.desc(), LeaveRequest.id.desc())
+    if cursor is None:
+        return query
+
+    created_at, leave_id = decode_cursor(cursor)
+    cursor_created_at = func.coalesce(
+        select(_CursorLeave.created_at)
+        .where(_CursorLeave.id == leave_id)
+        .correlate(None)
+        .scalar_subquery(),
+        bindparam("cursor_created_at", created_at, type_=DateTime(timezone=True)),
+    )
+    return query.where(or_(
+        LeaveRequest.created_at < cursor_created_at,
+        and_(LeaveRequest.created_at == cursor_created_at, LeaveRequest.id < leave_id),
+    ))
+
+
+def next_cursor(rows: list, page_size: int) -> Optional[str]:
+    """Cursor for the page after ``rows``, fetched with ``limit(page_size + 1)``"""
+    if len(rows) <= page_size:
+        return None
+    last = rows[page_size - 1]
+    return encode_cursor(last.created_at, last.id)
+
+
+class TotalCountCache:
+    """
+    Short-lived cache of filtered leave totals.
+
+    Totals are optional on the paginated endpoints; when asked for, they are
+    reused for ``ttl_seconds`` so paging through a large result set does not
+    re-count it on every page.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[int, float]] = {}
+
+    def get(self, key: Hashable) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def put(self, key: Hashable, total: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (total, time.monotonic() + self.ttl_seconds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Singleton instance
+leave_total_cache = TotalCountCache(ttl_seconds=settings.LEAVE_TOTAL_COUNT_TTL_SECONDS)
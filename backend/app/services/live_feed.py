@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionFeedBroker:
+    """
+    In-process pub/sub for live attendance session events.
+
+    Subscribers are asyncio queues owned by SSE connections. ``publish`` is
+    thread-safe, so request handlers, threadpool code and background workers
+    can all publish into the feed.
+
+    Events never leave the process: with several uvicorn workers or app
+    instances, a subscriber only hears about check-ins and closes that were
+    handled by its own process. Fanning out across processes needs a shared
+    channel (Postgres LISTEN/NOTIFY, Redis pub/sub) behind the same
+    subscribe/publish interface.
+    """
+
+    def __init__(self, max_queue_size: int = 1000):
+        self.max_queue_size = max_queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+
+    def subscribe(self, session_id: int) -> asyncio.Queue:
+        """Register a queue for a session's events. Must be called on the event loop."""
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[session_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, session_id: int, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(session_id, set())
+            for entry in [entry for entry in subscribers if entry[1] is queue]:
+                subscribers.discard(entry)
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+
+    def subscriber_count(self, session_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(session_id, ()))
+
+    def publish(self, session_id: int, event: dict) -> None:
+        """Fan an event out to every subscriber of the session"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Subscriber's loop has shut down
+                self.unsubscribe(session_id, queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict) -> None:
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning("Dropping live feed event for a slow subscriber")
+
+
+# Singleton instance
+live_feed = SessionFeedBroker(max_queue_size=settings.LIVE_FEED_MAX_QUEUE_SIZE)
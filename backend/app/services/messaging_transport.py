@@ -0,0 +1,175 @@
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, NamedTuple, Optional, Sequence
+
+from firebase_admin import exceptions, messaging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-token send errors meaning the token will never work again
+DEAD_TOKEN_ERRORS = (
+    messaging.UnregisteredError,
+    messaging.SenderIdMismatchError,
+)
+
+
+class Message(NamedTuple):
+    """One notification to one device token"""
+    token: str
+    title: str
+    body: str
+    data: Optional[dict] = None
+
+    @property
+    def payload(self) -> tuple:
+        return self.title, self.body, tuple(sorted((self.data or {}).items()))
+
+
+class TokenResult(NamedTuple):
+    token: str
+    success: bool
+    error: Optional[Exception] = None
+    dead: bool = False  # FCM rejected this token itself; it should be pruned
+
+
+def token_results(messages: Sequence[Message], errors: Sequence[Optional[Exception]]) -> List[TokenResult]:
+    """
+    Pair each message with its send error (None for success) and decide which tokens are dead.
+
+    INVALID_ARGUMENT is also what every message gets when its payload itself
+    is rejected, so it only condemns a token when another message with the
+    same payload went through in the same request.
+    """
+    accepted = {message.payload for message, error in zip(messages, errors) if error is None}
+    return [
+        TokenResult(
+            message.token,
+            error is None,
+            error,
+            isinstance(error, DEAD_TOKEN_ERRORS)
+            or (message.payload in accepted and isinstance(error, exceptions.InvalidArgumentError)),
+        )
+        for message, error in zip(messages, errors)
+    ]
+
+
+class MessagingTransport(ABC):
+    """
+    Delivers at most 500 messages in one request.
+
+    Each message carries its own payload, so notifications that differ per
+    recipient (one per decided leave, say) still share a request.
+    """
+
+    @abstractmethod
+    def send_each(self, messages: Sequence[Message]) -> List[TokenResult]:
+        """
+        Returns one TokenResult per message, in order. Raises if the whole
+        request failed, which says nothing about the individual tokens.
+        """
+
+
+class FirebaseTransport(MessagingTransport):
+    """Sends through firebase_admin.messaging"""
+
+    def send_each(self, messages):
+        response = messaging.send_each([
+            messaging.Message(
+                notification=messaging.Notification(title=message.title, body=message.body),
+                data=message.data or {},
+                token=message.token,
+            )
+            for message in messages
+        ])
+        return token_results(messages, [result.exception for result in response.responses])
+
+
+class LocalTransport(MessagingTransport):
+    """
+    In-process stand-in for FCM, for load tests and offline development.
+
+    Every request sleeps for ``latency_seconds`` (plus up to ``jitter``
+    of that again). Tokens starting with ``dead_prefix`` and a random
+    ``unregistered_rate`` share of the rest come back UNREGISTERED, a
+    ``failure_rate`` share fail with a transient UNAVAILABLE, and tokens
+    beyond ``quota_per_second`` in any one-second window get
+    QUOTA_EXCEEDED. Pass ``seed`` for repeatable runs.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.05,
+        jitter: float = 0.2,
+        failure_rate: float = 0.0,
+        unregistered_rate: float = 0.0,
+        quota_per_second: int = 0,
+        dead_prefix: str = "dead-",
+        seed: Optional[int] = None,
+    ):
+        self.latency_seconds = latency_seconds
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.unregistered_rate = unregistered_rate
+        self.quota_per_second = quota_per_second
+        self.dead_prefix = dead_prefix
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window: deque = deque()  # (monotonic time, tokens) of the last second's sends
+        self._window_total = 0
+        self.requests = 0
+        self.tokens_sent = 0
+
+    def _over_quota(self, count: int) -> int:
+        """Record ``count`` sends and return how many of them exceed the quota"""
+        if not self.quota_per_second:
+            return 0
+        now = time.monotonic()
+        while self._window and self._window[0][0] <= now - 1:
+            self._window_total -= self._window.popleft()[1]
+        allowed = max(0, min(count, self.quota_per_second - self._window_total))
+        self._window.append((now, allowed))
+        self._window_total += allowed
+        return count - allowed
+
+    def send_each(self, messages):
+        with self._lock:
+            delay = self.latency_seconds * (1 + self._random.uniform(0, self.jitter))
+            rolls = [self._random.random() for _ in messages]
+            over_quota = self._over_quota(len(messages))
+            self.requests += 1
+            self.tokens_sent += len(messages)
+        time.sleep(delay)
+
+        errors = []
+        first_over_quota = len(messages) - over_quota
+        for index, (message, roll) in enumerate(zip(messages, rolls)):
+            if index >= first_over_quota:
+                errors.append(messaging.QuotaExceededError("Sending quota exceeded"))
+            elif message.token.startswith(self.dead_prefix) or roll < self.unregistered_rate:
+                errors.append(messaging.UnregisteredError("Requested entity was not found"))
+            elif roll < self.unregistered_rate + self.failure_rate:
+                errors.append(exceptions.UnavailableError("Service unavailable"))
+            else:
+                errors.append(None)
+        return token_results(messages, errors)
+
+
+def build_messaging_transport(backend: str) -> MessagingTransport:
+    if backend == "firebase":
+        return FirebaseTransport()
+    if backend == "local":
+        logger.warning("Using the local FCM stand-in; no notifications reach real devices")
+        return LocalTransport(
+            latency_seconds=settings.NOTIFICATION_LOCAL_LATENCY_MS / 1000,
+            failure_rate=settings.NOTIFICATION_LOCAL_FAILURE_RATE,
+            unregistered_rate=settings.NOTIFICATION_LOCAL_UNREGISTERED_RATE,
+            quota_per_second=settings.NOTIFICATION_LOCAL_QUOTA_PER_SECOND,
+            seed=settings.NOTIFICATION_LOCAL_SEED,
+        )
+    raise ValueError(f"Unknown NOTIFICATION_TRANSPORT backend: {backend}")
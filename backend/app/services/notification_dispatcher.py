@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.db.models import NotificationOutbox
+from app.services.notification_service import notification_service
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    Drains the notification outbox in the background.
+
+    Each pass claims a batch of due entries (rows are marked SENDING with a
+    claim expiry, so several workers can drain the same table), along with
+    any still-held digestible entries of the same recipients, sends them in
+    chunks with at most ``concurrency`` chunks in flight, then records the
+    outcome. Failed entries are retried with exponential backoff until
+    ``max_attempts``; claims left behind by a crashed worker expire and are
+    picked up again.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        batch_size: int,
+        chunk_size: int,
+        concurrency: int,
+        max_attempts: int,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+        claim_ttl_seconds: float,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _claim_where(self, db, now: datetime, *criteria) -> list:
+        return db.execute(
+            update(NotificationOutbox)
+            .where(*criteria)
+            .values(
+                status="SENDING",
+                attempts=NotificationOutbox.attempts + 1,
+                locked_until=now + timedelta(seconds=self.claim_ttl_seconds),
+            )
+            .returning(
+                NotificationOutbox.id,
+                NotificationOutbox.user_id,
+                NotificationOutbox.kind,
+                NotificationOutbox.title,
+                NotificationOutbox.body,
+                NotificationOutbox.data,
+                NotificationOutbox.attempts,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    def _claim(self) -> list:
+        """Mark up to batch_size due entries (plus digest companions) as SENDING and return them"""
+        now = datetime.now(timezone.utc)
+        due = or_(
+            and_(NotificationOutbox.status == "PENDING", NotificationOutbox.next_attempt_at <= now),
+            and_(NotificationOutbox.status == "SENDING", NotificationOutbox.locked_until < now),
+        )
+        db = SessionLocal()
+        try:
+            entries = self._claim_where(
+                db,
+                now,
+                NotificationOutbox.id.in_(
+                    select(NotificationOutbox.id)
+                    .where(due)
+                    .order_by(NotificationOutbox.id)
+                    .limit(self.batch_size)
+                    .correlate(None)
+                    .scalar_subquery()
+                ),
+                # Re-checked against the locked row, so concurrent claimers skip it
+                due,
+            )
+
+            # Once a recipient's first digestible entry is due, the rest of
+            # their held entries of that kind go out in the same digest.
+            # Entries backing off after a failed send keep their retry time.
+            digest_users = {
+                entry.user_id for entry in entries if entry.kind in notification_service.DIGEST_KINDS
+            }
+            if digest_users:
+                entries += self._claim_where(
+                    db,
+                    now,
+                    NotificationOutbox.status == "PENDING",
+                    NotificationOutbox.user_id.in_(digest_users),
+                    NotificationOutbox.kind.in_(list(notification_service.DIGEST_KINDS)),
+                    or_(NotificationOutbox.attempts == 0, NotificationOutbox.next_attempt_at <= now),
+                )
+            db.commit()
+            return entries
+        finally:
+            db.close()
+
+    def _chunks(self, entries: list) -> List[list]:
+        """Split entries into chunks of about chunk_size, keeping each recipient in one chunk"""
+        chunks, chunk, last_user = [], [], None
+        for entry in sorted(entries, key=lambda entry: (entry.user_id, entry.id)):
+            if len(chunk) >= self.chunk_size and entry.user_id != last_user:
+                chunks.append(chunk)
+                chunk = []
+            chunk.append(entry)
+            last_user = entry.user_id
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _deliver(self, entries: list) -> Dict[int, Optional[str]]:
+        db = SessionLocal()
+        try:
+            return notification_service.deliver_outbox(db, entries)
+        finally:
+            db.close()
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        # Jitter spreads retries of a failed batch instead of replaying it in lockstep
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+    def _record(self, entries: list, outcomes: Dict[int, Optional[str]]) -> None:
+        now = datetime.now(timezone.utc)
+        sent_ids = [entry.id for entry in entries if outcomes.get(entry.id) is None]
+        retries, failures = [], []
+        for entry in entries:
+            error = outcomes.get(entry.id)
+            if error is None:
+                continue
+            if entry.attempts >= self.max_attempts:
+                failures.append({"b_id": entry.id, "b_error": error})
+            else:
+                retries.append({
+                    "b_id": entry.id,
+                    "b_error": error,
+                    "b_next": now + self._backoff(entry.attempts),
+                })
+
+        db = SessionLocal()
+        try:
+            if sent_ids:
+                db.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id.in_(sent_ids))
+                    .values(status="SENT", sent_at=now, locked_until=None, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            table = NotificationOutbox.__table__
+            if retries:
+                db.execute(
+                    table.update()
+                    .where(table.c.id == bindparam("b_id"))
+                    .values(
+                        status="PENDING",
+                        next_attempt_at=bindparam("b_next"),
+                        locked_until=None,
+                        last_error=bindparam("b_error"),
+                    ),
+                    retries,
+                )
+            if failures:
+                db.execute(
+                    table.update()
+                    .where(table.c.id == bindparam("b_id"))
+                    .values(status="FAILED", locked_until=None, last_error=bindparam("b_error")),
+                    failures,
+                )
+            db.commit()
+        finally:
+            db.close()
+
+        metrics.increment("notification_outbox_sent", len(sent_ids))
+        metrics.increment("notification_outbox_retried", len(retries))
+        metrics.increment("notification_outbox_failed", len(failures))
+        if failures:
+            logger.warning(f"Giving up on {len(failures)} notifications after {self.max_attempts} attempts")
+
+    async def dispatch_once(self) -> int:
+        """
+        Claim, send and record one batch.
+
+        Returns:
+            int: Number of entries claimed
+        """
+        started = time.perf_counter()
+        entries = await asyncio.to_thread(self._claim)
+        if not entries:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chunk: list) -> Dict[int, Optional[str]]:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self._deliver, chunk)
+                except Exception as e:
+                    logger.error(f"Notification chunk failed: {e}")
+                    return {entry.id: str(e) for entry in chunk}
+
+        chunks = self._chunks(entries)
+        outcomes: Dict[int, Optional[str]] = {}
+        for result in await asyncio.gather(*(deliver(chunk) for chunk in chunks)):
+            outcomes.update(result)
+
+        await asyncio.to_thread(self._record, entries, outcomes)
+        metrics.observe("notification_dispatch_duration_seconds", time.perf_counter() - started)
+        return len(entries)
+
+    def wake(self) -> None:
+        """Start the next pass now instead of waiting out the poll interval"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            claimed = 0
+            try:
+                claimed = await self.dispatch_once()
+            except Exception as e:
+                metrics.increment("notification_dispatch_errors")
+                logger.error(f"Notification dispatch failed: {e}")
+            if claimed >= self.batch_size:
+                # More is waiting, keep draining
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+
+# Singleton instance
+notification_dispatcher = NotificationDispatcher(
+    interval_seconds=settings.NOTIFICATION_DISPATCH_INTERVAL_SECONDS,
+    batch_size=settings.NOTIFICATION_DISPATCH_BATCH_SIZE,
+    chunk_size=settings.NOTIFICATION_DISPATCH_CHUNK_SIZE,
+    concurrency=settings.NOTIFICATION_DISPATCH_CONCURRENCY,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    retry_base_seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.NOTIFICATION_RETRY_MAX_SECONDS,
+    claim_ttl_seconds=settings.NOTIFICATION_CLAIM_TTL_SECONDS,
+)
@@ -1,17 +1,127 @@
+import json
 import logging
-from typing import Optional
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
-from firebase_admin import messaging, credentials
-from app.db.models import FCMToken, User
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.models import FCMToken, NotificationOutbox, User
+from app.services.leave_service import normalize_status
+from app.services.messaging_transport import Message, MessagingTransport, TokenResult, build_messaging_transport
 
 logger = logging.getLogger(__name__)
 
 
+# (title, body, data, tokens) for one payload sent to several devices
+Payload = Tuple[str, str, Optional[dict], Sequence[str]]
+
+
 class NotificationService:
-    """Service for sending push notifications via Firebase Cloud Messaging"""
+    """Service for sending push notifications through a messaging transport (FCM by default)"""
+
+    # FCM accepts at most 500 messages per send request
+    MAX_BATCH_SIZE = 500
 
-    def __init__(self):
+    # Outbox kinds whose pending entries are merged per recipient into one digest -> digest builder
+    DIGEST_KINDS = {"LEAVE_STATUS": "_leave_status_digest"}
+
+    def __init__(
+        self,
+        transport: MessagingTransport,
+        send_threads: int = 8,
+        coalesce_window_seconds: float = 0
+    ):
         self.initialized = True
+        self.transport = transport
+        self.send_threads = send_threads
+        self.coalesce_window_seconds = coalesce_window_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.send_threads, thread_name_prefix="fcm-send"
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def send_multicast(self, payloads: List[Payload]) -> List[List[TokenResult]]:
+        """
+        Send each payload to its tokens.
+
+        Duplicate tokens within a payload are sent once. The messages of all
+        payloads are packed together into requests of MAX_BATCH_SIZE, so many
+        small per-recipient payloads share one request, and the requests are
+        sent concurrently from the thread pool.
+
+        Returns:
+            list: Per payload, one TokenResult per distinct token, in order
+        """
+        messages: List[Message] = []
+        owners: List[int] = []  # Payload index of each message
+        for index, (title, body, data, tokens) in enumerate(payloads):
+            for token in dict.fromkeys(token for token in tokens if token):
+                messages.append(Message(token, title, body, data))
+                owners.append(index)
+
+        jobs = []
+        for start in range(0, len(messages), self.MAX_BATCH_SIZE):
+            chunk = messages[start:start + self.MAX_BATCH_SIZE]
+            jobs.append((start, chunk, self.executor.submit(self.transport.send_each, chunk)))
+
+        results: List[List[TokenResult]] = [[] for _ in payloads]
+        for start, chunk, future in jobs:
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                # A failed request says nothing about its tokens, so none are marked dead
+                logger.error(f"Error sending request of {len(chunk)} messages: {e}")
+                chunk_results = [TokenResult(message.token, False, e) for message in chunk]
+            for index, result in zip(owners[start:start + len(chunk)], chunk_results):
+                results[index].append(result)
+        return results
+
+    def prune_dead_tokens(self, db: Session, results: Sequence[TokenResult]) -> int:
+        """
+        Delete tokens FCM reported as unregistered or invalid, in one statement.
+
+        Returns:
+            int: Number of token rows removed
+        """
+        dead = {result.token for result in results if result.dead}
+        if not dead:
+            return 0
+        removed = db.execute(
+            delete(FCMToken)
+            .where(FCMToken.token.in_(dead))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        metrics.increment("fcm_tokens_pruned", removed)
+        logger.info(f"Pruned {removed} dead FCM tokens")
+        return removed
+
+    def send_to_tokens(
+        self,
+        tokens: Sequence[str],
+        title: str,
+        body: str,
+        data: Optional[dict] = None
+    ) -> List[TokenResult]:
+        """Send one payload to any number of devices"""
+        return self.send_multicast([(title, body, data, tokens)])[0]
 
     def send_notification(
         self,
@@ -33,23 +143,17 @@ class NotificationService:
             bool: True if notification was sent successfully
         """
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                token=token,
-                data=data or {},
-            )
-
-            response = messaging.send(message)
-            logger.info(f"Successfully sent notification: {response}")
-            return True
-
+            result = self.transport.send_each([Message(token, title, body, data)])[0]
         except Exception as e:
             logger.error(f"Error sending notification: {e}")
             return False
 
+        if not result.success:
+            logger.error(f"Error sending notification: {result.error}")
+            return False
+        logger.info("Successfully sent notification")
+        return True
+
     def send_leave_status_notification(
         self,
         db: Session,
@@ -71,44 +175,181 @@ class NotificationService:
         Returns:
             bool: True if notification was sent successfully
         """
-        # Get student's FCM tokens
-        fcm_tokens = db.query(FCMToken).filter(
-            FCMToken.user_id == student_id
-        ).all()
-
-        if not fcm_tokens:
+        tokens = self.get_user_tokens(db, student_id)
+        if not tokens:
             logger.warning(f"No FCM tokens found for student {student_id}")
             return False
 
-        # Create notification content
-        if status == "APPROVED":
-            title = "Leave Approved ✅"
-            body = f"Your leave request for {date_range} has been approved."
-        else:
-            title = "Leave Rejected ❌"
-            body = f"Your leave request for {date_range} has been rejected."
-
-        # Send to all student's devices
-        success_count = 0
-        for fcm_token in fcm_tokens:
-            if self.send_notification(
-                token=fcm_token.token,
+        title, body = self._leave_status_content(status, date_range)
+
+        # One request to all of the student's devices
+        results = self.send_to_tokens(
+            tokens,
+            title=title,
+            body=body,
+            data={
+                "type": "LEAVE_STATUS",
+                "leave_id": str(leave_id),
+                "status": status,
+            }
+        )
+        success_count = sum(result.success for result in results)
+        self.prune_dead_tokens(db, results)
+
+        logger.info(
+            f"Sent leave notification to {success_count}/{len(results)} devices "
+            f"for student {student_id}"
+        )
+
+        return success_count > 0
+
+    @staticmethod
+    def _leave_status_content(status: str, date_range: str) -> Tuple[str, str]:
+        # Actions store APPROVE/REJECT, older rows APPROVED/REJECTED
+        if normalize_status(status) == "APPROVED":
+            return "Leave Approved ✅", f"Your leave request for {date_range} has been approved."
+        return "Leave Rejected ❌", f"Your leave request for {date_range} has been rejected."
+
+    def build_leave_status_notifications(
+        self,
+        status: str,
+        leaves: List[Tuple[int, int, str]]
+    ) -> List[NotificationOutbox]:
+        """
+        Outbox rows announcing leave decisions, to be added in the same
+        transaction as the decision itself.
+
+        Args:
+            status: Decision applied to every leave (APPROVE/REJECT)
+            leaves: (student_id, leave_id, date_range) per decided leave
+        """
+        # Held for the coalescing window so decisions made in quick succession go out as one digest
+        send_at = datetime.now(timezone.utc) + timedelta(seconds=self.coalesce_window_seconds)
+        entries = []
+        for student_id, leave_id, date_range in leaves:
+            title, body = self._leave_status_content(status, date_range)
+            entries.append(NotificationOutbox(
+                user_id=student_id,
+                kind="LEAVE_STATUS",
                 title=title,
                 body=body,
-                data={
+                data=json.dumps({
                     "type": "LEAVE_STATUS",
                     "leave_id": str(leave_id),
                     "status": status,
-                }
-            ):
-                success_count += 1
+                }),
+                next_attempt_at=send_at,
+            ))
+        return entries
 
-        logger.info(
-            f"Sent leave notification to {success_count}/{len(fcm_tokens)} devices "
-            f"for student {student_id}"
-        )
+    @staticmethod
+    def _leave_status_digest(entries: list) -> Tuple[str, str, str]:
+        decisions = [json.loads(entry.data) for entry in entries]
+        approved = sum(normalize_status(decision["status"]) == "APPROVED" for decision in decisions)
+        rejected = len(decisions) - approved
+        if not rejected:
+            title, body = "Leave Approved ✅", f"{approved} leave requests approved."
+        elif not approved:
+            title, body = "Leave Rejected ❌", f"{rejected} leave requests rejected."
+        else:
+            title, body = "Leave Requests Reviewed", f"{approved} leave requests approved, {rejected} rejected."
+        data = json.dumps({
+            "type": "LEAVE_STATUS_DIGEST",
+            "leave_ids": ",".join(decision["leave_id"] for decision in decisions),
+            "count": str(len(decisions)),
+        })
+        return title, body, data
 
-        return success_count > 0
+    def coalesce(self, entries: list) -> List[Tuple[List[int], int, str, str, Optional[str]]]:
+        """
+        Merge outbox entries into the messages to send.
+
+        Entries of a DIGEST_KINDS kind for the same recipient become a single
+        digest; everything else is sent as is.
+
+        Returns:
+            list: (entry ids, user_id, title, body, data) per message
+        """
+        digests = defaultdict(list)
+        messages = []
+        for entry in entries:
+            if entry.kind in self.DIGEST_KINDS:
+                digests[(entry.user_id, entry.kind)].append(entry)
+            else:
+                messages.append(([entry.id], entry.user_id, entry.title, entry.body, entry.data))
+
+        for (user_id, kind), group in digests.items():
+            if len(group) == 1:
+                entry = group[0]
+                messages.append(([entry.id], user_id, entry.title, entry.body, entry.data))
+                continue
+            group.sort(key=lambda entry: entry.id)
+            title, body, data = getattr(self, self.DIGEST_KINDS[kind])(group)
+            messages.append(([entry.id for entry in group], user_id, title, body, data))
+        return messages
+
+    def deliver_outbox(self, db: Session, entries: list) -> Dict[int, Optional[str]]:
+        """
+        Send claimed outbox entries to every device of their recipients.
+
+        Each recipient's digestible entries are first merged into one digest
+        message. Tokens for all recipients are loaded in one query. Messages
+        with an identical payload are merged over all of their recipients'
+        tokens, everything is packed into as few send requests as possible,
+        and per-token results are mapped back to the entries behind each
+        message.
+
+        Args:
+            db: Database session
+            entries: Rows with id, user_id, kind, title, body and data
+
+        Returns:
+            dict: entry id -> None if delivered (or the user has no devices),
+            otherwise the error to retry on
+        """
+        user_ids = {entry.user_id for entry in entries}
+        tokens_by_user = defaultdict(list)
+        for user_id, token in db.query(FCMToken.user_id, FCMToken.token).filter(
+            FCMToken.user_id.in_(user_ids)
+        ):
+            if token:
+                tokens_by_user[user_id].append(token)
+
+        messages = self.coalesce(entries)
+        metrics.increment("notification_outbox_coalesced", len(entries) - len(messages))
+
+        # payload -> token -> indexes of the messages that want that token
+        groups: Dict[tuple, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        for index, (_, user_id, title, body, data) in enumerate(messages):
+            owners = groups[(title, body, data)]
+            for token in tokens_by_user.get(user_id, ()):
+                owners[token].append(index)
+
+        keys = list(groups)
+        payloads = [
+            (title, body, json.loads(data) if data else None, list(groups[(title, body, data)]))
+            for title, body, data in keys
+        ]
+
+        delivered = set()
+        errors = {}
+        sent = self.send_multicast(payloads)
+        self.prune_dead_tokens(db, [result for results in sent for result in results])
+        for key, results in zip(keys, sent):
+            for result in results:
+                for index in groups[key][result.token]:
+                    if result.success:
+                        delivered.add(index)
+                    elif not result.dead:
+                        errors[index] = str(result.error)
+
+        # A message counts as delivered once any of its recipient's devices got
+        # it; dead tokens are pruned rather than retried
+        return {
+            entry_id: None if index in delivered else errors.get(index)
+            for index, (entry_ids, *_) in enumerate(messages)
+            for entry_id in entry_ids
+        }
 
     def send_bulk_notification(
         self,
@@ -132,26 +373,13 @@ class NotificationService:
         if not tokens:
             return 0
 
-        try:
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                tokens=tokens,
-                data=data or {},
-            )
-
-            response = messaging.send_each_for_multicast(message)
-            logger.info(
-                f"Sent {response.success_count} notifications, "
-                f"{response.failure_count} failed"
-            )
-            return response.success_count
-
-        except Exception as e:
-            logger.error(f"Error sending bulk notification: {e}")
-            return 0
+        results = self.send_to_tokens(tokens, title=title, body=body, data=data)
+        success_count = sum(result.success for result in results)
+        logger.info(
+            f"Sent {success_count} notifications, "
+            f"{len(results) - success_count} failed"
+        )
+        return success_count
 
     def get_user_tokens(self, db: Session, user_id: int) -> list:
         """Get all FCM tokens for a user"""
@@ -162,5 +390,9 @@ class NotificationService:
 
 
 # Singleton instance
-notification_service = NotificationService()
+notification_service = NotificationService(
+    transport=build_messaging_transport(settings.NOTIFICATION_TRANSPORT),
+    send_threads=settings.NOTIFICATION_SEND_THREADS,
+    coalesce_window_seconds=settings.NOTIFICATION_COALESCE_WINDOW_SECONDS,
+)
 
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.database import upsert_insert
+from app.db.models import AttendanceDailyRollup
+
+# Rollup counter column for each attendance status
+STATUS_COLUMNS = {
+    "PRESENT": "present_count",
+    "LATE": "late_count",
+    "ABSENT": "absent_count",
+    "EXCUSED": "excused_count",
+}
+
+# (student_id, day, session_name, old_status, new_status); old_status is None for inserts
+StatusChange = Tuple[int, date, str, Optional[str], Optional[str]]
+
+
+def record_status_changes(db: Session, changes: Iterable[StatusChange]) -> None:
+    """
+    Apply attendance record inserts/status changes to the daily rollup.
+
+    Deltas are folded per (student, day, session name) and written with one
+    batched upsert, in the caller's transaction.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for student_id, day, session_name, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        counters = deltas[(student_id, day, session_name)]
+        if old_status in STATUS_COLUMNS:
+            counters[STATUS_COLUMNS[old_status]] -= 1
+        else:
+            counters["total_count"] += 1
+        if new_status in STATUS_COLUMNS:
+            counters[STATUS_COLUMNS[new_status]] += 1
+        else:
+            counters["total_count"] -= 1
+
+    if not deltas:
+        return
+
+    counter_columns = list(STATUS_COLUMNS.values()) + ["total_count"]
+    rows = [
+        {
+            "student_id": student_id,
+            "day": day,
+            "session_name": session_name,
+            **{column: counters.get(column, 0) for column in counter_columns},
+        }
+        for (student_id, day, session_name), counters in deltas.items()
+    ]
+
+    insert = upsert_insert(db.get_bind())
+    stmt = insert(AttendanceDailyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["student_id", "day", "session_name"],
+        set_={
+            column: getattr(AttendanceDailyRollup, column) + getattr(stmt.excluded, column)
+            for column in counter_columns
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def _summarize(row) -> dict:
+    present = row.present or 0
+    late = row.late or 0
+    absent = row.absent or 0
+    excused = row.excused or 0
+    total = row.total or 0
+    attended = present + late
+    # Excused absences do not count against the student
+    counted = total - excused
+    return {
+        "present": present,
+        "late": late,
+        "absent": absent,
+        "excused": excused,
+        "total": total,
+        "attendance_percentage": round(attended * 100.0 / counted, 2) if counted > 0 else None,
+    }
+
+
+def _sums():
+    return (
+        func.sum(AttendanceDailyRollup.present_count).label("present"),
+        func.sum(AttendanceDailyRollup.late_count).label("late"),
+        func.sum(AttendanceDailyRollup.absent_count).label("absent"),
+        func.sum(AttendanceDailyRollup.excused_count).label("excused"),
+        func.sum(AttendanceDailyRollup.total_count).label("total"),
+    )
+
+
+def _filtered(query, start_date: Optional[date], end_date: Optional[date]):
+    if start_date:
+        query = query.filter(AttendanceDailyRollup.day >= start_date)
+    if end_date:
+        query = query.filter(AttendanceDailyRollup.day <= end_date)
+    return query
+
+
+def student_summary(
+    db: Session,
+    student_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> dict:
+    """Overall and per-session-name attendance percentages for one student"""
+    base = _filtered(
+        db.query(AttendanceDailyRollup.session_name, *_sums())
+        .filter(AttendanceDailyRollup.student_id == student_id),
+        start_date, end_date,
+    )
+    overall = _filtered(
+        db.query(*_sums()).filter(AttendanceDailyRollup.student_id == student_id),
+        start_date, end_date,
+    ).one()
+
+    return {
+        "student_id": student_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "overall": _summarize(overall),
+        "by_session_name": [
+            {"session_name": row.session_name, **_summarize(row)}
+            for row in base.group_by(AttendanceDailyRollup.session_name)
+            .order_by(AttendanceDailyRollup.session_name).all()
+        ],
+    }
+
+
+def session_name_summary(
+    db: Session,
+    session_name: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> dict:
+    """Overall and per-student attendance percentages for one session name"""
+    overall = _filtered(
+        db.query(*_sums()).filter(AttendanceDailyRollup.session_name == session_name),
+        start_date, end_date,
+    ).one()
+    per_student = _filtered(
+        db.query(AttendanceDailyRollup.student_id, *_sums())
+        .filter(AttendanceDailyRollup.session_name == session_name),
+        start_date, end_date,
+    ).group_by(AttendanceDailyRollup.student_id).order_by(AttendanceDailyRollup.student_id).all()
+
+    return {
+        "session_name": session_name,
+        "start_date": start_date,
+        "end_date": end_date,
+        "overall": _summarize(overall),
+        "by_student": [
+            {"student_id": row.student_id, **_summarize(row)}
+            for row in per_student
+        ],
+    }
+
+
+def date_range_summary(db: Session, start_date: date, end_date: date) -> dict:
+    """Overall and per-day attendance percentages across all students"""
+    overall = _filtered(db.query(*_sums()), start_date, end_date).one()
+    per_day = _filtered(
+        db.query(AttendanceDailyRollup.day, *_sums()), start_date, end_date,
+    ).group_by(AttendanceDailyRollup.day).order_by(AttendanceDailyRollup.day).all()
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "overall": _summarize(overall),
+        "by_day": [
+            {"day": row.day, **_summarize(row)}
+            for row in per_day
+        ],
+    }
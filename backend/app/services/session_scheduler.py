@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import SessionLocal
+from app.db.models import SchedulerLease
+from app.services.session_service import close_expired_sessions, local_now, publish_session_closed
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSweeper:
+    """
+    Periodically closes sessions whose late_until deadline has passed.
+
+    Every worker process runs its own sweeper, but only the holder of the
+    ``session_sweeper`` lease row does any work, so running several uvicorn
+    workers never closes (or finalizes) a session twice.
+    """
+
+    LEASE_NAME = "session_sweeper"
+
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lease_ttl(self) -> timedelta:
+        return timedelta(seconds=max(self.interval_seconds * 3, 30))
+
+    def _acquire_lease(self, db: Session, now: datetime) -> bool:
+        """Take or renew the lease. Returns True if this worker holds it."""
+        renewed = db.execute(
+            update(SchedulerLease)
+            .where(
+                SchedulerLease.name == self.LEASE_NAME,
+                (SchedulerLease.owner == self.owner) | (SchedulerLease.expires_at < now),
+            )
+            .values(owner=self.owner, expires_at=now + self.lease_ttl)
+        )
+        if renewed.rowcount:
+            db.commit()
+            return True
+
+        try:
+            db.add(SchedulerLease(
+                name=self.LEASE_NAME,
+                owner=self.owner,
+                expires_at=now + self.lease_ttl,
+            ))
+            db.commit()
+            return True
+        except IntegrityError:
+            # Another worker holds a live lease
+            db.rollback()
+            return False
+
+    def sweep_once(self) -> int:
+        """
+        Run a single sweep.
+
+        Returns:
+            int: Number of sessions closed, 0 if another worker holds the lease
+        """
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            now = local_now()
+            if not self._acquire_lease(db, now):
+                return 0
+
+            closed_ids = close_expired_sessions(db, now=now, batch_size=self.batch_size)
+            db.commit()
+            publish_session_closed(db, closed_ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        metrics.observe("session_sweep_duration_seconds", time.perf_counter() - started)
+        metrics.increment("session_sweep_closed_sessions", len(closed_ids))
+        if closed_ids:
+            logger.info(f"Auto-closed {len(closed_ids)} expired sessions: {closed_ids}")
+        return len(closed_ids)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Database work is synchronous, keep it off the event loop
+                await asyncio.to_thread(self.sweep_once)
+            except Exception as e:
+                metrics.increment("session_sweep_errors")
+                logger.error(f"Session sweep failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance
+session_sweeper = SessionSweeper(
+    interval_seconds=settings.SESSION_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.SESSION_SWEEP_BATCH_SIZE,
+)
@@ -0,0 +1,235 @@
+from datetime import datetime, date, timezone
+from typing import List, Optional
+from sqlalchemy import select, update, exists, func, literal, case, Date, Boolean
+from sqlalchemy.orm import Session
+
+from app.db.database import upsert_insert
+from app.db.models import AttendanceSession, AttendanceRecord, Enrollment
+from app.services.live_feed import live_feed
+from app.services.rollup_service import record_status_changes
+
+
+def _status_count(status: str):
+    """Correlated count of a session's records with the given status"""
+    return (
+        select(func.count(AttendanceRecord.id))
+        .where(
+            AttendanceRecord.session_id == AttendanceSession.id,
+            AttendanceRecord.status == status,
+        )
+        .scalar_subquery()
+    )
+
+
+def local_now() -> datetime:
+    """Current local time, timezone-aware, to compare with DateTime(timezone=True) columns"""
+    return datetime.now().astimezone()
+
+
+def as_local(value: datetime) -> datetime:
+    """
+    ``value`` as aware local time.
+
+    Postgres returns timestamptz values aware; SQLite returns them naive, in
+    the local time they were written in, so naive values are taken as local.
+    """
+    return value.astimezone()
+
+
+def session_day(late_until: Optional[datetime], created_at: Optional[datetime]) -> date:
+    """
+    Local calendar day a session's attendance belongs to.
+
+    late_until is entered as a local deadline; created_at comes from the
+    database clock, which SQLite keeps in naive UTC.
+    """
+    if late_until is not None:
+        return as_local(late_until).date()
+    if created_at is not None:
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at.astimezone().date()
+    return date.today()
+
+
+def materialize_absences(db: Session, session_ids: List[int]) -> int:
+    """
+    Insert an ABSENT record for every enrolled student who did not check in.
+
+    Absences are dated on the session's own day (see session_day), not the
+    day it happens to be closed, so they sit next to its check-ins in the
+    daily rollup.
+
+    Runs as a single INSERT ... SELECT over the enrolment roster of each
+    session, so the cost does not depend on how many students are missing.
+    Students whose check-in lands concurrently are skipped through the
+    unique (session_id, student_id) index rather than getting a second row.
+    The inserted rows are folded into the daily rollup in one batched upsert.
+
+    Returns:
+        int: Number of ABSENT records inserted
+    """
+    if not session_ids:
+        return 0
+
+    sessions = db.query(
+        AttendanceSession.id,
+        AttendanceSession.session_name,
+        AttendanceSession.late_until,
+        AttendanceSession.created_at,
+    ).filter(AttendanceSession.id.in_(session_ids)).all()
+    if not sessions:
+        return 0
+    days = {row.id: session_day(row.late_until, row.created_at) for row in sessions}
+    session_names = {row.id: row.session_name for row in sessions}
+
+    absentees = (
+        select(
+            AttendanceSession.id,
+            Enrollment.student_id,
+            case({session_id: literal(day, Date) for session_id, day in days.items()}, value=AttendanceSession.id),
+            literal("ABSENT"),
+            literal(False, Boolean),
+        )
+        .select_from(AttendanceSession)
+        .join(Enrollment, Enrollment.course_name == AttendanceSession.course_name)
+        .where(
+            AttendanceSession.id.in_(session_ids),
+            ~exists().where(
+                AttendanceRecord.session_id == AttendanceSession.id,
+                AttendanceRecord.student_id == Enrollment.student_id,
+            ),
+        )
+    )
+    insert = upsert_insert(db.get_bind())
+    inserted = db.execute(
+        insert(AttendanceRecord).from_select(
+            ["session_id", "student_id", "date", "status", "face_verified"],
+            absentees,
+        ).on_conflict_do_nothing(
+            index_elements=["session_id", "student_id"]
+        ).returning(AttendanceRecord.session_id, AttendanceRecord.student_id)
+    ).all()
+    if not inserted:
+        return 0
+
+    record_status_changes(db, [
+        (row.student_id, days[row.session_id], session_names[row.session_id], None, "ABSENT")
+        for row in inserted
+    ])
+    return len(inserted)
+
+
+def insert_check_in(db: Session, session_id: int, student_id: int, **values) -> Optional[int]:
+    """
+    Insert a student's check-in, unless the session is closed or they already have a record.
+
+    The open-session check and the duplicate check are part of the INSERT
+    itself (INSERT ... SELECT from the open session, ON CONFLICT DO
+    NOTHING), so a check-in can never race a session close or a second
+    check-in into two rows. The caller owns the transaction.
+
+    Returns:
+        Optional[int]: ID of the new record, or None if nothing was inserted
+    """
+    columns = {"session_id": session_id, "student_id": student_id, **values}
+    table = AttendanceRecord.__table__
+    row = (
+        select(*(literal(value, table.c[name].type) for name, value in columns.items()))
+        .select_from(AttendanceSession)
+        .where(AttendanceSession.id == session_id, AttendanceSession.is_closed.isnot(True))
+    )
+    insert = upsert_insert(db.get_bind())
+    return db.execute(
+        insert(AttendanceRecord)
+        .from_select(list(columns), row)
+        .on_conflict_do_nothing(index_elements=["session_id", "student_id"])
+        .returning(AttendanceRecord.id)
+    ).scalar()
+
+
+def snapshot_counts(db: Session, session_ids: List[int]) -> None:
+    """Store final status counts on the session rows so reads skip aggregation"""
+    if not session_ids:
+        return
+
+    db.execute(
+        update(AttendanceSession)
+        .where(AttendanceSession.id.in_(session_ids))
+        .values(
+            total_present=_status_count("PRESENT"),
+            total_late=_status_count("LATE"),
+            total_absent=_status_count("ABSENT"),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def close_sessions(db: Session, criterion, closed_at: Optional[datetime] = None) -> List[int]:
+    """
+    Close every open session matching ``criterion`` and finalize it.
+
+    Sessions are flipped with one UPDATE ... RETURNING, so a session that is
+    already closed (or closed concurrently) is never finalized twice. The
+    caller owns the transaction and must commit.
+
+    Returns:
+        List[int]: IDs of the sessions closed by this call
+    """
+    closed_at = closed_at or local_now()
+    closed_ids = list(db.execute(
+        update(AttendanceSession)
+        .where(criterion, AttendanceSession.is_closed.isnot(True))
+        .values(is_closed=True, closed_at=closed_at)
+        .returning(AttendanceSession.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+    materialize_absences(db, closed_ids)
+    snapshot_counts(db, closed_ids)
+    return closed_ids
+
+
+def close_session(db: Session, session_id: int) -> bool:
+    """Close a single session. Returns False if it was already closed."""
+    return bool(close_sessions(db, AttendanceSession.id == session_id))
+
+
+def close_expired_sessions(db: Session, now: Optional[datetime] = None, batch_size: int = 100) -> List[int]:
+    """Close up to ``batch_size`` open sessions whose late_until has passed"""
+    now = now or local_now()
+    expired = (
+        select(AttendanceSession.id)
+        .where(
+            AttendanceSession.is_closed.isnot(True),
+            AttendanceSession.late_until < now,
+        )
+        .order_by(AttendanceSession.late_until)
+        .limit(batch_size)
+        .correlate(None)
+        .scalar_subquery()
+    )
+    return close_sessions(db, AttendanceSession.id.in_(expired), closed_at=now)
+
+
+def publish_session_closed(db: Session, session_ids: List[int]) -> None:
+    """Push the final counts of freshly closed sessions to live feed subscribers"""
+    if not session_ids:
+        return
+
+    rows = db.query(
+        AttendanceSession.id,
+        AttendanceSession.total_present,
+        AttendanceSession.total_late,
+        AttendanceSession.total_absent,
+    ).filter(AttendanceSession.id.in_(session_ids)).all()
+    for row in rows:
+        live_feed.publish(row.id, {
+            "type": "session_closed",
+            "session_id": row.id,
+            "totals": {
+                "PRESENT": row.total_present or 0,
+                "LATE": row.total_late or 0,
+                "ABSENT": row.total_absent or 0,
+            },
+        })
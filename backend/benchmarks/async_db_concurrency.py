@@ -0,0 +1,131 @@
+"""
+Async vs sync database sessions under concurrent requests.
+
+Serves the same slow query three ways, through the app's own session
+dependencies:
+
+* sync-in-async: an ``async def`` handler on the sync ``SessionLocal``
+  (``get_db``), the shape the handlers had before they moved to
+  AsyncSession; every query blocks the event loop;
+* threadpool: a plain ``def`` handler on ``get_db``, which FastAPI runs in
+  its worker thread pool;
+* async: an ``async def`` handler on ``get_async_db``.
+
+For each, ``--concurrency`` slow requests are fired at once while a
+ticker sleeps in 5 ms steps on the same loop; how late it wakes up is how
+long the event loop was stalled, i.e. how long any other request would
+have waited. Requests go through httpx's ASGI transport, so there is
+no network in the numbers. Usage, from backend/:
+
+    python benchmarks/async_db_concurrency.py --concurrency 32 --rows 300000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Recursive count, so the "slow query" is SQLite work that does not need any data
+SLOW_QUERY = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :rows) "
+    "SELECT count(*) FROM n"
+)
+TICK_SECONDS = 0.005
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3, help="Bursts per variant")
+    parser.add_argument("--rows", type=int, default=300_000, help="Size of the slow query")
+    return parser.parse_args()
+
+
+def build_app(rows: int):
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+    from app.db.database import get_async_db, get_db
+
+    app = FastAPI()
+    query = text(SLOW_QUERY).bindparams(rows=rows)
+
+    @app.get("/sync-in-async")
+    async def sync_in_async(db: Session = Depends(get_db)):
+        return {"count": db.execute(query).scalar()}
+
+    @app.get("/threadpool")
+    def threadpool(db: Session = Depends(get_db)):
+        return {"count": db.execute(query).scalar()}
+
+    @app.get("/async")
+    async def async_session(db: AsyncSession = Depends(get_async_db)):
+        return {"count": (await db.execute(query)).scalar()}
+
+    return app
+
+
+async def run_variant(client, path: str, args) -> None:
+    burst_seconds, stalls = [], []
+
+    for _ in range(args.rounds):
+        done = asyncio.Event()
+
+        async def ticker() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(TICK_SECONDS)
+                stalls.append(time.perf_counter() - started - TICK_SECONDS)
+
+        prober = asyncio.create_task(ticker())
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get(path) for _ in range(args.concurrency)))
+        burst_seconds.append(time.perf_counter() - started)
+        done.set()
+        await prober
+        for response in responses:
+            response.raise_for_status()
+
+    requests = args.concurrency * args.rounds
+    print(
+        f"{path.strip('/'):<14} {requests / sum(burst_seconds):8.1f} req/s   "
+        f"burst {statistics.mean(burst_seconds):6.2f} s   "
+        f"loop stall median {statistics.median(stalls) * 1000:8.1f} ms   worst {max(stalls) * 1000:8.1f} ms"
+    )
+
+
+async def main_async(args) -> None:
+    import httpx
+
+    app = build_app(args.rows)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Warm both pools and the query before timing anything
+        await client.get("/async")
+        await client.get("/threadpool")
+        for path in ("/sync-in-async", "/threadpool", "/async"):
+            await run_variant(client, path, args)
+
+
+def main() -> None:
+    args = parse_args()
+    # One connection per in-flight request for every variant. With fewer, a
+    # sync-in-async handler blocks the loop waiting for a connection that
+    # only a (loop-driven) teardown can return, until the pool times out.
+    os.environ["DB_POOL_SIZE"] = str(args.concurrency)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+    # The app's default engine points at ./attendance.db; keep it away from the real one
+    os.chdir(tempfile.mkdtemp(prefix="async-db-bench-"))
+    print(f"{args.concurrency} concurrent requests x {args.rounds} rounds, slow query over {args.rows} rows")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
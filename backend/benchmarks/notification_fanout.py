@@ -0,0 +1,192 @@
+"""
+Notification fan-out benchmark against the local FCM stand-in.
+
+Seeds a throwaway database with one course of students (one device each,
+a share of them dead), then measures:
+
+* leave approvals: ``--leaves-per-student`` rounds of POST
+  /leave/batch/action, each approving one pending leave per student, timed
+  until the outbox is fully drained by the dispatcher;
+* broadcast: one POST /notifications/broadcasts to the whole course, timed
+  until the broadcast reports DONE.
+
+Everything runs in this process with the app's real background workers,
+so numbers are repeatable for a given ``--seed``. Usage, from backend/:
+
+    python benchmarks/notification_fanout.py --students 5000 --latency-ms 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--leaves-per-student", type=int, default=3)
+    parser.add_argument("--coalesce-window", type=float, default=2, help="Outbox digest window in seconds")
+    parser.add_argument("--dead-share", type=float, default=0.05, help="Share of devices already unregistered")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stand-in latency per request")
+    parser.add_argument("--failure-rate", type=float, default=0.01, help="Transient per-token failures")
+    parser.add_argument("--quota", type=int, default=0, help="Stand-in tokens per second, 0 for unlimited")
+    parser.add_argument("--broadcast-rate", type=float, default=5000, help="Broadcast token bucket rate")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300)
+    return parser.parse_args()
+
+
+def configure(args) -> None:
+    """Point the app at the stand-in before any app module reads its settings"""
+    os.environ.update({
+        "NOTIFICATION_TRANSPORT": "local",
+        "NOTIFICATION_LOCAL_LATENCY_MS": str(args.latency_ms),
+        "NOTIFICATION_LOCAL_FAILURE_RATE": str(args.failure_rate),
+        "NOTIFICATION_LOCAL_QUOTA_PER_SECOND": str(args.quota),
+        "NOTIFICATION_LOCAL_SEED": str(args.seed),
+        "NOTIFICATION_BROADCAST_RATE_PER_SECOND": str(args.broadcast_rate),
+        "NOTIFICATION_BROADCAST_BURST": str(max(500, int(args.broadcast_rate))),
+        "NOTIFICATION_COALESCE_WINDOW_SECONDS": str(args.coalesce_window),
+        "NOTIFICATION_DISPATCH_INTERVAL_SECONDS": "0.1",
+        "NOTIFICATION_RETRY_BASE_SECONDS": "0.2",
+        "NOTIFICATION_RETRY_MAX_SECONDS": "1",
+        "TOKEN_VERIFIER": "local",
+        "SESSION_SWEEP_ENABLED": "false",
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+def seed(args) -> List[list]:
+    from datetime import date
+    from sqlalchemy import insert
+    from app.db.database import SessionLocal
+    from app.db.models import Enrollment, FCMToken, LeaveRequest, User
+    from app.services.leave_service import record_leave_status_changes
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [{
+            "id": 1, "firebase_uid": "bench-admin", "email": "admin@bench", "name": "Admin", "role": "ADMIN"
+        }])
+        students = range(2, args.students + 2)
+        db.execute(insert(User), [
+            {"id": i, "firebase_uid": f"bench-{i}", "email": f"s{i}@bench", "name": f"Student {i}", "role": "STUDENT"}
+            for i in students
+        ])
+        db.execute(insert(Enrollment), [{"course_name": "BENCH", "student_id": i} for i in students])
+        dead_every = int(1 / args.dead_share) if args.dead_share else 0
+        db.execute(insert(FCMToken), [
+            {"user_id": i, "token": f"dead-{i}" if dead_every and i % dead_every == 0 else f"device-{i}"}
+            for i in students
+        ])
+        rounds = [
+            db.execute(insert(LeaveRequest).returning(LeaveRequest.id), [
+                {"student_id": i, "from_date": date.today(), "to_date": date.today(), "reason": "bench", "status": "PENDING"}
+                for i in students
+            ]).scalars().all()
+            for _ in range(args.leaves_per_student)
+        ]
+        record_leave_status_changes(db, [(None, "PENDING")] * args.students * args.leaves_per_student)
+        db.commit()
+        return rounds
+    finally:
+        db.close()
+
+
+def outbox_pending() -> int:
+    from sqlalchemy import func, select
+    from app.db.database import SessionLocal
+    from app.db.models import NotificationOutbox
+
+    db = SessionLocal()
+    try:
+        return db.scalar(
+            select(func.count()).where(NotificationOutbox.status.in_(["PENDING", "SENDING"]))
+        )
+    finally:
+        db.close()
+
+
+def wait_for(predicate, timeout: float, poll: float = 0.05) -> None:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Benchmark step did not finish in time")
+        time.sleep(poll)
+
+
+def report(name: str, request_seconds: float, total_seconds: float, devices: int, extra: str) -> None:
+    print(
+        f"{name:<16} slowest request {request_seconds * 1000:8.1f} ms   "
+        f"drained {total_seconds:7.2f} s   {devices / total_seconds:9.0f} devices/s   {extra}"
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    configure(args)
+    os.chdir(tempfile.mkdtemp(prefix="notification-bench-"))
+
+    from fastapi.testclient import TestClient
+    from app.core.metrics import metrics
+    from app.core.token_verifier import token_verifier
+    from app.main import app
+    from app.services.notification_service import notification_service
+
+    with TestClient(app) as client:
+        rounds = seed(args)
+        headers = {"Authorization": f"Bearer {token_verifier.issue('bench-admin', role='ADMIN')}"}
+        print(
+            f"{args.students} students, stand-in latency {args.latency_ms:g} ms, "
+            f"{args.failure_rate:.1%} transient failures, {args.dead_share:.1%} dead devices, "
+            f"quota {args.quota or 'unlimited'}/s, {args.leaves_per_student} approvals per student, "
+            f"{args.coalesce_window:g} s digest window"
+        )
+
+        started = time.perf_counter()
+        request_seconds = 0.0
+        for leave_ids in rounds:
+            request_started = time.perf_counter()
+            response = client.post("/leave/batch/action", headers=headers, json={"leave_ids": leave_ids, "action": "APPROVE"})
+            request_seconds = max(request_seconds, time.perf_counter() - request_started)
+            response.raise_for_status()
+        wait_for(lambda: outbox_pending() == 0, args.timeout)
+        counters = metrics.snapshot()["counters"]
+        report(
+            "leave approvals", request_seconds, time.perf_counter() - started, sum(map(len, rounds)),
+            f"sent {counters.get('notification_outbox_sent', 0):.0f}, "
+            f"coalesced {counters.get('notification_outbox_coalesced', 0):.0f}, "
+            f"retried {counters.get('notification_outbox_retried', 0):.0f}, "
+            f"pruned {counters.get('fcm_tokens_pruned', 0):.0f} tokens",
+        )
+
+        started = time.perf_counter()
+        response = client.post("/notifications/broadcasts", headers=headers, json={
+            "course_name": "BENCH", "title": "Session open", "body": "Scan the QR code now",
+        })
+        request_seconds = time.perf_counter() - started
+        response.raise_for_status()
+        broadcast_url = f"/notifications/broadcasts/{response.json()['id']}"
+        state = {}
+
+        def broadcast_finished() -> bool:
+            state.update(client.get(broadcast_url, headers=headers).json())
+            return state["status"] in ("DONE", "FAILED")
+
+        wait_for(broadcast_finished, args.timeout)
+        report(
+            "broadcast", request_seconds, time.perf_counter() - started, state["total_tokens"] or 0,
+            f"{state['status']}: sent {state['sent_count']}, failed {state['failed_count']}",
+        )
+
+        transport = notification_service.transport
+        print(f"stand-in totals: {transport.requests} requests, {transport.tokens_sent} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Concurrent write throughput on SQLite, with and without the connection PRAGMAs.
+
+Each writer thread repeats a check-in shaped transaction (look up an
+existing record for the student and session, insert one if missing,
+commit) while reader threads keep polling the session's records, as the
+live feed does. Every configuration runs on a fresh database file.
+
+* default: what the engine did before, SQLite's rollback journal with
+  synchronous=FULL and sqlite3's own 5 s lock wait;
+* tuned: app.db.database.sqlite_pragmas(), i.e. the SQLITE_* settings.
+
+Usage, from backend/:
+
+    python benchmarks/sqlite_concurrent_writes.py --writers 8 --readers 4 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    return parser.parse_args()
+
+
+def run(name: str, pragmas: dict, args) -> None:
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from app.db.base import Base
+    from app.db.database import apply_sqlite_pragmas
+    from app.db.models import AttendanceRecord, AttendanceSession
+
+    path = Path(tempfile.mkdtemp(prefix="sqlite-bench-")) / "bench.db"
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=args.writers + args.readers,
+    )
+    apply_sqlite_pragmas(engine, pragmas)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(AttendanceSession(id=1, session_name="bench", created_by="bench"))
+        db.commit()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, reads = [], [0]
+    errors = {"locked": 0}
+
+    def writer(worker: int) -> None:
+        student_id = worker * 10_000_000
+        while not stop.is_set():
+            student_id += 1
+            started = time.perf_counter()
+            db = Session()
+            try:
+                existing = db.scalar(select(AttendanceRecord.id).where(
+                    AttendanceRecord.session_id == 1, AttendanceRecord.student_id == student_id
+                ))
+                if existing is None:
+                    db.add(AttendanceRecord(
+                        session_id=1,
+                        student_id=student_id,
+                        date=date.today(),
+                        status="PRESENT",
+                        checked_in_at=datetime.now(timezone.utc),
+                    ))
+                db.commit()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    errors["locked"] += 1
+            finally:
+                db.close()
+
+    def reader() -> None:
+        while not stop.is_set():
+            with Session() as db:
+                try:
+                    db.scalar(select(func.count(AttendanceRecord.id)).where(AttendanceRecord.session_id == 1))
+                except OperationalError:
+                    continue
+            with lock:
+                reads[0] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) >= 20 else float("nan")
+    print(
+        f"{name:<8} {len(latencies) / args.seconds:8.0f} commits/s   p95 {p95:7.1f} ms   "
+        f"{errors['locked']:5d} 'database is locked'   {reads[0] / args.seconds:8.0f} reads/s"
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    sys.path.insert(0, str(BACKEND_DIR))
+    # The app's default engine points at ./attendance.db; keep it away from the real one
+    os.chdir(tempfile.mkdtemp(prefix="sqlite-bench-"))
+    from app.db.database import sqlite_pragmas
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g} s per configuration")
+    run("default", {}, args)
+    run("tuned", sqlite_pragmas(), args)
+
+
+if __name__ == "__main__":
+    main()
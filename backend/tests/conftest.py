@@ -0,0 +1,96 @@
+"""
+Shared fixtures: the app against a throwaway SQLite database.
+
+The environment is set before any app module is imported, so the engines,
+token verifier and background workers are configured for tests.
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DB_DIR = Path(tempfile.mkdtemp(prefix="attendance-tests-"))
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DB_DIR / 'attendance.db'}",
+    "TOKEN_VERIFIER": "local",
+    "NOTIFICATION_TRANSPORT": "local",
+    "NOTIFICATION_DISPATCH_ENABLED": "false",
+    "NOTIFICATION_LOCAL_LATENCY_MS": "0",
+    "NOTIFICATION_COALESCE_WINDOW_SECONDS": "0",
+    "SESSION_SWEEP_ENABLED": "false",
+})
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    from app.db.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def auth_headers():
+    """Returns request headers carrying a locally signed token for ``uid``"""
+    from app.core.token_verifier import token_verifier
+
+    def headers(uid: str, role: str) -> dict:
+        token = token_verifier.issue(uid, role=role, email=f"{uid}@test")
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    """Run the test with the process in a local time zone away from UTC (UTC+05:30)"""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def statements():
+    """
+    Counts the SQL statements the async engine sends while the block runs.
+
+    Usage: ``with statements() as executed: ...``, then ``len(executed)``.
+    """
+    from sqlalchemy import event
+    from app.db.database import async_engine
+
+    @contextmanager
+    def capture():
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            yield executed
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    return capture
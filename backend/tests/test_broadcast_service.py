@@ -0,0 +1,156 @@
+"""
+Course broadcasts: recipients, rate limiting, chunked progress, and
+resuming broadcasts whose sender went away.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.db.models import Enrollment, FCMToken, NotificationBroadcast, User
+from app.services.broadcast_service import BroadcastService, TokenBucket, roster_tokens
+from app.services.notification_service import notification_service
+
+ADMIN_UID = "broadcast-admin"
+
+
+@pytest.fixture
+def course(request, client, auth_headers, db):
+    """
+    A course of four students: two devices, one device, one dead device, none.
+    A fifth student has a device but is not enrolled.
+
+    Returns the course name and its roster's token ids in id order.
+    """
+    name = f"Broadcast {request.node.name}"
+    uids = [f"broadcast-{request.node.name}-{i}" for i in range(5)]
+    for uid in uids:
+        client.get("/leave/stats", headers=auth_headers(uid, "STUDENT")).raise_for_status()
+    client.get("/leave/stats", headers=auth_headers(ADMIN_UID, "ADMIN")).raise_for_status()
+    ids = dict(db.execute(select(User.firebase_uid, User.id).where(User.firebase_uid.in_(uids))).all())
+    students = [ids[uid] for uid in uids]
+
+    db.execute(insert(Enrollment), [{"course_name": name, "student_id": student_id} for student_id in students[:4]])
+    devices = [
+        (students[0], "phone"), (students[0], "tablet"), (students[1], "phone"),
+        (students[2], "dead-phone"), (students[4], "phone"),
+    ]
+    token_ids = db.execute(insert(FCMToken).returning(FCMToken.id), [
+        {"user_id": student_id, "token": f"{device}-{student_id}"} for student_id, device in devices
+    ]).scalars().all()
+    db.commit()
+    return name, token_ids[:4]
+
+
+def broadcast(db, course_name: str, **values) -> int:
+    admin_id = db.scalar(select(User.id).where(User.firebase_uid == ADMIN_UID))
+    row = NotificationBroadcast(course_name=course_name, created_by=admin_id, title="Room change", body="B-201", **values)
+    db.add(row)
+    db.commit()
+    return row.id
+
+
+def reload(db, broadcast_id: int) -> NotificationBroadcast:
+    db.expire_all()
+    return db.get(NotificationBroadcast, broadcast_id)
+
+
+def service(chunk_size: int = 2, rate: float = 1_000_000) -> BroadcastService:
+    return BroadcastService(chunk_size=chunk_size, rate_per_second=rate, burst=int(rate), lease_seconds=60)
+
+
+def ours(resumed: list, broadcast_ids: set) -> list:
+    """Resumed ids among this test's broadcasts; others in the shared database are ignored"""
+    return [broadcast_id for broadcast_id in resumed if broadcast_id in broadcast_ids]
+
+
+def test_roster_tokens_are_the_enrolled_students_devices(db, course):
+    name, token_ids = course
+
+    assert [row.id for row in db.execute(roster_tokens(name)).all()] == token_ids
+    assert [row.id for row in db.execute(roster_tokens(name, after_id=token_ids[1], limit=1)).all()] == [token_ids[2]]
+    assert db.execute(roster_tokens("No such course")).all() == []
+
+
+def test_token_bucket_spends_its_burst_then_waits_for_the_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=100, capacity=10)
+        started = time.monotonic()
+        await bucket.acquire(10)
+        burst = time.monotonic() - started
+        await bucket.acquire(5)
+        # More than the bucket holds waits for a full bucket rather than forever
+        await bucket.acquire(50)
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(scenario())
+
+    assert burst < 0.02
+    assert 0.14 <= total < 1
+
+
+def test_run_sends_in_chunks_and_records_progress(db, course):
+    name, token_ids = course
+    broadcast_id = broadcast(db, name)
+    sender = service(chunk_size=3)
+    requests = notification_service.transport.requests
+
+    asyncio.run(sender.run(broadcast_id))
+
+    row = reload(db, broadcast_id)
+    assert row.status == "DONE"
+    assert (row.total_tokens, row.sent_count, row.failed_count) == (4, 3, 1)
+    assert row.last_token_id == token_ids[-1]
+    assert row.started_at is not None and row.finished_at is not None
+    assert row.locked_until is None
+    assert notification_service.transport.requests - requests == 2
+    # The dead device was pruned along the way
+    assert db.get(FCMToken, token_ids[3]) is None
+
+
+def test_start_resumes_broadcasts_whose_lease_expired(db, course):
+    name, token_ids = course
+    now = datetime.now(timezone.utc)
+    abandoned = broadcast(
+        db, name, status="RUNNING", started_at=now - timedelta(minutes=10),
+        locked_until=now - timedelta(seconds=1), last_token_id=token_ids[1], sent_count=2, total_tokens=4,
+    )
+    live = broadcast(db, name, status="RUNNING", started_at=now, locked_until=now + timedelta(minutes=5))
+    sender = service()
+
+    async def scenario():
+        resumed = await sender.resume_stale()
+        await asyncio.gather(*sender._tasks)
+        return resumed
+
+    assert ours(asyncio.run(scenario()), {abandoned, live}) == [abandoned]
+
+    row = reload(db, abandoned)
+    assert row.status == "DONE"
+    # Picked up after the last chunk recorded, so nobody is notified twice
+    assert (row.sent_count, row.failed_count) == (3, 1)
+    assert row.started_at.replace(tzinfo=None) == (now - timedelta(minutes=10)).replace(tzinfo=None)
+    assert reload(db, live).status == "RUNNING"
+    assert reload(db, live).sent_count == 0
+
+
+def test_shutdown_leaves_broadcast_for_the_next_worker(db, course):
+    name, _ = course
+    broadcast_id = broadcast(db, name)
+    # Two tokens a second: the second chunk waits on the bucket until cancelled
+    sender = service(chunk_size=2, rate=2)
+
+    async def scenario():
+        sender.submit(broadcast_id)
+        await asyncio.sleep(0.2)
+        await sender.stop()
+        return await asyncio.to_thread(sender._claim_stale)
+
+    resumed = asyncio.run(scenario())
+
+    row = reload(db, broadcast_id)
+    assert row.status == "RUNNING"
+    assert row.sent_count == 2
+    assert broadcast_id in resumed
@@ -0,0 +1,127 @@
+"""Replay of Idempotency-Key requests by IdempotencyStore"""
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.idempotency import IdempotencyStore
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def counting_handler(result="done", delay: float = 0, error: Exception = None):
+    """An async handler that records how many times it ran"""
+    async def handler():
+        handler.calls += 1
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+    handler.calls = 0
+    return handler
+
+
+def test_concurrent_duplicates_share_one_run():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    handler = counting_handler(delay=0.05)
+
+    async def scenario():
+        return await asyncio.gather(*(store.run("key", "fp", handler) for _ in range(5)))
+
+    assert run(scenario()) == ["done"] * 5
+    assert handler.calls == 1
+
+
+def test_completed_result_is_replayed():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    handler = counting_handler()
+
+    async def scenario():
+        await store.run("key", "fp", handler)
+        return await store.run("key", "fp", handler)
+
+    assert run(scenario()) == "done"
+    assert handler.calls == 1
+
+
+def test_fingerprint_mismatch_is_422():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+
+    async def scenario():
+        await store.run("key", "fp", counting_handler())
+        await store.run("key", "other", counting_handler())
+
+    with pytest.raises(HTTPException) as raised:
+        run(scenario())
+    assert raised.value.status_code == 422
+
+
+def test_client_errors_are_cached_and_server_errors_are_not():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    rejected = counting_handler(error=HTTPException(status_code=400, detail="Bad image"))
+    failed = counting_handler(error=HTTPException(status_code=503, detail="Try later"))
+
+    async def scenario():
+        for key, handler in (("rejected", rejected), ("failed", failed)):
+            for _ in range(2):
+                with pytest.raises(HTTPException):
+                    await store.run(key, "fp", handler)
+
+    run(scenario())
+    assert rejected.calls == 1
+    assert failed.calls == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    handler = counting_handler()
+    now = time.monotonic()
+
+    async def scenario():
+        await store.run("key", "fp", handler)
+        monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+        await store.run("key", "fp", handler)
+
+    run(scenario())
+    assert handler.calls == 2
+
+
+def test_eviction_keeps_in_flight_entries():
+    store = IdempotencyStore(max_entries=2, ttl_seconds=60)
+    slow = counting_handler(delay=0.05)
+
+    async def scenario():
+        first = asyncio.ensure_future(store.run("slow", "fp", slow))
+        await asyncio.sleep(0)
+        # Enough completed keys to push the slow one out if it were evictable
+        for i in range(5):
+            await store.run(f"fast-{i}", "fp", counting_handler())
+        retry = await store.run("slow", "fp", slow)
+        return await first, retry
+
+    assert run(scenario()) == ("done", "done")
+    assert slow.calls == 1
+    assert list(store._entries) == ["fast-4", "slow"]
+
+
+def test_waiters_get_503_when_the_original_is_cancelled():
+    store = IdempotencyStore(max_entries=10, ttl_seconds=60)
+    handler = counting_handler(delay=1)
+
+    async def scenario():
+        original = asyncio.ensure_future(store.run("key", "fp", handler))
+        await asyncio.sleep(0)
+        duplicate = asyncio.ensure_future(store.run("key", "fp", handler))
+        await asyncio.sleep(0)
+        original.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await original
+        with pytest.raises(HTTPException) as raised:
+            await duplicate
+        return raised.value.status_code
+
+    assert run(scenario()) == 503
+    assert handler.calls == 1
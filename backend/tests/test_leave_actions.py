@@ -0,0 +1,111 @@
+"""
+Deciding and cancelling a leave only succeeds while it is still pending.
+
+The status check is part of the UPDATE/DELETE itself, so a request that
+loses a race gets a 400 and leaves the status counters untouched.
+"""
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.db.models import LeaveStatusCounter, NotificationOutbox
+
+ADMIN_UID = "leave-actions-admin"
+STUDENT_UID = "leave-actions-student"
+OTHER_STUDENT_UID = "leave-actions-other-student"
+
+
+@pytest.fixture
+def admin(auth_headers):
+    return auth_headers(ADMIN_UID, "ADMIN")
+
+
+@pytest.fixture
+def student(auth_headers):
+    return auth_headers(STUDENT_UID, "STUDENT")
+
+
+@pytest.fixture
+def pending_leave(client, student):
+    response = client.post("/leave/apply", headers=student, json={
+        "from_date": "2026-03-02", "to_date": "2026-03-03", "reason": "Family event",
+    })
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+@pytest.fixture
+def counters(db):
+    """Returns the current {status: count} of the leave status counters"""
+    def snapshot() -> dict:
+        db.expire_all()
+        return dict(db.execute(select(LeaveStatusCounter.status, LeaveStatusCounter.count)).all())
+    return snapshot
+
+
+def test_action_decides_pending_leave(client, admin, pending_leave, counters):
+    before = counters()
+    response = client.post(f"/leave/{pending_leave}/action", headers=admin, json={"action": "APPROVE"})
+
+    assert response.status_code == 200
+    assert response.json()["leave_request"]["status"] == "APPROVE"
+    after = counters()
+    assert after["PENDING"] == before["PENDING"] - 1
+    assert after["APPROVED"] == before.get("APPROVED", 0) + 1
+
+
+def test_second_action_is_rejected_without_counter_change(client, admin, pending_leave, counters):
+    client.post(f"/leave/{pending_leave}/action", headers=admin, json={"action": "APPROVE"})
+    before = counters()
+    response = client.post(f"/leave/{pending_leave}/action", headers=admin, json={"action": "REJECT"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Leave request has already been approve"
+    assert counters() == before
+
+
+def test_outbox_written_only_by_the_winning_action(client, admin, pending_leave, db):
+    for action in ("APPROVE", "REJECT"):
+        client.post(f"/leave/{pending_leave}/action", headers=admin, json={"action": action})
+
+    entries = [
+        json.loads(data)
+        for data in db.scalars(select(NotificationOutbox.data).where(NotificationOutbox.kind == "LEAVE_STATUS"))
+    ]
+    assert [entry["status"] for entry in entries if entry["leave_id"] == str(pending_leave)] == ["APPROVE"]
+
+
+def test_action_on_missing_leave(client, admin, counters):
+    before = counters()
+    response = client.post("/leave/999999/action", headers=admin, json={"action": "APPROVE"})
+
+    assert response.status_code == 404
+    assert counters() == before
+
+
+def test_cancel_deletes_pending_leave(client, student, pending_leave, counters):
+    before = counters()
+    response = client.delete(f"/leave/{pending_leave}", headers=student)
+
+    assert response.status_code == 200
+    assert counters()["PENDING"] == before["PENDING"] - 1
+    assert client.get(f"/leave/{pending_leave}", headers=student).status_code == 404
+
+
+def test_cancel_after_decision_is_rejected_without_counter_change(client, admin, student, pending_leave, counters):
+    client.post(f"/leave/{pending_leave}/action", headers=admin, json={"action": "REJECT"})
+    before = counters()
+    response = client.delete(f"/leave/{pending_leave}", headers=student)
+
+    assert response.status_code == 400
+    assert counters() == before
+    assert client.get(f"/leave/{pending_leave}", headers=student).json()["status"] == "REJECT"
+
+
+def test_cancel_of_another_students_leave(client, auth_headers, pending_leave, counters):
+    before = counters()
+    response = client.delete(f"/leave/{pending_leave}", headers=auth_headers(OTHER_STUDENT_UID, "STUDENT"))
+
+    assert response.status_code == 404
+    assert counters() == before
@@ -0,0 +1,87 @@
+"""
+POST /leave/batch/action decides every still-pending leave in one statement
+and leaves the notifications to the dispatcher, after the commit.
+"""
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from app.db.models import FCMToken, LeaveRequest, LeaveStatusCounter, NotificationOutbox, User
+from app.services.leave_service import record_leave_status_changes
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.notification_service import notification_service
+
+ADMIN_UID = "leave-batch-admin"
+STUDENT_UIDS = [f"leave-batch-student-{i}" for i in range(3)]
+
+
+@pytest.fixture
+def admin(auth_headers):
+    return auth_headers(ADMIN_UID, "ADMIN")
+
+
+@pytest.fixture
+def batch(client, auth_headers, db):
+    """One pending leave per student, each with a device, plus one already approved leave"""
+    for uid in STUDENT_UIDS:
+        client.get("/leave/stats", headers=auth_headers(uid, "STUDENT")).raise_for_status()
+    student_ids = db.scalars(select(User.id).where(User.firebase_uid.in_(STUDENT_UIDS))).all()
+    # Nothing queued by other tests goes out with this batch
+    db.execute(update(NotificationOutbox).where(NotificationOutbox.status == "PENDING").values(status="SENT"))
+    db.execute(insert(FCMToken).prefix_with("OR IGNORE"), [
+        {"user_id": student_id, "token": f"leave-batch-device-{student_id}"} for student_id in student_ids
+    ])
+    leave = {"from_date": date(2026, 4, 6), "to_date": date(2026, 4, 7), "reason": "Trip"}
+    pending = db.execute(insert(LeaveRequest).returning(LeaveRequest.id), [
+        {**leave, "student_id": student_id, "status": "PENDING"} for student_id in student_ids
+    ]).scalars().all()
+    decided = db.execute(insert(LeaveRequest).returning(LeaveRequest.id), [
+        {**leave, "student_id": student_ids[0], "status": "APPROVE"}
+    ]).scalar_one()
+    record_leave_status_changes(db, [(None, "PENDING")] * len(pending) + [(None, "APPROVE")])
+    db.commit()
+    return pending, decided
+
+
+def counters(db) -> dict:
+    db.expire_all()
+    return dict(db.execute(select(LeaveStatusCounter.status, LeaveStatusCounter.count)).all())
+
+
+def test_batch_skips_leaves_that_are_not_pending(client, admin, batch, db):
+    pending, decided = batch
+    before = counters(db)
+    response = client.post("/leave/batch/action", headers=admin, json={
+        "leave_ids": pending + [decided], "action": "REJECT",
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(body["processed_ids"]) == sorted(pending)
+    assert body["failed_ids"] == [{"id": decided, "error": "Leave request not found or not pending"}]
+    db.expire_all()
+    assert db.scalar(select(LeaveRequest.status).where(LeaveRequest.id == decided)) == "APPROVE"
+    after = counters(db)
+    assert after["PENDING"] == before["PENDING"] - len(pending)
+    assert after["REJECTED"] == before.get("REJECTED", 0) + len(pending)
+
+
+def test_batch_notifications_go_out_in_one_request_after_commit(client, admin, batch, db):
+    pending, _ = batch
+    # One notification per leave, each with its own payload, all in one send request
+    transport = notification_service.transport
+    requests, tokens_sent = transport.requests, transport.tokens_sent
+
+    client.post("/leave/batch/action", headers=admin, json={"leave_ids": pending, "action": "APPROVE"})
+
+    # The request only queued the notifications
+    assert transport.requests == requests
+    assert db.scalar(
+        select(NotificationOutbox.id).where(NotificationOutbox.status == "PENDING").limit(1)
+    ) is not None
+
+    assert asyncio.run(notification_dispatcher.dispatch_once()) == len(pending)
+    assert transport.requests == requests + 1
+    assert transport.tokens_sent == tokens_sent + len(pending)
@@ -0,0 +1,132 @@
+"""
+Keyset pagination of /leave/history.
+
+A student's history is walked page by page through X-Next-Cursor; rows
+sharing a created_at must neither repeat nor go missing across pages.
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.api.leave import MAX_PAGE_OFFSET
+from app.db.models import LeaveRequest, User
+from app.services.leave_service import leave_total_cache, record_leave_status_changes
+
+STUDENT_UID = "leave-pagination-student"
+LEAVE_COUNT = 23
+
+
+@pytest.fixture
+def student(client, auth_headers):
+    headers = auth_headers(STUDENT_UID, "STUDENT")
+    client.get("/leave/stats", headers=headers).raise_for_status()
+    return headers
+
+
+@pytest.fixture
+def leaves(db, student):
+    """LEAVE_COUNT pending leaves of the student, in runs sharing one created_at"""
+    student_id = db.scalar(select(User.id).where(User.firebase_uid == STUDENT_UID))
+    removed = db.execute(
+        delete(LeaveRequest).where(LeaveRequest.student_id == student_id).returning(LeaveRequest.status)
+    ).scalars().all()
+    created = datetime(2026, 3, 1, 9, 0)
+    ids = db.execute(insert(LeaveRequest).returning(LeaveRequest.id), [
+        {
+            "student_id": student_id,
+            "from_date": date(2026, 3, 1) + timedelta(days=i),
+            "to_date": date(2026, 3, 1) + timedelta(days=i),
+            "reason": f"Leave {i}",
+            "status": "PENDING",
+            # Four rows per timestamp, so page boundaries fall inside a tie
+            "created_at": created + timedelta(minutes=i // 4),
+        }
+        for i in range(LEAVE_COUNT)
+    ]).scalars().all()
+    record_leave_status_changes(
+        db, [(status, None) for status in removed] + [(None, "PENDING")] * len(ids)
+    )
+    db.commit()
+    leave_total_cache.clear()
+    return ids
+
+
+def walk(client, headers, page_size, **params):
+    pages, cursor = [], None
+    while True:
+        query = {"page_size": page_size, **params}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/leave/history", headers=headers, params=query)
+        assert response.status_code == 200, response.text
+        pages.append(response)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("page_size", [1, 3, 4, 5, LEAVE_COUNT, 100])
+def test_cursor_walk_returns_every_row_once_newest_first(client, student, leaves, page_size):
+    pages = walk(client, student, page_size)
+
+    ids = [leave["id"] for page in pages for leave in page.json()]
+    # Newest created_at first, ties broken by the higher id
+    expected = sorted(leaves, key=lambda leave_id: ((leave_id - leaves[0]) // 4, leave_id), reverse=True)
+    assert ids == expected
+    assert len(pages) == max(1, -(-LEAVE_COUNT // page_size))
+    assert all(page.headers["X-Page-Size"] == str(page_size) for page in pages)
+
+
+def test_cursor_survives_deleted_row(client, db, student, leaves):
+    first = client.get("/leave/history", headers=student, params={"page_size": 6})
+    seen = [leave["id"] for leave in first.json()]
+
+    # The cursor row itself goes away; the cursor's own timestamp takes over
+    db.execute(delete(LeaveRequest).where(LeaveRequest.id == seen[-1]))
+    record_leave_status_changes(db, [("PENDING", None)])
+    db.commit()
+
+    rest = walk(client, student, 6, cursor=first.headers["X-Next-Cursor"])
+    ids = seen + [leave["id"] for page in rest for leave in page.json()]
+    assert len(ids) == len(set(ids)) == LEAVE_COUNT
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "WyJ4IiwgMV0", ""])
+def test_malformed_cursor_is_rejected(client, student, leaves, cursor):
+    response = client.get("/leave/history", headers=student, params={"cursor": cursor or "%%%"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_total_count_reaches_the_client(client, student, leaves):
+    response = client.get(
+        "/leave/history",
+        headers={**student, "Origin": "https://app.example"},
+        params={"page_size": 5, "include_total": True},
+    )
+
+    assert response.headers["X-Total-Count"] == str(LEAVE_COUNT)
+    exposed = {name.strip().lower() for name in response.headers["Access-Control-Expose-Headers"].split(",")}
+    assert {"x-total-count", "x-next-cursor", "x-page-size"} <= exposed
+
+    without = client.get("/leave/history", headers=student, params={"page_size": 5})
+    assert "X-Total-Count" not in without.headers
+
+
+def test_page_parameter_is_deprecated_and_capped(client, student, leaves):
+    first = client.get("/leave/history", headers=student, params={"page_size": 5})
+    assert "Deprecation" not in first.headers
+
+    second = client.get("/leave/history", headers=student, params={"page_size": 5, "page": 2})
+    assert second.status_code == 200
+    assert second.headers["Deprecation"] == "true"
+    assert [leave["id"] for leave in second.json()] == [
+        leave["id"] for leave in walk(client, student, 5)[1].json()
+    ]
+
+    too_deep = client.get(
+        "/leave/history", headers=student, params={"page_size": 100, "page": MAX_PAGE_OFFSET // 100 + 1}
+    )
+    assert too_deep.status_code == 400
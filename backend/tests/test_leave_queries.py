@@ -0,0 +1,83 @@
+"""
+The leave listing endpoints run a fixed number of statements per request.
+
+Each endpoint is called with a small and a large result page; the count
+must not change with the number of rows returned (no per-row lookups).
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete, insert, select
+
+from app.core.user_cache import user_cache
+from app.db.models import LeaveRequest, User
+from app.services.leave_service import record_leave_status_changes
+
+ADMIN_UID = "leave-queries-admin"
+STUDENT_UID = "leave-queries-student"
+PAGE_SIZES = [5, 50]
+
+
+@pytest.fixture
+def users(client, auth_headers):
+    """Admin and student headers; the first request creates their users rows"""
+    admin = auth_headers(ADMIN_UID, "ADMIN")
+    student = auth_headers(STUDENT_UID, "STUDENT")
+    for headers in (admin, student):
+        client.get("/leave/stats", headers=headers).raise_for_status()
+    return admin, student
+
+
+@pytest.fixture(params=PAGE_SIZES)
+def leaves(request, db, users):
+    """``page_size`` pending leaves of the student, and nothing else"""
+    student_id = db.scalar(select(User.id).where(User.firebase_uid == STUDENT_UID))
+    removed = db.execute(delete(LeaveRequest).returning(LeaveRequest.status)).scalars().all()
+    ids = db.execute(insert(LeaveRequest).returning(LeaveRequest.id), [
+        {
+            "student_id": student_id,
+            "from_date": date(2026, 1, 1) + timedelta(days=i),
+            "to_date": date(2026, 1, 1) + timedelta(days=i),
+            "reason": f"Leave {i}",
+            "status": "PENDING",
+        }
+        for i in range(request.param)
+    ]).scalars().all()
+    # Through the counters, so /leave/stats stays right for the tests that follow
+    record_leave_status_changes(db, [(status, None) for status in removed] + [(None, "PENDING")] * len(ids))
+    db.commit()
+    return ids
+
+
+def cache_user(db, uid: str) -> None:
+    """Put the caller's users row in the cache, so the count never includes its lookup"""
+    user = db.execute(select(User.id, User.role).where(User.firebase_uid == uid)).one()
+    user_cache.put(uid, user.id, user.role)
+
+
+@pytest.mark.parametrize("path, role, expected", [
+    ("/leave/pending", "admin", 1),
+    ("/leave/my", "student", 1),
+    ("/leave/all", "admin", 1),
+    ("/leave/history", "admin", 1),
+])
+def test_list_statement_count(client, db, users, leaves, statements, path, role, expected):
+    headers = users[0] if role == "admin" else users[1]
+    cache_user(db, ADMIN_UID if role == "admin" else STUDENT_UID)
+    with statements() as executed:
+        response = client.get(path, headers=headers, params={"page_size": len(leaves)})
+
+    assert response.status_code == 200
+    assert len(response.json()) == len(leaves)
+    assert len(executed) == expected, executed
+
+
+def test_detail_statement_count(client, db, users, leaves, statements):
+    for leave_id in (leaves[0], leaves[-1]):
+        cache_user(db, ADMIN_UID)
+        with statements() as executed:
+            response = client.get(f"/leave/{leave_id}", headers=users[0])
+
+        assert response.status_code == 200
+        assert response.json()["id"] == leave_id
+        assert len(executed) == 1, executed
@@ -0,0 +1,106 @@
+"""
+GET /attendance/session/{id}/live: a snapshot, then check-in deltas, ending
+with the session_closed event.
+
+The test client buffers whole responses, so the endpoint is called directly
+and its stream read event by event, while check-ins and the close go
+through the client from a worker thread, as they would from other requests.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.api.attendance import stream_session_attendance
+from app.db.database import AsyncSessionLocal
+from app.services.live_feed import live_feed
+
+TEACHER_UID = "live-feed-teacher"
+STUDENT_UIDS = ["live-feed-student-0", "live-feed-student-1"]
+
+
+class ConnectedRequest:
+    """The Request surface the stream polls; the client never disconnects"""
+
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def parse(chunk: str) -> tuple:
+    lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+async def next_event(events) -> tuple:
+    return parse(await asyncio.wait_for(anext(events), timeout=5))
+
+
+@pytest.fixture
+def teacher(auth_headers):
+    return auth_headers(TEACHER_UID, "TEACHER")
+
+
+@pytest.fixture
+def session_id(client, teacher):
+    response = client.post("/attendance/sessions", headers=teacher, json={"session_name": "Live feed"})
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+
+def test_stream_snapshot_check_ins_and_close(client, auth_headers, teacher, session_id):
+    students = [auth_headers(uid, "STUDENT") for uid in STUDENT_UIDS]
+    # The first student is already in when the teacher opens the feed
+    client.post("/attendance/mark", headers=students[0], json={"session_id": session_id}).raise_for_status()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            response = await stream_session_attendance(session_id, ConnectedRequest(), db, None)
+            events = response.body_iterator
+            snapshot = await next_event(events)
+            assert live_feed.subscriber_count(session_id) == 1
+
+            mark = await asyncio.to_thread(
+                client.post, "/attendance/mark", headers=students[1], json={"session_id": session_id}
+            )
+            check_in = await next_event(events)
+            await asyncio.to_thread(client.post, f"/attendance/sessions/{session_id}/close", headers=teacher)
+            closed = await next_event(events)
+            rest = [chunk async for chunk in events]
+            return snapshot, mark.json(), check_in, closed, rest
+
+    snapshot, mark, check_in, closed, rest = asyncio.run(scenario())
+
+    event, data = snapshot
+    assert event == "snapshot"
+    assert data["is_closed"] is False
+    assert sum(data["counts"].values()) == 1
+
+    event, data = check_in
+    assert event == "check_in"
+    assert data["record"]["id"] == mark["attendance_id"]
+    assert data["record"]["status"] == mark["status"]
+    assert data["counts_delta"] == {mark["status"]: 1}
+
+    event, data = closed
+    assert event == "session_closed"
+    assert data["session_id"] == session_id
+    assert data["totals"]["PRESENT"] + data["totals"]["LATE"] == 2
+
+    # The stream ends after the close and lets go of its subscription
+    assert rest == []
+    assert live_feed.subscriber_count(session_id) == 0
+
+
+def test_closed_session_sends_only_the_snapshot(client, teacher, session_id):
+    client.post(f"/attendance/sessions/{session_id}/close", headers=teacher).raise_for_status()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            response = await stream_session_attendance(session_id, ConnectedRequest(), db, None)
+            return [parse(chunk) async for chunk in response.body_iterator]
+
+    events = asyncio.run(scenario())
+
+    assert [event for event, _ in events] == ["snapshot"]
+    assert events[0][1]["is_closed"] is True
+    assert live_feed.subscriber_count(session_id) == 0
@@ -0,0 +1,68 @@
+"""Which send failures get a device token pruned, and broadcast payload limits"""
+import pytest
+from firebase_admin import exceptions, messaging
+from pydantic import ValidationError
+
+from app.schemas.leave import FCM_MAX_PAYLOAD_BYTES, BroadcastCreate
+from app.services.messaging_transport import LocalTransport, Message, token_results
+
+
+def messages(*tokens, body="b"):
+    return [Message(token, "t", body) for token in tokens]
+
+
+def test_unregistered_tokens_are_dead():
+    results = token_results(
+        messages("gone", "moved", "busy"),
+        [
+            messaging.UnregisteredError("Requested entity was not found"),
+            messaging.SenderIdMismatchError("Sender mismatch"),
+            exceptions.UnavailableError("Service unavailable"),
+        ],
+    )
+
+    assert [(result.success, result.dead) for result in results] == [(False, True), (False, True), (False, False)]
+
+
+def test_invalid_argument_is_dead_when_the_payload_got_through():
+    results = token_results(
+        messages("ok", "malformed"),
+        [None, exceptions.InvalidArgumentError("The registration token is not valid")],
+    )
+
+    assert [(result.success, result.dead) for result in results] == [(True, False), (False, True)]
+
+
+def test_invalid_argument_for_every_token_is_not_dead():
+    error = exceptions.InvalidArgumentError("Message payload too big")
+    results = token_results(messages("a", "b"), [error, error])
+
+    assert not any(result.dead for result in results)
+
+
+def test_invalid_argument_is_not_dead_when_only_another_payload_got_through():
+    results = token_results(
+        messages("ok") + messages("oversized", body="x" * 5000),
+        [None, exceptions.InvalidArgumentError("Message payload too big")],
+    )
+
+    assert [(result.success, result.dead) for result in results] == [(True, False), (False, False)]
+
+
+def test_local_transport_reports_dead_prefix():
+    transport = LocalTransport(latency_seconds=0, seed=1)
+    results = transport.send_each(messages("device-1", "dead-2"))
+
+    assert [(result.success, result.dead) for result in results] == [(True, False), (False, True)]
+
+
+def test_broadcast_payload_is_capped():
+    BroadcastCreate(course_name="CS101", title="Reminder", body="x" * 2048)
+
+    with pytest.raises(ValidationError):
+        BroadcastCreate(course_name="CS101", title="Reminder", body="x" * 2049)
+    with pytest.raises(ValidationError):
+        BroadcastCreate(
+            course_name="CS101", title="Reminder", body="Scan the QR code",
+            data={"blob": "x" * FCM_MAX_PAYLOAD_BYTES},
+        )
@@ -0,0 +1,45 @@
+"""Startup migrations on databases created by older versions of the app"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app.db.migrations import _local_timestamp, add_check_in_timestamps
+
+
+def test_legacy_clock_strings_are_read_as_local_time(local_zone):
+    timestamp = _local_timestamp("2026-02-18", "13:21:03")
+
+    assert timestamp.utcoffset() == timedelta(hours=5, minutes=30)
+    assert timestamp.replace(tzinfo=None) == datetime(2026, 2, 18, 13, 21, 3)
+    assert _local_timestamp("2026-02-18", "not a time") is None
+
+
+def test_check_in_strings_are_backfilled_into_timestamps(tmp_path, local_zone):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE attendance_records (id INTEGER PRIMARY KEY, session_id INTEGER NOT NULL, "
+            "student_id INTEGER NOT NULL, date DATE, status VARCHAR(50), check_in_time VARCHAR(20), "
+            "check_out_time VARCHAR(20), latitude FLOAT, longitude FLOAT, face_verified BOOLEAN, "
+            "created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        conn.execute(text(
+            "INSERT INTO attendance_records (id, session_id, student_id, date, status, check_in_time, check_out_time) "
+            "VALUES (1, 1, 1, '2026-02-18', 'PRESENT', '13:21:03', '15:00:00'), "
+            "(2, 1, 2, '2026-02-18', 'ABSENT', '', NULL)"
+        ))
+
+        add_check_in_timestamps(conn)
+
+        rows = conn.execute(text(
+            "SELECT id, checked_in_at, checked_out_at FROM attendance_records ORDER BY id"
+        )).all()
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(attendance_records)"))}
+    engine.dispose()
+
+    # SQLite keeps the local wall clock; the aware value is what Postgres needs
+    assert [tuple(row) for row in rows] == [
+        (1, "2026-02-18 13:21:03.000000", "2026-02-18 15:00:00.000000"),
+        (2, None, None),
+    ]
+    assert not columns & {"check_in_time", "check_out_time"}
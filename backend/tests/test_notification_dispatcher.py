@@ -0,0 +1,34 @@
+"""Which outbox entries the dispatcher claims together as one digest"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.db.models import NotificationOutbox, User
+from app.services.notification_dispatcher import notification_dispatcher
+
+STUDENT_UID = "dispatcher-student"
+
+
+def test_digest_skips_entries_backing_off(client, auth_headers, db):
+    client.get("/leave/stats", headers=auth_headers(STUDENT_UID, "STUDENT")).raise_for_status()
+    student_id = db.scalar(select(User.id).where(User.firebase_uid == STUDENT_UID))
+    now = datetime.now(timezone.utc)
+
+    def entry(name: str, attempts: int, next_attempt_at: datetime) -> NotificationOutbox:
+        return NotificationOutbox(
+            user_id=student_id, kind="LEAVE_STATUS", title=name, body=name,
+            attempts=attempts, next_attempt_at=next_attempt_at,
+        )
+
+    entries = [
+        entry("due", 0, now - timedelta(seconds=1)),
+        entry("held", 0, now + timedelta(seconds=60)),
+        entry("retry due", 2, now - timedelta(seconds=1)),
+        entry("backing off", 2, now + timedelta(seconds=60)),
+    ]
+    db.add_all(entries)
+    db.commit()
+
+    claimed = {entry.title for entry in notification_dispatcher._claim() if entry.user_id == student_id}
+
+    assert claimed == {"due", "held", "retry due"}
@@ -0,0 +1,87 @@
+"""
+send_multicast packs messages into 500-message requests, sends them
+concurrently, and maps every result back to its payload and token.
+"""
+import threading
+
+import pytest
+
+from app.services.messaging_transport import LocalTransport
+from app.services.notification_service import NotificationService
+
+
+class RecordingTransport(LocalTransport):
+    """LocalTransport that records request sizes and can fail whole requests"""
+
+    def __init__(self, fail_requests_with=(), **kwargs):
+        super().__init__(latency_seconds=0, seed=7, **kwargs)
+        self.fail_requests_with = set(fail_requests_with)
+        self.sizes = []
+        self._sizes_lock = threading.Lock()
+
+    def send_each(self, messages):
+        with self._sizes_lock:
+            self.sizes.append(len(messages))
+        if any(message.token in self.fail_requests_with for message in messages):
+            raise ConnectionError("Connection reset")
+        return super().send_each(messages)
+
+
+def service(transport: RecordingTransport) -> NotificationService:
+    return NotificationService(transport=transport, send_threads=4)
+
+
+def tokens(prefix: str, count: int) -> list:
+    return [f"{prefix}-{i}" for i in range(count)]
+
+
+def test_tokens_are_sent_in_requests_of_at_most_500():
+    transport = RecordingTransport()
+    devices = tokens("device", 1201)
+
+    results = service(transport).send_to_tokens(devices + devices[:50], "t", "b")
+
+    assert sorted(transport.sizes) == [201, 500, 500]
+    assert [result.token for result in results] == devices
+    assert all(result.success for result in results)
+
+
+def test_small_payloads_share_requests_and_results_map_back():
+    transport = RecordingTransport()
+    payloads = [(f"t{i}", "b", {"leave_id": str(i)}, [f"a-{i}", f"b-{i}"]) for i in range(300)]
+
+    results = service(transport).send_multicast(payloads)
+
+    assert sorted(transport.sizes) == [100, 500]
+    assert [[result.token for result in payload] for payload in results] == [
+        [f"a-{i}", f"b-{i}"] for i in range(300)
+    ]
+
+
+def test_partial_failure_keeps_the_other_requests():
+    # The second request fails as a whole; the first and third go through
+    transport = RecordingTransport(fail_requests_with={"device-700"})
+    devices = tokens("device", 1000) + tokens("dead-device", 200)
+
+    results = service(transport).send_to_tokens(devices, "t", "b")
+
+    assert [result.token for result in results] == devices
+    by_token = {result.token: result for result in results}
+    failed_request = devices[500:1000]
+    assert not any(by_token[token].success or by_token[token].dead for token in failed_request)
+    assert isinstance(by_token["device-700"].error, ConnectionError)
+    assert all(by_token[token].success for token in devices[:500])
+    # The dead tokens in the last request are still reported, and nothing else is
+    assert {result.token for result in results if result.dead} == set(tokens("dead-device", 200))
+
+
+@pytest.mark.parametrize("quota, expected_failures", [(700, 300), (0, 0)])
+def test_quota_exceeded_is_not_dead(quota, expected_failures):
+    transport = RecordingTransport(quota_per_second=quota)
+
+    results = service(transport).send_to_tokens(tokens("device", 1000), "t", "b")
+
+    failed = [result for result in results if not result.success]
+    assert len(failed) == expected_failures
+    assert not any(result.dead for result in failed)
+    assert transport.requests == 2
@@ -0,0 +1,60 @@
+"""
+The hot queries are index searches, checked with EXPLAIN QUERY PLAN.
+
+Runs against a fresh SQLite database built from the models, so a dropped
+or reordered index in models.py fails here.
+"""
+import re
+
+import pytest
+from sqlalchemy import create_engine, select, text
+
+from app.db.base import Base
+from app.db.models import AttendanceRecord, FCMToken, LeaveRequest
+from app.services.leave_service import leave_query, newest_first
+
+HOT_QUERIES = [
+    pytest.param(
+        select(AttendanceRecord.id).where(AttendanceRecord.session_id == 1, AttendanceRecord.student_id == 2),
+        "attendance_records", "uq_attendance_records_session_student",
+        id="check-in-duplicate",
+    ),
+    pytest.param(
+        select(AttendanceRecord).where(AttendanceRecord.student_id == 2).order_by(AttendanceRecord.date.desc()),
+        "attendance_records", "ix_attendance_records_student_date",
+        id="student-attendance-history",
+    ),
+    pytest.param(
+        newest_first(leave_query().where(LeaveRequest.status == "PENDING")).limit(21),
+        "leave_requests", "ix_leave_requests_status_created_at",
+        id="leave-status-page",
+    ),
+    pytest.param(
+        newest_first(leave_query().where(LeaveRequest.student_id == 2)).limit(21),
+        "leave_requests", "ix_leave_requests_student_created_at",
+        id="student-leave-page",
+    ),
+    pytest.param(
+        select(FCMToken.token).where(FCMToken.user_id == 2),
+        "fcm_tokens", "ix_fcm_tokens_user_id",
+        id="user-device-tokens",
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("query, table, index", HOT_QUERIES)
+def test_hot_query_uses_index(engine, query, table, index):
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        plan = [row.detail for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+    pattern = re.compile(rf"^SEARCH {table}( AS \w+)? USING (COVERING )?INDEX {index} ")
+    assert any(pattern.match(detail) for detail in plan), plan
@@ -0,0 +1,41 @@
+"""Which role each authorization dependency trusts"""
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from app.core.security import CurrentUser, require_admin, verify_role
+from app.core.user_cache import user_cache
+from app.db.models import User
+
+UID = "security-demoted-admin"
+
+
+@pytest.fixture
+def guarded(client):
+    """A bare app with one route per role check, on the test database"""
+    app = FastAPI()
+
+    @app.get("/require-admin")
+    async def admin_only(current_user: CurrentUser = Depends(require_admin)):
+        return {"id": current_user.id}
+
+    @app.get("/verify-role")
+    async def admin_role(current_user: CurrentUser = Depends(verify_role(["ADMIN"]))):
+        return {"id": current_user.id}
+
+    return TestClient(app)
+
+
+def test_demoted_user_is_refused_by_require_admin(guarded, auth_headers, db):
+    # The token still claims ADMIN after the users row is demoted
+    headers = auth_headers(UID, "ADMIN")
+    assert guarded.get("/require-admin", headers=headers).status_code == 200
+
+    db.execute(update(User).where(User.firebase_uid == UID).values(role="STUDENT"))
+    db.commit()
+    user_cache.invalidate(UID)
+
+    assert guarded.get("/require-admin", headers=headers).status_code == 403
+    # verify_role keeps honouring the claim, as it always has
+    assert guarded.get("/verify-role", headers=headers).status_code == 200
@@ -0,0 +1,44 @@
+"""
+Deadlines compare correctly whether the driver returns them aware or naive.
+
+Postgres returns timestamptz values aware and SQLite returns them naive,
+so both shapes are exercised, with a local zone away from UTC.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.db.models import AttendanceSession
+from app.services.session_service import as_local, close_expired_sessions, local_now
+
+
+def test_aware_and_naive_deadlines_compare_with_local_now(local_zone):
+    now = local_now()
+    aware_past = datetime.now(timezone.utc) - timedelta(minutes=30)
+    naive_future = datetime.now() + timedelta(minutes=30)
+
+    assert now > as_local(aware_past)
+    assert now < as_local(naive_future)
+    assert as_local(aware_past).utcoffset() == timedelta(hours=5, minutes=30)
+
+
+def test_sweep_honours_deadlines_sent_with_an_offset(client, auth_headers, db, local_zone):
+    headers = auth_headers("session-clock-teacher", "TEACHER")
+    utc_now = datetime.now(timezone.utc)
+    session_ids = {}
+    for name, offset in (("expired", -30), ("open", 30)):
+        response = client.post("/attendance/sessions", headers=headers, json={
+            "session_name": f"clock-{name}",
+            "late_until_datetime": (utc_now + timedelta(minutes=offset)).isoformat(),
+        })
+        assert response.status_code == 200
+        session_ids[name] = response.json()["session_id"]
+
+    close_expired_sessions(db)
+    db.commit()
+
+    closed = dict(db.execute(
+        select(AttendanceSession.id, AttendanceSession.is_closed)
+        .where(AttendanceSession.id.in_(session_ids.values()))
+    ).all())
+    assert closed == {session_ids["expired"]: True, session_ids["open"]: False}
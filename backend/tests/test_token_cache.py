@@ -0,0 +1,87 @@
+"""Verified token caching and per-user revocation"""
+import time
+
+from sqlalchemy import select
+
+from app.core import security
+from app.core.token_cache import TokenCache
+from app.db.models import User
+
+
+def claims(uid: str = "uid-1", ttl: float = 3600, iat: float = None) -> dict:
+    now = time.time()
+    return {"uid": uid, "iat": int(now if iat is None else iat), "exp": now + ttl}
+
+
+def test_cache_hit_returns_claims():
+    cache = TokenCache(max_entries=10)
+    cache.put("token", claims())
+
+    assert cache.get("token")["uid"] == "uid-1"
+    assert cache.get("other") is None
+
+
+def test_entry_expires_at_exp(monkeypatch):
+    cache = TokenCache(max_entries=10)
+    token_claims = claims(ttl=60)
+    cache.put("token", token_claims)
+
+    monkeypatch.setattr(time, "time", lambda: token_claims["exp"])
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = TokenCache(max_entries=2)
+    cache.put("a", claims("a"))
+    cache.put("b", claims("b"))
+    cache.get("a")
+    cache.put("c", claims("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_revoke_uid_refuses_tokens_issued_before():
+    cache = TokenCache(max_entries=10)
+    old = claims("uid-1", iat=time.time() - 10)
+    cache.put("old", old)
+    cache.put("someone-else", claims("uid-2"))
+
+    assert cache.revoke_uid("uid-1") == 1
+    assert cache.get("old") is None
+    assert cache.is_revoked(old)
+    assert not cache.is_revoked(claims("uid-1", iat=time.time() + 2))
+    assert not cache.is_revoked(claims("uid-2"))
+
+
+def test_repeat_requests_verify_once(client, auth_headers, monkeypatch):
+    headers = auth_headers("token-cache-student", "STUDENT")
+    verify = security.token_verifier.verify
+    calls = []
+
+    def counting_verify(token, check_revoked=False):
+        calls.append(token)
+        return verify(token, check_revoked)
+
+    monkeypatch.setattr(security.token_verifier, "verify", counting_verify)
+    for _ in range(3):
+        assert client.get("/leave/my", headers=headers).status_code == 200
+    assert len(calls) == 1
+
+
+def test_role_change_revokes_the_users_tokens(client, auth_headers, db):
+    admin = auth_headers("token-cache-admin", "ADMIN")
+    teacher = auth_headers("token-cache-teacher", "TEACHER")
+    assert client.get("/leave/pending", headers=teacher).status_code == 200
+    # First sight stores the claimed role, so the admin passes require_admin
+    client.get("/leave/stats", headers=admin).raise_for_status()
+    teacher_id = db.scalar(select(User.id).where(User.firebase_uid == "token-cache-teacher"))
+
+    response = client.put(f"/users/{teacher_id}/role", headers=admin, json={"role": "STUDENT"})
+
+    assert response.status_code == 200
+    assert response.json()["role"] == "STUDENT"
+    refused = client.get("/leave/pending", headers=teacher)
+    assert refused.status_code == 401
+    assert "revoked" in refused.json()["detail"]